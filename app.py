@@ -1,4 +1,7 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import urlparse, parse_qs
 from controller.user_controller import UserController
 from controller.expense_controller import ExpenseController
@@ -9,8 +12,37 @@ from controller.notification_controller import NotificationController
 from controller.financial_health_controller import FinancialHealthController
 from controller.smart_categorization_controller import SmartCategorizationController
 from controller.subscription_controller import SubscriptionController
+from controller.metrics_controller import MetricsController
+from database.circuit_breaker import begin_request, db_circuit, request_rejected, request_stale
+from database.database_connection import POOL_SIZE, RESERVED_CONNECTIONS
+from database.expense_archive import ARCHIVE_ENABLED, expense_archiver
+from database.expense_write_behind import WRITE_BEHIND_ENABLED, expense_write_behind
+from database.query_profiler import current_profile, request_scope
+from utils.response import json_response
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_THREADS = int(os.getenv('MAX_REQUEST_THREADS', str(max(1, POOL_SIZE - RESERVED_CONNECTIONS))))
 
 class SpendWiseRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is required for chunked transfer encoding of streamed exports.
+    # Connections are still closed after each response, as under HTTP/1.0,
+    # since handlers do not always consume the request body.
+    protocol_version = 'HTTP/1.1'
+
+    def handle_one_request(self):
+        # Profile every statement run while serving this request (N+1 detection)
+        begin_request()
+        with request_scope():
+            super().handle_one_request()
+
+    def parse_request(self):
+        parsed = super().parse_request()
+        profile = current_profile()
+        if parsed and profile is not None:
+            profile.label = f"{self.command} {urlparse(self.path).path}"
+        return parsed
+
     def do_GET(self):
         # Parse the request URL and query parameters
         parsed_url = urlparse(self.path)
@@ -56,11 +88,12 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
             controller = SubscriptionController(self, query_params)
             response = controller.handle_get()
             self._send_response(response)
+        elif path == '/metrics':
+            controller = MetricsController(self, query_params)
+            response = controller.handle_get()
+            self._send_response(response)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'404 Not Found')
+            self._send_not_found()
     
     def do_POST(self):
         # Parse the request URL and query parameters
@@ -71,7 +104,7 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
         path = parsed_url.path
 
         # Handle the request based on the path
-        if path == '/expenses':
+        if path in ('/expenses', '/expenses/bulk', '/expenses/import'):
             controller = ExpenseController(self, query_params)
             response = controller.handle_post()
             self._send_response(response)
@@ -79,7 +112,7 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
             controller = UserController(self, query_params)
             response = controller.handle_post()
             self._send_response(response)
-        elif path == '/auth/login' or path == '/auth/register':
+        elif path in ('/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'):
             controller = AuthController(self, query_params)
             response = controller.handle_post()
             self._send_response(response)
@@ -100,10 +133,7 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
             response = controller.handle_post()
             self._send_response(response)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'404 Not Found')
+            self._send_not_found()
     
     def do_PUT(self):
         # Parse the request URL and query parameters
@@ -135,10 +165,7 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
             response = controller.handle_put()
             self._send_response(response)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'404 Not Found')
+            self._send_not_found()
     
     def do_DELETE(self):
         # Parse the request URL and query parameters
@@ -170,33 +197,109 @@ class SpendWiseRequestHandler(BaseHTTPRequestHandler):
             response = controller.handle_delete()
             self._send_response(response)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'404 Not Found')
+            self._send_not_found()
     
     def _send_response(self, response):
         """Send response using the response dictionary"""
+        if request_rejected() and not request_stale():
+            # The database circuit refused a connection and nothing was served
+            # from cache, so whatever the handler answered (an empty list, a
+            # 404, a 200 fallback) is not the real result. Streamed exports
+            # check out their connection before the handler returns, so their
+            # refusal is already known here too
+            response = json_response({'message': 'Service temporarily unavailable'}, 503)
+            response['headers']['Retry-After'] = str(db_circuit.retry_after())
+        elif request_stale():
+            response.setdefault('headers', {})['Warning'] = '110 - "Response is Stale"'
+
+        if 'stream' in response:
+            self._send_stream(response)
+            return
+
         status_code = response.get('status_code', 200)
-        body = response.get('body', '{}')
+        body = response.get('body', '{}').encode('utf-8')
         headers = response.get('headers', {})
         
         self.send_response(status_code)
         for header_name, header_value in headers.items():
             self.send_header(header_name, header_value)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
         self.end_headers()
-        self.wfile.write(body.encode('utf-8'))
+        self.wfile.write(body)
+
+    def _send_stream(self, response):
+        """Send a streaming response body using chunked transfer encoding"""
+        self.send_response(response.get('status_code', 200))
+        for header_name, header_value in response.get('headers', {}).items():
+            self.send_header(header_name, header_value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        chunks = response['stream']
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b'%X\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # Headers are already sent; the connection is dropped without the
+            # terminating chunk so the client sees a truncated transfer
+            logger.error(f"Error streaming response: {e}")
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _send_not_found(self):
+        """Send a plain-text 404 response"""
+        self._send_response({
+            'status_code': 404,
+            'body': '404 Not Found',
+            'headers': {'Content-type': 'text/plain'}
+        })
+
+class SpendWiseServer(ThreadingHTTPServer):
+    """Serves each request on its own thread, at most max_threads at a time.
+
+    Per-request state (the query profile, the circuit breaker flags, the
+    unit of work) is thread-local. Past max_threads the accept loop waits
+    and new connections queue in the listen backlog, rather than starting
+    threads that would only find the connection pool exhausted.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_threads: int = MAX_REQUEST_THREADS):
+        self._slots = threading.BoundedSemaphore(max(1, max_threads))
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
 
 def start_server():
     host = 'localhost'
     port = 8000
     server_address = (host, port)
-    httpd = HTTPServer(server_address, SpendWiseRequestHandler)
+    httpd = SpendWiseServer(server_address, SpendWiseRequestHandler)
     print(f'Server started on http://{host}:{port}')
     print('Available endpoints:')
     print('  Authentication:')
     print('    POST /auth/login')
     print('    POST /auth/register')
+    print('    POST /auth/refresh')
+    print('    POST /auth/logout')
     print('  Users:')
     print('    GET /users')
     print('    GET /users/{id}')
@@ -206,7 +309,11 @@ def start_server():
     print('  Expenses:')
     print('    GET /expenses')
     print('    GET /expenses/{id}')
+    print('    GET /expenses/export?format={csv|ndjson|xlsx}&start_date={date}&end_date={date}')
     print('    POST /expenses')
+    print('    POST /expenses/bulk')
+    print('    POST /expenses/import?format={csv|ofx|qif}')
+    print('    GET /expenses/import/{job_id}')
     print('    PUT /expenses/{id}')
     print('    DELETE /expenses/{id}')
     print('  Budgets:')
@@ -220,6 +327,7 @@ def start_server():
     print('    GET /incomes')
     print('    GET /incomes/{id}')
     print('    GET /incomes/summary')
+    print('    GET /incomes/export?format={csv|ndjson|xlsx}&start_date={date}&end_date={date}')
     print('    POST /incomes')
     print('    PUT /incomes/{id}')
     print('    DELETE /incomes/{id}')
@@ -240,6 +348,14 @@ def start_server():
     print('    GET /subscriptions?days={num}')
     print('    GET /subscription-alternatives?service={name}&max_cost={num}')
     print('    GET /subscription-changes?days={num}')
+    print('  Operations:')
+    print('    GET /metrics')
+    if WRITE_BEHIND_ENABLED:
+        # Replays expenses accepted before a crash, then flushes new ones
+        expense_write_behind.start()
+    if ARCHIVE_ENABLED:
+        # Moves expenses older than the hot window to expense_archive
+        expense_archiver.start()
     httpd.serve_forever()
 
 if __name__ == '__main__':
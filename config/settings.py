@@ -29,8 +29,9 @@ class JWTConfig:
     """JWT configuration"""
     secret_key: str
     algorithm: str = "HS256"
-    token_expiry_hours: int = 24
+    access_token_minutes: int = 15
     refresh_token_days: int = 7
+    max_session_days: int = 30
 
 @dataclass
 class ServerConfig:
@@ -77,8 +78,9 @@ class AppConfig:
             jwt=JWTConfig(
                 secret_key=os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production'),
                 algorithm=os.getenv('JWT_ALGORITHM', 'HS256'),
-                token_expiry_hours=int(os.getenv('TOKEN_EXPIRY_HOURS', '24')),
-                refresh_token_days=int(os.getenv('REFRESH_TOKEN_DAYS', '7'))
+                access_token_minutes=int(os.getenv('ACCESS_TOKEN_MINUTES', '15')),
+                refresh_token_days=int(os.getenv('REFRESH_TOKEN_DAYS', '7')),
+                max_session_days=int(os.getenv('MAX_SESSION_DAYS', '30'))
             ),
             server=ServerConfig(
                 host=os.getenv('SERVER_HOST', 'localhost'),
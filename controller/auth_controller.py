@@ -1,9 +1,10 @@
 import logging
+import time
 from typing import Dict, Any
 from utils.api_service import APIServiceHelper
 from utils.response import json_response, validate_required_fields, validate_email, sanitize_string
 from utils.authentication import auth_manager
-import user_query
+from database.user_query import create_user
 from model.user import user
 
 logger = logging.getLogger(__name__)
@@ -16,6 +17,10 @@ class AuthController(APIServiceHelper):
                 return self._handle_login()
             elif self.path == '/auth/register':
                 return self._handle_register()
+            elif self.path == '/auth/refresh':
+                return self._handle_refresh()
+            elif self.path == '/auth/logout':
+                return self._handle_logout()
             else:
                 return json_response({'message': 'Not found'}, 404)
         except Exception as e:
@@ -42,12 +47,16 @@ class AuthController(APIServiceHelper):
         if not user_data:
             return json_response({'message': 'Invalid credentials'}, 401)
 
-        # Generate token
-        token = auth_manager.generate_token(user_data)
+        # Generate tokens; the session starts now and ends MAX_SESSION_DAYS later
+        auth_time = int(time.time())
+        token = auth_manager.generate_token(user_data, auth_time)
+        refresh_token = auth_manager.generate_refresh_token(user_data, auth_time)
 
         return json_response({
             'message': 'Login successful',
             'token': token,
+            'refresh_token': refresh_token,
+            'expires_in': auth_manager.access_token_minutes * 60,
             'user': {
                 'user_id': user_data['user_id'],
                 'username': user_data['username'],
@@ -56,6 +65,41 @@ class AuthController(APIServiceHelper):
             }
         })
     
+    def _handle_refresh(self) -> Dict[str, Any]:
+        """Exchange a refresh token for new access and refresh tokens"""
+        refresh_data = self.get_request_body()
+        if not refresh_data:
+            return json_response({'message': 'Invalid JSON data'}, 400)
+
+        is_valid, error_message = validate_required_fields(refresh_data, ['refresh_token'])
+        if not is_valid:
+            return json_response({'message': error_message}, 400)
+
+        tokens = auth_manager.refresh_tokens(refresh_data['refresh_token'])
+        if not tokens:
+            return json_response({'message': 'Invalid or expired refresh token'}, 401)
+
+        token, refresh_token = tokens
+        return json_response({
+            'message': 'Token refreshed',
+            'token': token,
+            'refresh_token': refresh_token,
+            'expires_in': auth_manager.access_token_minutes * 60
+        })
+    
+    def _handle_logout(self) -> Dict[str, Any]:
+        """Revoke the bearer token, and the refresh token if one is sent"""
+        token = auth_manager.extract_token_from_header(self.handler.headers.get('Authorization'))
+        if not token or not auth_manager.revoke_token(token):
+            return json_response({'message': 'Invalid or expired token'}, 401)
+
+        if self.handler.headers.get('Content-Length'):
+            logout_data = self.get_request_body() or {}
+            if logout_data.get('refresh_token'):
+                auth_manager.revoke_refresh_token(logout_data['refresh_token'])
+
+        return json_response({'message': 'Logout successful'})
+    
     def _handle_register(self) -> Dict[str, Any]:
         """Handle user registration"""
         register_data = self.get_request_body()
@@ -92,32 +136,8 @@ class AuthController(APIServiceHelper):
             **sanitized_data
         )
 
-        result = user_query.create_user(user_obj)
+        result = create_user(user_obj)
         if result:
             return json_response({'message': 'User registered successfully'}, 201)
         else:
             return json_response({'message': 'Failed to register user'}, 500)
-
-class TokenValidationMiddleware:
-    """Middleware to validate JWT tokens"""
-    
-    @staticmethod
-    def validate_request(handler) -> tuple[bool, Dict[str, Any]]:
-        """Validate request token and return (is_valid, user_data)"""
-        try:
-            authorization_header = handler.headers.get('Authorization')
-            if not authorization_header:
-                return False, {'message': 'Missing Authorization header'}
-
-            token = auth_manager.extract_token_from_header(authorization_header)
-            if not token:
-                return False, {'message': 'Invalid token format'}
-
-            user_data = auth_manager.verify_token(token)
-            if not user_data:
-                return False, {'message': 'Invalid or expired token'}
-
-            return True, user_data
-        except Exception as e:
-            logger.error(f"Error validating token: {e}")
-            return False, {'message': 'Token validation failed'}
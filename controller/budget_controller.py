@@ -3,7 +3,7 @@ from typing import Dict, Any, Optional
 from utils.api_service import APIServiceHelper
 from utils.response import json_response, validate_required_fields, validate_amount, sanitize_string
 from utils.authentication import auth_manager, TokenValidationMiddleware
-from database.budget_query import create_budget, get_budget_by_id, get_budgets_by_user, update_budget, delete_budget, get_budget_spending
+from database.budget_query import create_budget, get_budget_by_id, update_budget, delete_budget, get_budget_spending, get_budgets_with_spending
 from model.budget import budget
 
 logger = logging.getLogger(__name__)
@@ -34,34 +34,12 @@ class BudgetController(APIServiceHelper):
                     budget_record = get_budget_by_id(budget_id)
                     
                     if budget_record and budget_record.user_id == user_data['user_id']:
-                        budget_data = {
-                            'id': budget_record.id,
-                            'amount': budget_record.amount,
-                            'category': budget_record.category,
-                            'start_date': budget_record.start_date,
-                            'end_date': budget_record.end_date,
-                            'user_id': budget_record.user_id
-                        }
-                        return json_response(budget_data)
+                        return json_response(budget_record.to_dict())
                     else:
                         return json_response({'message': 'Budget not found'}, 404)
             elif self.path == '/budgets':
-                # Get all budgets for user
-                budgets = get_budgets_by_user(user_data['user_id'])
-                budgets_data = []
-                
-                for budget_record in budgets:
-                    spending_info = get_budget_spending(budget_record.id)
-                    budget_data = {
-                        'id': budget_record.id,
-                        'amount': budget_record.amount,
-                        'category': budget_record.category,
-                        'start_date': budget_record.start_date,
-                        'end_date': budget_record.end_date,
-                        'user_id': budget_record.user_id,
-                        'spending': spending_info
-                    }
-                    budgets_data.append(budget_data)
+                # Get all budgets for user, with spending, in one query
+                budgets_data = get_budgets_with_spending(user_data['user_id'])
                 
                 return json_response(budgets_data)
             else:
@@ -1,17 +1,33 @@
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from utils.api_service import APIServiceHelper
 from utils.response import json_response, validate_required_fields, validate_amount, sanitize_string
-import expense_query
+from utils.authentication import TokenValidationMiddleware
+from utils.export_formatter import export_response, EXPORT_FORMATS
+from src.api.validators.request_validators import BaseValidator, ExpenseValidator
+from utils.statement_importer import import_job_manager, spool_upload, detect_format, SUPPORTED_FORMATS
+from database import expense_query
+from database.expense_write_behind import WRITE_BEHIND_ENABLED, expense_write_behind
+from utils.budget_alerts import record_expense
 from model.expense import expense
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on rows accepted by a single POST /expenses/bulk request
+MAX_BULK_EXPENSES = 5000
+
+# Upper bound on statement uploads to POST /expenses/import
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+
 class ExpenseController(APIServiceHelper):
     def handle_get(self) -> Dict[str, Any]:
         try:
-            if self.path.startswith('/expenses/'):
+            if self.path.startswith('/expenses/import/'):
+                return self._handle_import_status()
+            elif self.path == '/expenses/export':
+                return self._handle_export()
+            elif self.path.startswith('/expenses/'):
                 expense_id = int(self.path.split('/')[-1])
                 expense_record = expense_query.get_expense_by_id(expense_id)
 
@@ -70,18 +86,157 @@ class ExpenseController(APIServiceHelper):
                 if expense_data.get('description'):
                     expense_data['description'] = sanitize_string(expense_data['description'])
 
-                result = expense_query.create_expense(expense_data)
+                # Everything the insert needs (user_id, date format), so a 202 is not dropped later
+                is_valid, error_message = ExpenseValidator.validate_expense_data(expense_data)
+                if not is_valid:
+                    return json_response({'message': error_message}, 400)
+
+                if WRITE_BEHIND_ENABLED:
+                    # Durably logged; inserted by the background flusher
+                    expense_write_behind.submit(expense_data)
+                    return json_response({'message': 'Expense accepted'}, 202)
+
+                result = record_expense(expense_data)
 
                 if result:
                     return json_response({'message': 'Expense created successfully'}, 201)
                 else:
                     return json_response({'message': 'Failed to create expense'}, 500)
+            elif self.path == '/expenses/bulk':
+                return self._handle_bulk_create()
+            elif self.path == '/expenses/import':
+                return self._handle_import()
             else:
                 return json_response({'message': 'Not found'}, 404)
         except Exception as e:
             logger.error(f"Error in expense POST: {e}")
             return json_response({'message': 'Internal server error'}, 500)
 
+    def _handle_bulk_create(self) -> Dict[str, Any]:
+        """Validate and insert a batch of expenses, reporting a result per row"""
+        is_valid, auth_result = TokenValidationMiddleware.validate_request(self.handler)
+        if not is_valid:
+            return json_response(auth_result, 401)
+
+        user_data = auth_result
+
+        request_data = self.get_request_body()
+        if not request_data or not isinstance(request_data.get('expenses'), list):
+            return json_response({'message': 'Request body must contain an "expenses" list'}, 400)
+
+        rows = request_data['expenses']
+        if not rows:
+            return json_response({'message': 'No expenses provided'}, 400)
+        if len(rows) > MAX_BULK_EXPENSES:
+            return json_response({'message': f'Too many expenses. Maximum is {MAX_BULK_EXPENSES} per request'}, 413)
+
+        # Single validation pass; only valid rows are sent to the database
+        results: List[Dict[str, Any]] = []
+        valid_rows = []
+        valid_indexes = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results.append({'index': index, 'status': 'invalid', 'message': 'Expense must be an object'})
+                continue
+
+            expense_data = dict(row)
+            expense_data['user_id'] = user_data['user_id']
+            row_valid, error_message = ExpenseValidator.validate_expense_data(expense_data)
+            if not row_valid:
+                results.append({'index': index, 'status': 'invalid', 'message': error_message})
+                continue
+
+            expense_data['category'] = sanitize_string(expense_data['category'])
+            if expense_data.get('description'):
+                expense_data['description'] = sanitize_string(expense_data['description'])
+
+            results.append({'index': index, 'status': 'pending'})
+            valid_rows.append(expense_data)
+            valid_indexes.append(index)
+
+        if not valid_rows:
+            return json_response({'message': 'No valid expenses to create', 'created': 0,
+                                  'failed': len(results), 'results': results}, 400)
+
+        expense_ids = expense_query.create_expenses_bulk(valid_rows)
+        if expense_ids is None:
+            for index in valid_indexes:
+                results[index] = {'index': index, 'status': 'failed', 'message': 'Database error'}
+            return json_response({'message': 'Failed to create expenses', 'created': 0,
+                                  'failed': len(results), 'results': results}, 500)
+
+        for index, expense_id in zip(valid_indexes, expense_ids):
+            results[index] = {'index': index, 'status': 'created', 'id': expense_id}
+
+        return json_response({
+            'message': 'Bulk expense import completed',
+            'created': len(expense_ids),
+            'failed': len(results) - len(expense_ids),
+            'results': results
+        }, 201)
+
+    def _handle_import(self) -> Dict[str, Any]:
+        """Spool an uploaded statement to disk and import it in the background"""
+        is_valid, auth_result = TokenValidationMiddleware.validate_request(self.handler)
+        if not is_valid:
+            return json_response(auth_result, 401)
+
+        user_data = auth_result
+
+        file_format = self.query_params.get('format', [None])[0]
+        if file_format and file_format not in SUPPORTED_FORMATS:
+            return json_response({'message': f"Unsupported format. Use one of: {', '.join(SUPPORTED_FORMATS)}"}, 400)
+
+        content_length = int(self.handler.headers.get('Content-Length') or 0)
+        if content_length <= 0:
+            return json_response({'message': 'Statement file is required'}, 400)
+        if content_length > MAX_IMPORT_BYTES:
+            return json_response({'message': 'Statement file is too large'}, 413)
+
+        file_path = spool_upload(self.handler.rfile.read, content_length)
+        if not file_format:
+            filename = self.query_params.get('filename', [''])[0]
+            with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as stream:
+                file_format = detect_format(stream.read(1024), filename)
+
+        job = import_job_manager.submit(user_data['user_id'], file_path, file_format)
+        response = json_response(job.to_dict(), 202)
+        response['headers']['Location'] = f'/expenses/import/{job.id}'
+        return response
+
+    def _handle_import_status(self) -> Dict[str, Any]:
+        """Report progress of a background statement import"""
+        is_valid, auth_result = TokenValidationMiddleware.validate_request(self.handler)
+        if not is_valid:
+            return json_response(auth_result, 401)
+
+        job_id = self.path.split('/')[-1]
+        job = import_job_manager.get_job(job_id, auth_result['user_id'])
+        if job is None:
+            return json_response({'message': 'Import job not found'}, 404)
+        return json_response(job.to_dict())
+
+    def _handle_export(self) -> Dict[str, Any]:
+        """Stream the user's expenses as csv, ndjson or xlsx"""
+        is_valid, auth_result = TokenValidationMiddleware.validate_request(self.handler)
+        if not is_valid:
+            return json_response(auth_result, 401)
+
+        export_format = self.query_params.get('format', ['csv'])[0]
+        if export_format not in EXPORT_FORMATS:
+            return json_response({'message': f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}, 400)
+
+        start_date = self.query_params.get('start_date', [None])[0]
+        end_date = self.query_params.get('end_date', [None])[0]
+        for field_name, value in (('start_date', start_date), ('end_date', end_date)):
+            if value:
+                date_valid, error_message = BaseValidator.validate_date_format(value, field_name)
+                if not date_valid:
+                    return json_response({'message': error_message}, 400)
+
+        rows = expense_query.iter_expenses_for_export(auth_result['user_id'], start_date, end_date)
+        return export_response(expense_query.EXPENSE_EXPORT_COLUMNS, rows, export_format, 'expenses')
+
     def handle_put(self) -> Dict[str, Any]:
         try:
             if self.path.startswith('/expenses/'):
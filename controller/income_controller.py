@@ -3,7 +3,10 @@ from typing import Dict, Any, Optional
 from utils.api_service import APIServiceHelper
 from utils.response import json_response, validate_required_fields, validate_amount, sanitize_string
 from utils.authentication import auth_manager, TokenValidationMiddleware
+from utils.export_formatter import export_response, EXPORT_FORMATS
+from src.api.validators.request_validators import BaseValidator
 from database.income_query import create_income, get_income_by_id, get_incomes_by_user, update_income, delete_income, get_income_summary
+from database.income_query import iter_incomes_for_export, INCOME_EXPORT_COLUMNS
 from model.income import income
 
 logger = logging.getLogger(__name__)
@@ -19,7 +22,9 @@ class IncomeController(APIServiceHelper):
 
             user_data = auth_result
 
-            if self.path.startswith('/incomes/'):
+            if self.path == '/incomes/export':
+                return self._handle_export(user_data)
+            elif self.path.startswith('/incomes/'):
                 if self.path.endswith('/summary'):
                     # Get income summary
                     # Parse query parameters for date range
@@ -34,14 +39,7 @@ class IncomeController(APIServiceHelper):
                     income_record = get_income_by_id(income_id)
                     
                     if income_record and income_record.user_id == user_data['user_id']:
-                        income_data = {
-                            'id': income_record.id,
-                            'amount': income_record.amount,
-                            'source': income_record.source,
-                            'date': income_record.date,
-                            'user_id': income_record.user_id
-                        }
-                        return json_response(income_data)
+                        return json_response(income_record.to_dict())
                     else:
                         return json_response({'message': 'Income not found'}, 404)
             elif self.path == '/incomes':
@@ -50,25 +48,30 @@ class IncomeController(APIServiceHelper):
                 offset = int(self.query_params.get('offset', [0])[0])
                 
                 incomes = get_incomes_by_user(user_data['user_id'], limit, offset)
-                incomes_data = []
-                
-                for income_record in incomes:
-                    income_data = {
-                        'id': income_record.id,
-                        'amount': income_record.amount,
-                        'source': income_record.source,
-                        'date': income_record.date,
-                        'user_id': income_record.user_id
-                    }
-                    incomes_data.append(income_data)
-                
-                return json_response(incomes_data)
+                return json_response([income_record.to_dict() for income_record in incomes])
             else:
                 return json_response({'message': 'Not found'}, 404)
         except Exception as e:
             logger.error(f"Error in income GET: {e}")
             return json_response({'message': 'Internal server error'}, 500)
 
+    def _handle_export(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Stream the user's incomes as csv, ndjson or xlsx"""
+        export_format = self.query_params.get('format', ['csv'])[0]
+        if export_format not in EXPORT_FORMATS:
+            return json_response({'message': f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}, 400)
+
+        start_date = self.query_params.get('start_date', [None])[0]
+        end_date = self.query_params.get('end_date', [None])[0]
+        for field_name, value in (('start_date', start_date), ('end_date', end_date)):
+            if value:
+                date_valid, error_message = BaseValidator.validate_date_format(value, field_name)
+                if not date_valid:
+                    return json_response({'message': error_message}, 400)
+
+        rows = iter_incomes_for_export(user_data['user_id'], start_date, end_date)
+        return export_response(INCOME_EXPORT_COLUMNS, rows, export_format, 'incomes')
+
     def handle_post(self) -> Dict[str, Any]:
         """Handle POST requests for incomes"""
         try:
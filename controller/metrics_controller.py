@@ -0,0 +1,39 @@
+import logging
+from typing import Dict, Any
+from urllib.parse import urlparse
+from utils.api_service import APIServiceHelper
+from utils.response import json_response
+from database.analytics_cache import analytics_cache
+from database.circuit_breaker import db_circuit
+from database.expense_write_behind import expense_write_behind
+from database.query_cache import query_cache
+from database.query_profiler import query_stats
+from database.retry import retry_stats
+from database.user_cache import user_profiles
+from utils.authentication import auth_manager
+
+logger = logging.getLogger(__name__)
+
+class MetricsController(APIServiceHelper):
+    """Process-local performance counters as JSON"""
+
+    def handle_get(self) -> Dict[str, Any]:
+        """Handle GET /metrics"""
+        try:
+            if urlparse(self.path).path == '/metrics':
+                return json_response({
+                    'query_cache': query_cache.stats(),
+                    'queries': query_stats.stats(),
+                    'retries': retry_stats.stats(),
+                    'write_behind': expense_write_behind.stats(),
+                    'mysql_circuit': db_circuit.stats(),
+                    'analytics_cache': analytics_cache.stats(),
+                    'token_cache': auth_manager.token_cache.stats(),
+                    'token_revocations': auth_manager.revocations.stats(),
+                    'user_profiles': user_profiles.stats()
+                })
+            else:
+                return json_response({'message': 'Not found'}, 404)
+        except Exception as e:
+            logger.error(f"Error in metrics GET: {e}")
+            return json_response({'message': 'Internal server error'}, 500)
@@ -34,16 +34,7 @@ class NotificationController(APIServiceHelper):
                     notification_record = get_notification_by_id(notification_id)
                     
                     if notification_record and notification_record.user_id == user_data['user_id']:
-                        notification_data = {
-                            'id': notification_record.id,
-                            'notification_type': notification_record.notification_type,
-                            'message': notification_record.message,
-                            'user_id': notification_record.user_id,
-                            'sent': notification_record.sent,
-                            'read': notification_record.read,
-                            'created_at': notification_record.created_at
-                        }
-                        return json_response(notification_data)
+                        return json_response(notification_record.to_dict())
                     else:
                         return json_response({'message': 'Notification not found'}, 404)
             elif self.path == '/notifications':
@@ -53,21 +44,7 @@ class NotificationController(APIServiceHelper):
                 offset = int(self.query_params.get('offset', [0])[0])
                 
                 notifications = get_notifications_by_user(user_data['user_id'], unread_only, limit, offset)
-                notifications_data = []
-                
-                for notification_record in notifications:
-                    notification_data = {
-                        'id': notification_record.id,
-                        'notification_type': notification_record.notification_type,
-                        'message': notification_record.message,
-                        'user_id': notification_record.user_id,
-                        'sent': notification_record.sent,
-                        'read': notification_record.read,
-                        'created_at': notification_record.created_at
-                    }
-                    notifications_data.append(notification_data)
-                
-                return json_response(notifications_data)
+                return json_response([notification_record.to_dict() for notification_record in notifications])
             else:
                 return json_response({'message': 'Not found'}, 404)
         except Exception as e:
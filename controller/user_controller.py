@@ -3,7 +3,7 @@ from typing import Dict, Any, Optional
 from utils.api_service import APIServiceHelper
 from utils.response import json_response, validate_required_fields, validate_email, validate_phone_number, sanitize_string
 from utils.authentication import auth_manager, TokenValidationMiddleware
-import user_query
+from database.user_query import create_user, update_user, delete_user, get_user_by_id, get_user_profile, get_all_users
 from model.user import user
 
 logger = logging.getLogger(__name__)
@@ -22,42 +22,18 @@ class UserController(APIServiceHelper):
             if self.path.startswith('/users/'):
                 # Get specific user
                 user_id = int(self.path.split('/')[-1])
-                user_record = user_query.get_user_by_id(user_id)
+                profile = get_user_profile(user_id)
                 
-                if user_record and (user_record.user_id == user_data['user_id'] or user_data['role'] == 'admin'):
-                    user_data_response = {
-                        'user_id': user_record.user_id,
-                        'username': user_record.username,
-                        'email': user_record.email,
-                        'phone_number': user_record.phone_number,
-                        'first_name': user_record.first_name,
-                        'last_name': user_record.last_name,
-                        'role': user_record.role
-                    }
-                    return json_response(user_data_response)
+                if profile and (profile['user_id'] == user_data['user_id'] or auth_manager.authorize(user_data, 'admin')):
+                    return json_response(profile)
                 else:
                     return json_response({'message': 'User not found'}, 404)
             elif self.path == '/users':
                 # Admin only: Get all users
-                if user_data['role'] != 'admin':
+                if not auth_manager.authorize(user_data, 'admin'):
                     return json_response({'message': 'Access denied'}, 403)
                 
-                users = user_query.get_all_users()
-                users_data = []
-                
-                for user_record in users:
-                    user_data_response = {
-                        'user_id': user_record.user_id,
-                        'username': user_record.username,
-                        'email': user_record.email,
-                        'phone_number': user_record.phone_number,
-                        'first_name': user_record.first_name,
-                        'last_name': user_record.last_name,
-                        'role': user_record.role
-                    }
-                    users_data.append(user_data_response)
-                
-                return json_response(users_data)
+                return json_response(get_all_users())
             else:
                 return json_response({'message': 'Not found'}, 404)
         except Exception as e:
@@ -106,7 +82,7 @@ class UserController(APIServiceHelper):
                     **sanitized_data
                 )
 
-                result = user_query.create_user(user_obj)
+                result = create_user(user_obj)
                 if result:
                     return json_response({'message': 'User created successfully'}, 201)
                 else:
@@ -129,10 +105,10 @@ class UserController(APIServiceHelper):
 
             if self.path.startswith('/users/'):
                 user_id = int(self.path.split('/')[-1])
-                user_record = user_query.get_user_by_id(user_id)
+                user_record = get_user_by_id(user_id)
 
                 # Check if user can update this record
-                if user_record and (user_record.user_id == user_data['user_id'] or user_data['role'] == 'admin'):
+                if user_record and (user_record.user_id == user_data['user_id'] or auth_manager.authorize(user_data, 'admin')):
                     update_data = self.get_request_body()
                     if not update_data:
                         return json_response({'message': 'Invalid JSON data'}, 400)
@@ -167,7 +143,7 @@ class UserController(APIServiceHelper):
                         if hasattr(user_record, key):
                             setattr(user_record, key, value)
 
-                    result = user_query.update_user(user_record)
+                    result = update_user(user_record)
                     if result:
                         return json_response({'message': 'User updated successfully'})
                     else:
@@ -192,11 +168,11 @@ class UserController(APIServiceHelper):
 
             if self.path.startswith('/users/'):
                 user_id = int(self.path.split('/')[-1])
-                user_record = user_query.get_user_by_id(user_id)
+                profile = get_user_profile(user_id)
 
                 # Check if user can delete this record
-                if user_record and (user_record.user_id == user_data['user_id'] or user_data['role'] == 'admin'):
-                    result = user_query.delete_user(user_id)
+                if profile and (profile['user_id'] == user_data['user_id'] or auth_manager.authorize(user_data, 'admin')):
+                    result = delete_user(user_id)
                     if result:
                         return json_response({'message': 'User deleted successfully'})
                     else:
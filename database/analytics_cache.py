@@ -0,0 +1,235 @@
+"""
+Memory-mapped per-user expense history for analytics
+
+Each user's full expense history is kept under
+ANALYTICS_CACHE_DIR/user-<id>/ as one file per ExpenseFrame column
+(amounts.f64, days.i32, categories.i32, merchants.i32, native byte order)
+plus dictionary.jsonl, the category and merchant values in code order.
+load() maps the column files read-only and wraps them in memoryviews, so
+an analytics request reads years of history with no copy and no database
+round trip.
+
+The files are kept current by the expense writes: creates append their
+rows once committed, and updates and deletes drop the user's directory,
+which the next load() rebuilds from MySQL. A build that overlaps a write
+for the same user is returned but not saved. Files are only ever appended
+to or replaced, and a reader uses the row count of its shortest column,
+so a torn append is never read. One server process should own a cache
+directory.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from database.unit_of_work import current_unit_of_work
+from utils.expense_frame import COLUMN_TYPES, Dictionary, ExpenseFrame
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv('ANALYTICS_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_DIR = os.getenv('ANALYTICS_CACHE_DIR', 'data/analytics')
+
+COLUMN_FILES = ('amounts.f64', 'days.i32', 'categories.i32', 'merchants.i32')
+DICTIONARY_FILE = 'dictionary.jsonl'
+CATEGORY = 'c'
+MERCHANT = 'm'
+
+def _map_column(filename: str, typecode: str) -> memoryview:
+    """Read-only memoryview over the whole items of a column file"""
+    itemsize = array(typecode).itemsize
+    with open(filename, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        size -= size % itemsize
+        if not size:
+            return memoryview(array(typecode))
+        # The mapping outlives the file object; the memoryview keeps it alive
+        return memoryview(mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)).cast(typecode)
+
+class AnalyticsCache:
+    """Per-user column files under directory, loaded with mmap"""
+
+    def __init__(self, directory: str = CACHE_DIR, enabled: bool = CACHE_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # user_id -> whether the user was written to while a build was running
+        self._building: Dict[int, bool] = {}
+        # user_id -> (dictionary file inode, bytes parsed, categories, merchants)
+        self._dictionaries: Dict[int, Tuple[int, int, Dictionary, Dictionary]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.appended_rows = 0
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"user-{int(user_id)}")
+
+    def load(self, user_id: int) -> Optional[ExpenseFrame]:
+        """The user's whole history, built from MySQL on a miss; None on a database error"""
+        with self._lock:
+            frame = self._open(user_id)
+            if frame is not None:
+                self.hits += 1
+                return frame
+            self.misses += 1
+            self._building[user_id] = False
+        return self._build(user_id)
+
+    def append(self, user_id: int, rows: Sequence[Sequence[Any]]):
+        """Add committed (date, amount, category, description) rows to a cached user"""
+        if not self.enabled or not rows:
+            return
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.after_commit(lambda: self.append(user_id, rows))
+            return
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id] = True
+                return
+            path = self._path(user_id)
+            if not os.path.isdir(path):
+                return
+            try:
+                self._append(user_id, path, rows)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping analytics cache for user {user_id} after failed append: {e}")
+                self._drop(user_id)
+
+    def invalidate(self, user_id: int):
+        """Drop a user's files after an update or delete; the next load rebuilds them"""
+        if not self.enabled:
+            return
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.after_commit(lambda: self.invalidate(user_id))
+            return
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id] = True
+            self._drop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'appended_rows': self.appended_rows
+            }
+
+    # Internals; callers hold self._lock unless noted
+
+    def _open(self, user_id: int) -> Optional[ExpenseFrame]:
+        path = self._path(user_id)
+        if not os.path.isdir(path):
+            return None
+        try:
+            views = [_map_column(os.path.join(path, name), typecode) for name, typecode in zip(COLUMN_FILES, COLUMN_TYPES)]
+            categories, merchants = self._read_dictionary(user_id, path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable analytics cache for user {user_id}: {e}")
+            self._drop(user_id)
+            return None
+        rows = min(len(view) for view in views)
+        return ExpenseFrame(*(view[:rows] for view in views), categories, merchants)
+
+    def _read_dictionary(self, user_id: int, path: str) -> Tuple[Dictionary, Dictionary]:
+        """The user's dictionaries, parsing only lines added since the last read"""
+        filename = os.path.join(path, DICTIONARY_FILE)
+        with open(filename, 'rb') as file:
+            inode = os.fstat(file.fileno()).st_ino
+            cached = self._dictionaries.get(user_id)
+            if cached is None or cached[0] != inode:
+                cached = (inode, 0, Dictionary(), Dictionary())
+            _, offset, categories, merchants = cached
+            file.seek(offset)
+            data = file.read()
+        # A trailing line without a newline is a torn append; stop before it
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            kind, value = json.loads(line)
+            (categories if kind == CATEGORY else merchants).encode(value)
+        self._dictionaries[user_id] = (inode, offset + len(complete), categories, merchants)
+        return categories, merchants
+
+    def _build(self, user_id: int) -> Optional[ExpenseFrame]:
+        """Load the history from MySQL and save it unless a write overlapped (lock not held)"""
+        from database.expense_query import get_expense_rows
+        rows = get_expense_rows(user_id)
+        if rows is None:
+            with self._lock:
+                self._building.pop(user_id, None)
+            return None
+
+        frame = ExpenseFrame.from_rows(rows)
+        with self._lock:
+            overlapped = self._building.pop(user_id, True)
+            if not overlapped:
+                try:
+                    self._save(user_id, frame)
+                except OSError as e:
+                    logger.warning(f"Could not save analytics cache for user {user_id}: {e}")
+        return frame
+
+    def _save(self, user_id: int, frame: ExpenseFrame):
+        path = self._path(user_id)
+        staging = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            for name, column in zip(COLUMN_FILES, (frame.amounts, frame.days, frame.category_codes, frame.merchant_codes)):
+                with open(os.path.join(staging, name), 'wb') as file:
+                    column.tofile(file)
+                    file.flush()
+                    os.fsync(file.fileno())
+            with open(os.path.join(staging, DICTIONARY_FILE), 'w', encoding='utf-8') as file:
+                file.write(self._dictionary_lines(frame.categories.values, frame.merchants.values))
+                file.flush()
+                os.fsync(file.fileno())
+            os.rename(staging, path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self._dictionaries.pop(user_id, None)
+
+    def _append(self, user_id: int, path: str, rows: Sequence[Sequence[Any]]):
+        categories, merchants = self._read_dictionary(user_id, path)
+        known = (len(categories), len(merchants))
+        frame = ExpenseFrame.from_rows(rows, categories, merchants)
+
+        # Dictionary first, so every code in a column file has its value
+        inode, offset = self._dictionaries[user_id][:2]
+        new_lines = self._dictionary_lines(categories.values[known[0]:], merchants.values[known[1]:])
+        if new_lines:
+            with open(os.path.join(path, DICTIONARY_FILE), 'r+b') as file:
+                file.truncate(offset)
+                file.seek(offset)
+                file.write(new_lines.encode('utf-8'))
+            self._dictionaries[user_id] = (inode, offset + len(new_lines.encode('utf-8')), categories, merchants)
+
+        filenames = [os.path.join(path, name) for name in COLUMN_FILES]
+        itemsizes = [array(typecode).itemsize for typecode in COLUMN_TYPES]
+        row_count = min(os.path.getsize(filename) // itemsize for filename, itemsize in zip(filenames, itemsizes))
+        for filename, itemsize, column in zip(filenames, itemsizes, (frame.amounts, frame.days, frame.category_codes, frame.merchant_codes)):
+            with open(filename, 'r+b') as file:
+                # Cut any torn tail so the columns stay aligned
+                file.truncate(row_count * itemsize)
+                file.seek(row_count * itemsize)
+                column.tofile(file)
+        self.appended_rows += len(rows)
+
+    @staticmethod
+    def _dictionary_lines(categories: List[str], merchants: List[str]) -> str:
+        return ''.join(json.dumps([kind, value]) + '\n'
+                       for kind, values in ((CATEGORY, categories), (MERCHANT, merchants))
+                       for value in values)
+
+    def _drop(self, user_id: int):
+        shutil.rmtree(self._path(user_id), ignore_errors=True)
+        self._dictionaries.pop(user_id, None)
+
+analytics_cache = AnalyticsCache()
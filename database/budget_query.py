@@ -1,10 +1,17 @@
 import logging
-from typing import List, Optional, Dict, Any
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from database.database_connection import get_connection, release_connection
+from database.expense_archive import expense_select
+from database.query_cache import cached_query, query_cache
+from database.retry import retry_transient
+from database.row_decoder import fetch_model, fetch_models
+from database.rollup_query import get_expense_totals
 from model.budget import budget
 
 logger = logging.getLogger(__name__)
 
+@retry_transient(idempotent=False)
 def create_budget(budget_data: Dict[str, Any]) -> bool:
     """Create a new budget"""
     connection = get_connection()
@@ -26,6 +33,7 @@ def create_budget(budget_data: Dict[str, Any]) -> bool:
         )
         cursor.execute(query, values)
         connection.commit()
+        query_cache.invalidate_user(budget_data['user_id'], 'budget')
         logger.info(f"Budget created for user {budget_data['user_id']}")
         return True
     except Exception as e:
@@ -36,6 +44,7 @@ def create_budget(budget_data: Dict[str, Any]) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def get_budget_by_id(budget_id: int) -> Optional[budget]:
     """Get budget by ID"""
     connection = get_connection()
@@ -43,21 +52,10 @@ def get_budget_by_id(budget_id: int) -> Optional[budget]:
         return None
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         query = "SELECT * FROM budget WHERE id = %s"
         cursor.execute(query, (budget_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            return budget(
-                id=result['id'],
-                amount=result['amount'],
-                category=result['category'],
-                start_date=result['start_date'],
-                end_date=result['end_date'],
-                user_id=result['user_id']
-            )
-        return None
+        return fetch_model(cursor, budget)
     except Exception as e:
         logger.error(f"Error getting budget: {e}")
         return None
@@ -65,6 +63,8 @@ def get_budget_by_id(budget_id: int) -> Optional[budget]:
         cursor.close()
         release_connection(connection)
 
+@cached_query(('budget',))
+@retry_transient()
 def get_budgets_by_user(user_id: int) -> List[budget]:
     """Get all budgets for a user"""
     connection = get_connection()
@@ -72,22 +72,10 @@ def get_budgets_by_user(user_id: int) -> List[budget]:
         return []
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         query = "SELECT * FROM budget WHERE user_id = %s ORDER BY created_at DESC"
         cursor.execute(query, (user_id,))
-        results = cursor.fetchall()
-        
-        budgets = []
-        for result in results:
-            budgets.append(budget(
-                id=result['id'],
-                amount=result['amount'],
-                category=result['category'],
-                start_date=result['start_date'],
-                end_date=result['end_date'],
-                user_id=result['user_id']
-            ))
-        return budgets
+        return fetch_models(cursor, budget)
     except Exception as e:
         logger.error(f"Error getting budgets: {e}")
         return []
@@ -95,6 +83,7 @@ def get_budgets_by_user(user_id: int) -> List[budget]:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def update_budget(budget_id: int, budget_data: Dict[str, Any]) -> bool:
     """Update budget"""
     connection = get_connection()
@@ -114,10 +103,16 @@ def update_budget(budget_id: int, budget_data: Dict[str, Any]) -> bool:
         if not set_clauses:
             return False
         
+        cursor.execute("SELECT user_id FROM budget WHERE id = %s", (budget_id,))
+        owner = cursor.fetchone()
+        if not owner:
+            return False
+        
         query = f"UPDATE budget SET {', '.join(set_clauses)} WHERE id = %s"
         values.append(budget_id)
         cursor.execute(query, values)
         connection.commit()
+        query_cache.invalidate_user(owner[0], 'budget')
         logger.info(f"Budget {budget_id} updated")
         return True
     except Exception as e:
@@ -128,6 +123,7 @@ def update_budget(budget_id: int, budget_data: Dict[str, Any]) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def delete_budget(budget_id: int) -> bool:
     """Delete budget"""
     connection = get_connection()
@@ -136,9 +132,15 @@ def delete_budget(budget_id: int) -> bool:
     
     try:
         cursor = connection.cursor()
+        cursor.execute("SELECT user_id FROM budget WHERE id = %s", (budget_id,))
+        owner = cursor.fetchone()
+        if not owner:
+            return False
+        
         query = "DELETE FROM budget WHERE id = %s"
         cursor.execute(query, (budget_id,))
         connection.commit()
+        query_cache.invalidate_user(owner[0], 'budget')
         logger.info(f"Budget {budget_id} deleted")
         return True
     except Exception as e:
@@ -149,6 +151,7 @@ def delete_budget(budget_id: int) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def get_budget_spending(budget_id: int) -> Dict[str, Any]:
     """Calculate current spending against budget"""
     connection = get_connection()
@@ -162,43 +165,143 @@ def get_budget_spending(budget_id: int) -> Dict[str, Any]:
         budget_query = "SELECT * FROM budget WHERE id = %s"
         cursor.execute(budget_query, (budget_id,))
         budget_result = cursor.fetchone()
-        
-        if not budget_result:
-            return {}
-        
-        # Calculate total expenses for this category within budget period
-        expense_query = """
-        SELECT COALESCE(SUM(amount), 0) as total_spent
-        FROM expense 
-        WHERE category = %s 
-        AND user_id = %s 
-        AND date BETWEEN %s AND %s
-        """
-        cursor.execute(expense_query, (
-            budget_result['category'],
-            budget_result['user_id'],
-            budget_result['start_date'],
-            budget_result['end_date']
-        ))
-        expense_result = cursor.fetchone()
-        
-        total_spent = expense_result['total_spent'] or 0
-        remaining = budget_result['amount'] - total_spent
-        percentage_used = (total_spent / budget_result['amount']) * 100 if budget_result['amount'] > 0 else 0
-        
-        return {
-            'budget_id': budget_id,
-            'budget_amount': budget_result['amount'],
-            'total_spent': total_spent,
-            'remaining': remaining,
-            'percentage_used': round(percentage_used, 2),
-            'category': budget_result['category'],
-            'start_date': budget_result['start_date'],
-            'end_date': budget_result['end_date']
-        }
     except Exception as e:
         logger.error(f"Error calculating budget spending: {e}")
         return {}
     finally:
         cursor.close()
         release_connection(connection)
+    
+    if not budget_result:
+        return {}
+    
+    # Released above: get_expense_totals checks out its own connection.
+    # Whole months come from the rollup, only partial edge months hit expense rows
+    totals = get_expense_totals(
+        budget_result['user_id'],
+        budget_result['start_date'],
+        budget_result['end_date'],
+        budget_result['category']
+    )
+    return _spending_info(budget_result, Decimal(str(totals['total'])))
+
+def _spending_info(budget_row: Dict[str, Any], total_spent: Decimal) -> Dict[str, Any]:
+    """Spending summary for a budget row and the amount spent in its period"""
+    remaining = budget_row['amount'] - total_spent
+    percentage_used = (total_spent / budget_row['amount']) * 100 if budget_row['amount'] > 0 else 0
+    
+    return {
+        'budget_id': budget_row['id'],
+        'budget_amount': budget_row['amount'],
+        'total_spent': total_spent,
+        'remaining': remaining,
+        'percentage_used': round(percentage_used, 2),
+        'category': budget_row['category'],
+        'start_date': budget_row['start_date'],
+        'end_date': budget_row['end_date']
+    }
+
+# First day of a budget's first whole month, and the day after its last
+# whole month (the two are equal or cross when it covers no whole month)
+_WHOLE_MONTHS_FROM = ("IF(DAY(p.start_date) = 1, p.start_date, "
+                      "DATE_ADD(DATE_SUB(p.start_date, INTERVAL DAY(p.start_date) - 1 DAY), INTERVAL 1 MONTH))")
+_WHOLE_MONTHS_TO = ("IF(p.end_date = LAST_DAY(p.end_date), DATE_ADD(p.end_date, INTERVAL 1 DAY), "
+                    "DATE_SUB(p.end_date, INTERVAL DAY(p.end_date) - 1 DAY))")
+
+def _spending_select(budget_filter: str, filter_values: Sequence[Any]) -> Tuple[str, List[Any]]:
+    """One SELECT of the budgets matching budget_filter (on alias p) with their total_spent.
+
+    As in get_expense_totals, whole months come from expense_monthly_rollup
+    and only the partial edge months read expense rows, from the hot table
+    and the archive (whose branch finds nothing for recent periods).
+    """
+    edges, edge_values = expense_select(
+        "SELECT p.id AS budget_id, SUM(x.amount) AS total FROM budget p "
+        "JOIN {table} x ON x.user_id = p.user_id AND x.category = p.category "
+        "AND x.date BETWEEN p.start_date AND p.end_date "
+        f"AND (x.date < {_WHOLE_MONTHS_FROM} OR x.date >= {_WHOLE_MONTHS_TO}) "
+        f"WHERE {budget_filter} GROUP BY p.id",
+        filter_values
+    )
+    query = f"""
+    SELECT p.id, p.amount, p.category, p.start_date, p.end_date, p.user_id,
+           COALESCE(r.total, 0) + COALESCE(e.total, 0) AS total_spent
+    FROM budget p
+    LEFT JOIN (
+        SELECT p.id AS budget_id, SUM(m.total_amount) AS total
+        FROM budget p
+        JOIN expense_monthly_rollup m
+            ON m.user_id = p.user_id AND m.category = p.category
+            AND m.month >= {_WHOLE_MONTHS_FROM} AND m.month < {_WHOLE_MONTHS_TO}
+        WHERE {budget_filter}
+        GROUP BY p.id
+    ) r ON r.budget_id = p.id
+    LEFT JOIN (
+        SELECT budget_id, SUM(total) AS total FROM ({edges}) raw_edges GROUP BY budget_id
+    ) e ON e.budget_id = p.id
+    WHERE {budget_filter}
+    """
+    return query, list(filter_values) + edge_values + list(filter_values)
+
+@cached_query(('budget', 'expense'), serve_stale=True)
+@retry_transient()
+def get_budgets_with_spending(user_id: int) -> List[Dict[str, Any]]:
+    """Get all budgets for a user with their spending, in one statement.
+
+    See _spending_select. Every item has the budget's fields plus
+    'spending' in the get_budget_spending shape.
+    """
+    connection = get_connection()
+    if connection is None:
+        return []
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query, values = _spending_select("p.user_id = %s", [user_id])
+        cursor.execute(query + " ORDER BY p.created_at DESC", values)
+        results = cursor.fetchall()
+        
+        return [
+            {
+                'id': result['id'],
+                'amount': result['amount'],
+                'category': result['category'],
+                'start_date': result['start_date'],
+                'end_date': result['end_date'],
+                'user_id': result['user_id'],
+                'spending': _spending_info(result, Decimal(str(result['total_spent'])))
+            }
+            for result in results
+        ]
+    except Exception as e:
+        logger.error(f"Error getting budgets with spending: {e}")
+        return []
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def get_covering_budget_spending(user_id: int, category: str, on_date: Any) -> List[Dict[str, Any]]:
+    """Spending (get_budget_spending shape) of a user's budgets for category whose period includes on_date.
+
+    One statement for all of them (see _spending_select). Inside a unit of
+    work it sees the unit's uncommitted expenses and rollup deltas.
+    """
+    connection = get_connection()
+    if connection is None:
+        return []
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query, values = _spending_select(
+            "p.user_id = %s AND p.category = %s AND p.start_date <= %s AND p.end_date >= %s",
+            [user_id, category, on_date, on_date]
+        )
+        cursor.execute(query, values)
+        return [_spending_info(result, Decimal(str(result['total_spent']))) for result in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Error getting spending of budgets covering {on_date}: {e}")
+        return []
+    finally:
+        cursor.close()
+        release_connection(connection)
@@ -0,0 +1,148 @@
+"""
+Circuit breaker around MySQL
+
+Every checkout and statement reports its outcome here. After
+CIRCUIT_FAILURE_THRESHOLD consecutive failures (connection errors; an
+exhausted local pool does not count) or statements slower than
+CIRCUIT_LATENCY_SLO_MS, the circuit opens and checkout_connection() refuses connections for
+CIRCUIT_OPEN_SECONDS instead of letting request threads queue on a sick
+server. The next checkout after that is a half-open probe: if its
+statement succeeds within the SLO the circuit closes, otherwise it opens
+again.
+
+While the circuit is open, query functions get no connection and return
+their usual fallback. Cached reads declared with serve_stale fall back to
+their last (expired) cached value, and the request handler turns any
+other error response from such a request into 503 with Retry-After.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+LATENCY_SLO_MS = float(os.getenv('CIRCUIT_LATENCY_SLO_MS', '1000'))
+OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', '10'))
+
+# Errors that say the server is unreachable or overloaded, rather than
+# rejecting one statement (duplicate key, bad foreign key, syntax)
+HEALTH_ERRORS = frozenset({
+    1040,  # too many connections
+    2003,  # can't connect
+    2006,  # server has gone away
+    2013,  # lost connection during query
+    2055,  # lost connection (extended)
+    3024,  # max_execution_time exceeded
+})
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(RuntimeError):
+    """Raised (or reported) when a connection is refused by the open circuit"""
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single timed half-open probe"""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, latency_slo_ms: float = LATENCY_SLO_MS,
+                 open_seconds: float = OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.latency_slo_ms = latency_slo_ms
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a connection may be checked out now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_started = None
+                logger.info("MySQL circuit half-open; probing")
+            if self.state == HALF_OPEN and (self._probe_started is None or now - self._probe_started >= self.open_seconds):
+                # One probe at a time; a probe that never reports is replaced
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, duration_ms: float = 0.0):
+        """A checkout or statement completed; too slow counts as a failure"""
+        if duration_ms > self.latency_slo_ms:
+            self.record_failure(f"statement took {duration_ms:.0f} ms (SLO {self.latency_slo_ms:.0f} ms)")
+            return
+        with self._lock:
+            self._consecutive_failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self._probe_started = None
+                logger.info("MySQL circuit closed")
+
+    def record_failure(self, reason: Any = None):
+        """A checkout or statement failed because of the server"""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                self.times_opened += 1
+                logger.warning(f"MySQL circuit opened for {self.open_seconds:.0f}s after: {reason}")
+
+    def record_statement(self, duration_ms: float, error: Optional[BaseException] = None):
+        """Report a statement; only server-health errors count against the circuit"""
+        if error is not None and getattr(error, 'errno', None) in HEALTH_ERRORS:
+            self.record_failure(error)
+        else:
+            self.record_success(duration_ms)
+
+    def retry_after(self) -> int:
+        """Whole seconds until the next half-open probe (at least 1)"""
+        with self._lock:
+            if self.state != OPEN:
+                return 1
+            return max(1, int(self.open_seconds - (time.monotonic() - self._opened_at) + 0.999))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_checkouts': self.rejected
+            }
+
+db_circuit = CircuitBreaker()
+
+_local = threading.local()
+
+def begin_request():
+    """Reset this thread's per-request circuit flags"""
+    _local.rejected = False
+    _local.stale = False
+
+def note_rejected():
+    """The current request was refused a connection by the open circuit"""
+    _local.rejected = True
+
+def note_stale():
+    """The current request was answered from an expired cache entry"""
+    _local.stale = True
+
+def request_rejected() -> bool:
+    return getattr(_local, 'rejected', False)
+
+def request_stale() -> bool:
+    return getattr(_local, 'stale', False)
@@ -1,7 +1,12 @@
 import os
 import logging
-from mysql.connector import pooling
+import threading
+from mysql.connector import errors, pooling
 from typing import Optional
+from database.circuit_breaker import CircuitOpenError, db_circuit, note_rejected
+from database.query_profiler import wrap_connection
+from database.retry import note_error
+from database.unit_of_work import shared_connection
 
 # Configure logging
 logging.basicConfig(
@@ -19,10 +24,15 @@ db_config = {
     'auth_plugin': 'mysql_native_password'
 }
 
-# Connection pool configuration
+# Connection pool configuration; the server runs one thread per request, up
+# to MAX_REQUEST_THREADS (default: the pool size less RESERVED_CONNECTIONS,
+# kept for the write-behind flusher, the archiver and the two import workers)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+RESERVED_CONNECTIONS = int(os.getenv('DB_RESERVED_CONNECTIONS', '4'))
 connection_pool = None
+_pool_lock = threading.Lock()
 
-def initialize_connection_pool(pool_name: str = "spend_wise_pool", pool_size: int = 5):
+def initialize_connection_pool(pool_name: str = "spend_wise_pool", pool_size: int = POOL_SIZE):
     """Initialize database connection pool"""
     global connection_pool
     try:
@@ -38,24 +48,62 @@ def initialize_connection_pool(pool_name: str = "spend_wise_pool", pool_size: in
         return None
 
 def get_connection() -> Optional[object]:
-    """Get connection from pool"""
+    """Get connection from pool, or the active unit of work's connection"""
+    shared = shared_connection()
+    if shared is not None:
+        return shared
+    return checkout_connection()
+
+def checkout_connection() -> Optional[object]:
+    """Get a connection from the pool, ignoring any unit of work.
+
+    Returns None without touching the pool while the circuit breaker is open.
+    An exhausted pool also returns None and marks the request rejected (503),
+    but is not held against the circuit: it says this process is busy, not
+    that MySQL is unhealthy.
+    """
     global connection_pool
+    if not db_circuit.allow():
+        note_rejected()
+        note_error(CircuitOpenError("MySQL circuit is open"))
+        return None
+
     if connection_pool is None:
-        initialize_connection_pool()
-    
+        with _pool_lock:
+            # Concurrent first requests must not each build a pool
+            if connection_pool is None:
+                initialize_connection_pool()
+
     try:
         connection = connection_pool.get_connection()
         logger.debug("Database connection established from pool!")
-        return connection
+        return wrap_connection(connection)
+    except errors.PoolError as e:
+        logger.warning(f"Connection pool exhausted: {e}")
+        note_rejected()
+        note_error(e)
+        return None
     except Exception as e:
         logger.error(f"Error getting connection from pool: {e}")
+        note_error(e)
+        db_circuit.record_failure(e)
         return None
 
 def release_connection(connection):
-    """Release connection back to pool"""
-    if connection and connection.is_connected():
+    """Release connection back to pool.
+
+    Broken connections go back too: the pool reconnects them on the next
+    checkout, whereas keeping them out would shrink the pool after every
+    dropped connection.
+    """
+    if not connection:
+        return
+    try:
         connection.close()
         logger.debug("Database connection released back to pool")
+    except Exception as e:
+        # Session reset fails on a dead connection; the pool has it back regardless
+        logger.warning(f"Error resetting connection on release: {e}")
 
 def close_all_connections():
     """Close all connections in the pool"""
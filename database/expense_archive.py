@@ -0,0 +1,204 @@
+"""
+Hot/cold split of the expense table
+
+Expenses dated before the hot window (the current month and the
+EXPENSE_HOT_MONTHS - 1 before it) are moved to expense_archive by a
+background mover, so the hot table and its indexes only hold what the
+analytics paths actually read. Readers call expense_tables(start_date):
+a range starting inside the hot window reads only expense, anything that
+reaches further back (or has no start) reads both tables.
+
+Nothing that was archived is ever newer than the current hot cutoff,
+because the cutoff only moves forward. Lowering EXPENSE_HOT_MONTHS is
+safe; before raising it, move rows back with --restore.
+
+    python -m database.expense_archive              # archive once and exit
+    python -m database.expense_archive --restore    # move everything back
+"""
+import argparse
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from database.database_connection import get_connection, release_connection
+from database.retry import retry_transient
+
+logger = logging.getLogger(__name__)
+
+HOT_MONTHS = int(os.getenv('EXPENSE_HOT_MONTHS', '13'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('EXPENSE_ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv('EXPENSE_ARCHIVE_INTERVAL_HOURS', '24')) * 3600
+ARCHIVE_ENABLED = os.getenv('EXPENSE_ARCHIVE_ENABLED', 'true').lower() == 'true'
+
+HOT_TABLE = 'expense'
+ARCHIVE_TABLE = 'expense_archive'
+ARCHIVE_COLUMNS = ('id', 'amount', 'category', 'description', 'date', 'user_id', 'created_at', 'updated_at')
+
+def hot_cutoff(today: Optional[date] = None, hot_months: Optional[int] = None) -> date:
+    """First day of the oldest month kept in the hot table"""
+    today = today or date.today()
+    hot_months = HOT_MONTHS if hot_months is None else hot_months
+    months = today.year * 12 + today.month - 1 - (hot_months - 1)
+    return date(months // 12, months % 12 + 1, 1)
+
+def expense_tables(start_date: Any = None) -> Tuple[str, ...]:
+    """Tables that may hold expenses dated on or after start_date (None: all)"""
+    if start_date:
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        elif not isinstance(start_date, date):
+            start_date = datetime.strptime(str(start_date)[:10], '%Y-%m-%d').date()
+        if start_date >= hot_cutoff():
+            return (HOT_TABLE,)
+    return (HOT_TABLE, ARCHIVE_TABLE)
+
+def expense_select(select_sql: str, values: Sequence[Any], start_date: Any = None) -> Tuple[str, List[Any]]:
+    """Expand a SELECT written against {table} over the tables start_date needs.
+
+    With more than one table the branches are parenthesized and joined with
+    UNION ALL, so a trailing ORDER BY added by the caller sorts the union.
+    Returns the statement and its parameters (repeated per branch).
+    """
+    tables = expense_tables(start_date)
+    if len(tables) == 1:
+        return select_sql.format(table=tables[0]), list(values)
+    sql = ' UNION ALL '.join(f"({select_sql.format(table=table)})" for table in tables)
+    return sql, list(values) * len(tables)
+
+@retry_transient()
+def _move_batch(source: str, target: str, after_id: int, cutoff: Optional[date], batch_size: int) -> Tuple[int, Optional[int]]:
+    """Move up to batch_size rows past after_id (and before cutoff) from source to target.
+
+    Returns (rows moved, last id scanned); the id is None once the scan has
+    reached the end of source, or on error.
+    """
+    connection = get_connection()
+    if connection is None:
+        return 0, None
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        # Find candidates with a plain (non-locking) read walking the primary
+        # key, since no hot index leads with date. Locking here would put
+        # next-key locks on every hot row the scan passes over.
+        query = f"SELECT id FROM {source} WHERE id > %s"
+        values = [after_id]
+        if cutoff is not None:
+            query += " AND date < %s"
+            values.append(cutoff)
+        query += " ORDER BY id LIMIT %s"
+        values.append(batch_size)
+        cursor.execute(query, values)
+        candidates = [row[0] for row in cursor.fetchall()]
+        if not candidates:
+            connection.commit()
+            return 0, None
+        last_id = candidates[-1] if len(candidates) == batch_size else None
+
+        # Lock just those rows by primary key, rechecking the date in case
+        # one was edited since the scan
+        placeholders = ', '.join(['%s'] * len(candidates))
+        query = f"SELECT id FROM {source} WHERE id IN ({placeholders})"
+        values = list(candidates)
+        if cutoff is not None:
+            query += " AND date < %s"
+            values.append(cutoff)
+        cursor.execute(query + " FOR UPDATE", values)
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            columns = ', '.join(ARCHIVE_COLUMNS)
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM {source} WHERE id IN ({placeholders})", ids)
+        connection.commit()
+        return len(ids), last_id
+    except Exception as e:
+        logger.error(f"Error moving expenses from {source} to {target}: {e}")
+        connection.rollback()
+        return 0, None
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+def _move_all(source: str, target: str, cutoff: Optional[date], batch_size: int) -> int:
+    moved, after_id = 0, 0
+    while after_id is not None:
+        count, after_id = _move_batch(source, target, after_id, cutoff, batch_size)
+        moved += count
+    return moved
+
+def archive_expenses(before: Optional[date] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move expenses dated before the hot cutoff to the archive; returns rows moved.
+
+    Each batch commits on its own, so the mover never holds locks on more
+    than batch_size rows. Rollups and cached results stay valid because
+    readers include the archive for any range that reaches it.
+    """
+    cutoff = min(before, hot_cutoff()) if before else hot_cutoff()
+    moved = _move_all(HOT_TABLE, ARCHIVE_TABLE, cutoff, batch_size)
+    if moved:
+        logger.info(f"Archived {moved} expenses dated before {cutoff}")
+    return moved
+
+def restore_expenses(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move every archived expense back to the hot table; returns rows moved"""
+    moved = _move_all(ARCHIVE_TABLE, HOT_TABLE, None, batch_size)
+    logger.info(f"Restored {moved} archived expenses")
+    return moved
+
+def restore_archived_expense(cursor, expense_id: int) -> bool:
+    """Move one archived expense back to the hot table on cursor's transaction.
+
+    Used by the write paths so an updated expense lands in the hot table
+    (the mover re-archives it later if it is still old).
+    """
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    cursor.execute(f"INSERT INTO {HOT_TABLE} ({columns}) SELECT {columns} FROM {ARCHIVE_TABLE} WHERE id = %s", (expense_id,))
+    if cursor.rowcount < 1:
+        return False
+    cursor.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE id = %s", (expense_id,))
+    return True
+
+class ExpenseArchiver:
+    """Daemon thread that runs archive_expenses every interval"""
+
+    def __init__(self, interval_seconds: float = ARCHIVE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='expense-archiver', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                archive_expenses()
+            except Exception as e:
+                logger.error(f"Expense archiver run failed: {e}")
+            self._stop.wait(self.interval_seconds)
+
+expense_archiver = ExpenseArchiver()
+
+def main():
+    """Archive or restore expenses from the command line"""
+    parser = argparse.ArgumentParser(description='Move old expenses between expense and expense_archive')
+    parser.add_argument('--restore', action='store_true', help='Move all archived expenses back to the hot table')
+    args = parser.parse_args()
+    if args.restore:
+        print(f"Restored {restore_expenses()} expenses")
+    else:
+        print(f"Archived {archive_expenses()} expenses dated before {hot_cutoff()}")
+
+if __name__ == '__main__':
+    main()
@@ -1,98 +1,366 @@
-import database_connection
-from expense import expense
-class ExpenseQuery:
-    @staticmethod
-    def create_expense(expense):
-        connection = database_connection.create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                sql = """INSERT INTO expense (amount, category, date) 
-                         VALUES (%s, %s, %s)"""
-                cursor.execute(sql, (expense.amount, expense.category, expense.date))
-                connection.commit()
-                return True
-            except Exception as e:
-                print(f"Error creating expense: {e}")
-                return False
-            finally:
-                database_connection.close_connection(connection)
-        else:
+import logging
+from typing import Iterator, List, Optional, Dict, Any
+from database.analytics_cache import analytics_cache
+from database.database_connection import get_connection, release_connection
+from database.expense_archive import expense_select, restore_archived_expense
+from database.query_cache import query_cache
+from database.retry import retry_transient
+from database.row_decoder import fetch_model, fetch_models
+from database.rollup_query import add_to_deltas, apply_deltas, apply_row_delta
+from model.expense import expense
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT statement in create_expenses_bulk
+BULK_INSERT_CHUNK_SIZE = 500
+
+EXPENSE_INSERT_COLUMNS = "amount, category, description, date, user_id"
+EXPENSE_ROW_PLACEHOLDER = "(%s, %s, %s, %s, %s)"
+
+def _expense_values(expense_data: Dict[str, Any]) -> tuple:
+    """Build the INSERT parameter tuple for one expense"""
+    return (
+        expense_data['amount'],
+        expense_data['category'],
+        expense_data.get('description'),
+        expense_data['date'],
+        expense_data['user_id']
+    )
+
+def _frame_values(expense_data: Dict[str, Any]) -> tuple:
+    """The expense as a row of EXPENSE_FRAME_COLUMNS, for the analytics cache"""
+    return (expense_data['date'], expense_data['amount'], expense_data['category'], expense_data.get('description'))
+
+def _bulk_insert_query(row_count: int) -> str:
+    """Build a multi-row INSERT statement for row_count expenses"""
+    placeholders = ', '.join([EXPENSE_ROW_PLACEHOLDER] * row_count)
+    return f"INSERT INTO expense ({EXPENSE_INSERT_COLUMNS}) VALUES {placeholders}"
+
+@retry_transient(idempotent=False)
+def create_expense(expense_data: Dict[str, Any]) -> bool:
+    """Create a new expense"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        query = f"""
+        INSERT INTO expense ({EXPENSE_INSERT_COLUMNS})
+        VALUES {EXPENSE_ROW_PLACEHOLDER}
+        """
+        cursor.execute(query, _expense_values(expense_data))
+        apply_row_delta(cursor, 'expense', expense_data)
+        connection.commit()
+        query_cache.invalidate_user(expense_data['user_id'], 'expense')
+        analytics_cache.append(expense_data['user_id'], [_frame_values(expense_data)])
+        logger.info(f"Expense created for user {expense_data['user_id']}")
+        return True
+    except Exception as e:
+        logger.error(f"Error creating expense: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient(idempotent=False)
+def create_expenses_bulk(expenses_data: List[Dict[str, Any]], chunk_size: int = BULK_INSERT_CHUNK_SIZE) -> Optional[List[int]]:
+    """Insert many expenses in one transaction using multi-row INSERTs.
+
+    Rows are written in chunks of ``chunk_size`` per statement and committed
+    once. Returns the new expense IDs in input order, or None if the batch
+    was rolled back.
+    """
+    if not expenses_data:
+        return []
+
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        full_chunk_query = _bulk_insert_query(chunk_size)
+        expense_ids = []
+        rollup_deltas = {}
+
+        for start in range(0, len(expenses_data), chunk_size):
+            chunk = expenses_data[start:start + chunk_size]
+            query = full_chunk_query if len(chunk) == chunk_size else _bulk_insert_query(len(chunk))
+            values = []
+            for expense_data in chunk:
+                values.extend(_expense_values(expense_data))
+                add_to_deltas(rollup_deltas, 'expense', expense_data)
+            cursor.execute(query, values)
+
+            # InnoDB allocates consecutive IDs to a single multi-row INSERT,
+            # and lastrowid is the ID of the first row in the statement
+            first_id = cursor.lastrowid
+            expense_ids.extend(range(first_id, first_id + len(chunk)))
+
+        apply_deltas(cursor, 'expense', rollup_deltas)
+        connection.commit()
+        query_cache.invalidate(*{('expense', user_id) for user_id, _, _ in rollup_deltas})
+        new_rows = {}
+        for expense_data in expenses_data:
+            new_rows.setdefault(expense_data['user_id'], []).append(_frame_values(expense_data))
+        for user_id, rows in new_rows.items():
+            analytics_cache.append(user_id, rows)
+        logger.info(f"Bulk created {len(expense_ids)} expenses")
+        return expense_ids
+    except Exception as e:
+        logger.error(f"Error bulk creating expenses: {e}")
+        connection.rollback()
+        return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def get_expense_by_id(expense_id: int) -> Optional[expense]:
+    """Get expense by ID"""
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        query, values = expense_select("SELECT id, amount, category, date, description, user_id FROM {table} WHERE id = %s", (expense_id,))
+        cursor.execute(query, values)
+        return fetch_model(cursor, expense)
+    except Exception as e:
+        logger.error(f"Error getting expense: {e}")
+        return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def get_all_expenses() -> Optional[List[expense]]:
+    """Get all expenses"""
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        query, values = expense_select("SELECT id, amount, category, date, description, user_id FROM {table}", ())
+        cursor.execute(query + " ORDER BY date DESC", values)
+        return fetch_models(cursor, expense)
+    except Exception as e:
+        logger.error(f"Error getting expenses: {e}")
+        return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+def _lock_expense(cursor, expense_id: int) -> Optional[Dict[str, Any]]:
+    """Lock an expense for writing, first moving it back from the archive if needed"""
+    query = "SELECT user_id, amount, category, date FROM expense WHERE id = %s FOR UPDATE"
+    cursor.execute(query, (expense_id,))
+    previous = cursor.fetchone()
+    if previous is None and restore_archived_expense(cursor, expense_id):
+        cursor.execute(query, (expense_id,))
+        previous = cursor.fetchone()
+    return previous
+
+@retry_transient(idempotent=False)
+def update_expense(expense_id: int, expense_data: Dict[str, Any]) -> bool:
+    """Update expense"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        set_clauses = []
+        values = []
+
+        for field in ['amount', 'category', 'description', 'date']:
+            if field in expense_data:
+                set_clauses.append(f"{field} = %s")
+                values.append(expense_data[field])
+
+        if not set_clauses:
             return False
 
-    @staticmethod
-    def update_expense(expense):
-        connection = database_connection.create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                sql = """UPDATE expenses SET amount=%s, category=%s, date=%s WHERE id=%s"""
-                cursor.execute(sql, (expense.amount, expense.category, expense.date, expense.id))
-                connection.commit()
-                return True
-            except Exception as e:
-                print(f"Error updating expense: {e}")
-                return False
-            finally:
-                database_connection.close_connection(connection)
-        else:
+        # Lock the current row so its rollup contribution can be moved
+        previous = _lock_expense(cursor, expense_id)
+        if not previous:
+            connection.rollback()
             return False
 
-    @staticmethod
-    def delete_expense(expense_id):
-        connection = database_connection.create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                sql = "DELETE FROM expense WHERE id = %s"
-                cursor.execute(sql, (expense_id,))
-                connection.commit()
-                return True
-            except Exception as e:
-                print(f"Error deleting expense: {e}")
-                return False
-            finally:
-                database_connection.close_connection(connection)
-        else:
+        query = f"UPDATE expense SET {', '.join(set_clauses)} WHERE id = %s"
+        values.append(expense_id)
+        cursor.execute(query, values)
+
+        updated = dict(previous)
+        updated.update({field: expense_data[field] for field in ('amount', 'category', 'date') if field in expense_data})
+        rollup_deltas = {}
+        add_to_deltas(rollup_deltas, 'expense', previous, -1)
+        add_to_deltas(rollup_deltas, 'expense', updated)
+        apply_deltas(cursor, 'expense', rollup_deltas)
+
+        connection.commit()
+        query_cache.invalidate_user(previous['user_id'], 'expense')
+        analytics_cache.invalidate(previous['user_id'])
+        logger.info(f"Expense {expense_id} updated")
+        return True
+    except Exception as e:
+        logger.error(f"Error updating expense: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient(idempotent=False)
+def delete_expense(expense_id: int) -> bool:
+    """Delete expense"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        previous = _lock_expense(cursor, expense_id)
+        if not previous:
+            connection.rollback()
             return False
 
-    @staticmethod
-    def get_expense_by_id(expense_id):
-        connection = database_connection.create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                sql = "SELECT * FROM expense WHERE id = %s"
-                cursor.execute(sql, (expense_id,))
-                expense_record = cursor.fetchone()
-                if expense_record:
-                    # Assuming the expense class is defined elsewhere
-                    return expense(*expense_record)
-                else:
-                    return None
-            except Exception as e:
-                print(f"Error getting expense by ID: {e}")
-                return None
-            finally:
-                database_connection.close_connection(connection)
-        else:
-            return None
-
-    @staticmethod
-    def get_all_expenses():
-        connection = database_connection.create_connection()
-        if connection:
+        query = "DELETE FROM expense WHERE id = %s"
+        cursor.execute(query, (expense_id,))
+        apply_row_delta(cursor, 'expense', previous, -1)
+        connection.commit()
+        query_cache.invalidate_user(previous['user_id'], 'expense')
+        analytics_cache.invalidate(previous['user_id'])
+        logger.info(f"Expense {expense_id} deleted")
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting expense: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def get_expense_fingerprints(user_id: int, start_date: str, end_date: str, created_before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get (date, amount, description) occurrence counts for duplicate detection"""
+    connection = get_connection()
+    if connection is None:
+        return []
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = """
+        SELECT date, amount, description
+        FROM {table}
+        WHERE user_id = %s AND date BETWEEN %s AND %s
+        """
+        values = [user_id, start_date, end_date]
+        if created_before:
+            query += " AND created_at < %s"
+            values.append(created_before)
+        query, values = expense_select(query, values, start_date)
+        query = f"""
+        SELECT date, amount, description, COUNT(*) as occurrences
+        FROM ({query}) AS matching
+        GROUP BY date, amount, description
+        """
+        cursor.execute(query, values)
+        return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error getting expense fingerprints: {e}")
+        return []
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+EXPENSE_FRAME_COLUMNS = ('date', 'amount', 'category', 'description')
+
+@retry_transient()
+def get_expense_rows(user_id: int, start_date: Any = None) -> Optional[List[tuple]]:
+    """A user's expenses dated on or after start_date as tuples of EXPENSE_FRAME_COLUMNS, oldest first"""
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        query = f"SELECT {', '.join(EXPENSE_FRAME_COLUMNS)} FROM {{table}} WHERE user_id = %s"
+        values = [user_id]
+        if start_date:
+            query += " AND date >= %s"
+            values.append(start_date)
+        query, values = expense_select(query, values, start_date)
+        cursor.execute(query + " ORDER BY date", values)
+        return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error getting expense rows: {e}")
+        return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+EXPENSE_EXPORT_COLUMNS = ('id', 'date', 'amount', 'category', 'description')
+
+def iter_expenses_for_export(user_id: int, start_date: str = None, end_date: str = None, batch_size: int = 1000) -> Iterator[tuple]:
+    """Stream a user's expenses as tuples of EXPENSE_EXPORT_COLUMNS.
+
+    Uses an unbuffered cursor so rows are pulled from the server in batches
+    instead of being materialized in memory. The pooled connection is held
+    until the generator is exhausted or closed.
+
+    The connection is checked out and the query run before this returns, so
+    a failure raises here, while the handler can still answer 500 (or 503),
+    rather than after a 200 has been sent.
+    """
+    rows = _expense_export_rows(user_id, start_date, end_date, batch_size)
+    next(rows)
+    return rows
+
+def _expense_export_rows(user_id: int, start_date: str, end_date: str, batch_size: int) -> Iterator[tuple]:
+    """Generator behind iter_expenses_for_export; its first yield follows the query"""
+    connection = get_connection()
+    if connection is None:
+        raise ConnectionError("No database connection for the expense export")
+
+    cursor = None
+    exhausted = False
+    try:
+        cursor = connection.cursor(buffered=False)
+        query = f"SELECT {', '.join(EXPENSE_EXPORT_COLUMNS)} FROM {{table}} WHERE user_id = %s"
+        values = [user_id]
+        if start_date:
+            query += " AND date >= %s"
+            values.append(start_date)
+        if end_date:
+            query += " AND date <= %s"
+            values.append(end_date)
+        query, values = expense_select(query, values, start_date)
+        query += " ORDER BY date, id"
+        cursor.execute(query, values)
+        yield
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            yield from rows
+    except Exception as e:
+        # Re-raised so a streaming response is cut off rather than ending short
+        logger.error(f"Error exporting expenses: {e}")
+        raise
+    finally:
+        if not exhausted:
+            # An abandoned unbuffered result must be drained before reuse
             try:
-                cursor = connection.cursor()
-                sql = "SELECT * FROM expense"
-                cursor.execute(sql)
-                expenses_records = cursor.fetchall()
-                expenses = [expense(*expense_record) for expense_record in expenses_records]
-                return expenses
-            except Exception as e:
-                print(f"Error getting all expenses: {e}")
-                return None
-            finally:
-                database_connection.close_connection(connection)
-        else:
-            return None
+                connection.consume_results()
+            except Exception:
+                pass
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
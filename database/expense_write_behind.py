@@ -0,0 +1,408 @@
+"""
+Write-behind ingestion for POST /expenses
+
+With EXPENSE_WRITE_BEHIND=true an accepted expense is appended to a local
+JSONL log and acknowledged (202) once the log is fsynced. Appends arriving
+within EXPENSE_WRITE_BEHIND_FSYNC_MS of each other share one fsync. A
+background flusher bulk-inserts queued expenses in groups and records the
+last flushed sequence number in expense_ingest_checkpoint in the same
+transaction, so replaying the log on startup skips what MySQL already has.
+
+Expenses go through create_expenses_bulk, so like bulk uploads they do
+not raise per-expense budget alerts. Every process needs its own log
+path. Rows MySQL refuses outright (e.g. an unknown user_id) are moved to
+<log>.rejected instead of blocking the queue.
+
+Starting does not need MySQL: the log carries its own numbering (an
+emptied log keeps a marker line with the last sequence number), so
+expenses are accepted while the checkpoint is unreadable and the flusher
+works out what to replay once MySQL is back.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from database import expense_query
+from database.database_connection import checkout_connection, get_connection, release_connection
+from database.retry import retry_transient
+from database.unit_of_work import TransactionAborted, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv('EXPENSE_WRITE_BEHIND', 'false').lower() == 'true'
+LOG_PATH = os.getenv('EXPENSE_WRITE_BEHIND_LOG', os.path.join('data', 'expense_write_behind.jsonl'))
+FSYNC_INTERVAL_MS = float(os.getenv('EXPENSE_WRITE_BEHIND_FSYNC_MS', '5'))
+FLUSH_INTERVAL_SECONDS = float(os.getenv('EXPENSE_WRITE_BEHIND_FLUSH_SECONDS', '1'))
+FLUSH_BATCH_SIZE = int(os.getenv('EXPENSE_WRITE_BEHIND_BATCH_SIZE', '500'))
+
+# The log is emptied once everything in it is flushed and it is this large
+COMPACT_BYTES = 16 * 1024 * 1024
+
+@retry_transient()
+def get_checkpoint(log_id: str) -> Optional[int]:
+    """Last sequence number flushed from a log, 0 if none, None on error"""
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT last_seq FROM expense_ingest_checkpoint WHERE log_id = %s", (log_id,))
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
+    except Exception as e:
+        logger.error(f"Error getting ingest checkpoint: {e}")
+        return None
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def save_checkpoint(log_id: str, last_seq: int) -> bool:
+    """Advance a log's flush checkpoint (never moves it backwards)"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+        INSERT INTO expense_ingest_checkpoint (log_id, last_seq) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_seq = GREATEST(last_seq, VALUES(last_seq))
+        """, (log_id, last_seq))
+        connection.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error saving ingest checkpoint: {e}")
+        connection.rollback()
+        return False
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+class DurableLog:
+    """Append-only JSONL file; append() returns once its line is fsynced"""
+
+    def __init__(self, path: str, fsync_interval_ms: float = FSYNC_INTERVAL_MS):
+        self.path = path
+        self.fsync_interval = fsync_interval_ms / 1000
+        self._file = None
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._written = 0
+        self._synced = 0
+        self._error: Optional[OSError] = None
+        self._closed = False
+        self.fsyncs = 0
+
+    def open(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Open the log and return its records numbered above after_seq.
+
+        A torn final line from a crash mid-append is cut off, and numbering
+        continues after both after_seq and the last record in the file.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        records, valid_bytes = [], 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as handle:
+                for line in handle:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+                    self._seq = max(self._seq, record['seq'])
+                    # Marker lines (no expense) only carry the numbering
+                    if record['seq'] > after_seq and 'expense' in record:
+                        records.append(record)
+
+        self._file = open(self.path, 'ab')
+        if self._file.tell() != valid_bytes:
+            logger.warning(f"Truncating torn tail of {self.path} at byte {valid_bytes}")
+            self._file.truncate(valid_bytes)
+            os.fsync(self._file.fileno())
+
+        self._seq = max(self._seq, after_seq)
+        self._written = self._synced = self._seq
+        self._closed = False
+        threading.Thread(target=self._sync_loop, name='expense-log-fsync', daemon=True).start()
+        return records
+
+    def append(self, payload: Dict[str, Any]) -> int:
+        """Write one record and wait for the fsync that covers it; returns its seq"""
+        with self._cond:
+            if self._file is None or self._closed:
+                raise RuntimeError(f"Log {self.path} is not open")
+            seq = self._seq + 1
+            line = json.dumps({'seq': seq, 'expense': payload}, default=str).encode('utf-8') + b'\n'
+            # Only consume the number once the line is written, so a failed
+            # append leaves no gap for the flusher to wait on
+            self._file.write(line)
+            self._seq = self._written = seq
+            self._cond.notify_all()
+            while self._synced < seq:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+        return seq
+
+    def _sync_loop(self):
+        while True:
+            with self._cond:
+                while self._written == self._synced and not self._closed:
+                    self._cond.wait()
+                if self._closed and self._written == self._synced:
+                    return
+            # Let concurrent appends join this fsync
+            time.sleep(self.fsync_interval)
+            try:
+                with self._cond:
+                    self._file.flush()
+                    target = self._written
+                    descriptor = self._file.fileno()
+                os.fsync(descriptor)
+            except OSError as e:
+                logger.error(f"fsync of {self.path} failed: {e}")
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._synced = max(self._synced, target)
+                self.fsyncs += 1
+                self._cond.notify_all()
+
+    def advance(self, seq: int):
+        """Number later records after seq"""
+        with self._cond:
+            self._seq = max(self._seq, seq)
+
+    def compact(self, flushed_seq: int, min_bytes: int = COMPACT_BYTES) -> bool:
+        """Empty the log if every record in it has been flushed, keeping its numbering"""
+        with self._cond:
+            if self._file is None or flushed_seq < self._seq or self._file.tell() < min_bytes:
+                return False
+            self._file.flush()
+            self._file.truncate(0)
+            self._file.write(json.dumps({'seq': self._seq}).encode('utf-8') + b'\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            while self._synced < self._written and self._error is None:
+                self._cond.wait()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class ExpenseWriteBehind:
+    """Durable queue of accepted expenses, flushed to MySQL in the background"""
+
+    def __init__(self, log_path: str = LOG_PATH, batch_size: int = FLUSH_BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.log = DurableLog(log_path)
+        self.log_id = os.path.abspath(log_path)
+        self.rejected_path = log_path + '.rejected'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # False until the checkpoint has been read (MySQL was down at start)
+        self._recovered = False
+        self.flushed_seq = 0
+        self.accepted = 0
+        self.flushed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Open the log, queue its unflushed records and start the flusher (idempotent).
+
+        If MySQL is unreachable every record in the log is queued, and the
+        ones the checkpoint already covers are dropped by the first flush
+        that can read it.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            checkpoint = get_checkpoint(self.log_id)
+            records = self.log.open(checkpoint or 0)
+            self._pending.extend((record['seq'], record['expense']) for record in records)
+            if checkpoint is None:
+                logger.warning("Cannot read the write-behind checkpoint; replay waits for MySQL")
+            else:
+                self._recover(checkpoint)
+                if records:
+                    logger.info(f"Replaying {len(records)} unflushed expenses from {self.log.path}")
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='expense-write-behind', daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _recover(self, checkpoint: int):
+        """Drop queued records the checkpoint covers and resume after it (lock held)"""
+        while self._pending and self._pending[0][0] <= checkpoint:
+            self._pending.popleft()
+        self.log.advance(checkpoint)
+        self.flushed_seq = checkpoint
+        self._recovered = True
+
+    def submit(self, expense_data: Dict[str, Any]) -> int:
+        """Durably queue a validated expense; returns its log sequence number"""
+        if self._thread is None:
+            self.start()
+        seq = self.log.append(expense_data)
+        with self._lock:
+            # Appends can finish out of order; keep the queue in log order
+            index = len(self._pending)
+            while index and self._pending[index - 1][0] > seq:
+                index -= 1
+            self._pending.insert(index, (seq, expense_data))
+            self.accepted += 1
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return seq
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def flush(self) -> int:
+        """Insert queued expenses in batches until the queue is empty or MySQL is unavailable"""
+        flushed = 0
+        with self._flush_lock:
+            if not self._recovered:
+                checkpoint = get_checkpoint(self.log_id)
+                if checkpoint is None:
+                    return 0
+                with self._lock:
+                    self._recover(checkpoint)
+                logger.info(f"Write-behind checkpoint read; replaying {len(self._pending)} queued expenses")
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    break
+                if self._insert(batch):
+                    self._done(len(batch))
+                    flushed += len(batch)
+                    continue
+                # Find the row(s) MySQL refuses, or stop if it is unreachable
+                for row in batch:
+                    if self._insert([row]):
+                        self._done(1)
+                        flushed += 1
+                    elif self._database_available() and self._reject(row):
+                        self._done(1, rejected=True)
+                    else:
+                        return flushed
+            self.log.compact(self.flushed_seq)
+        return flushed
+
+    def _next_batch(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Queued rows that directly follow the checkpoint, without sequence gaps.
+
+        The checkpoint covers everything up to the last flushed number, so a
+        row still being appended must not be overtaken by later ones.
+        """
+        batch = []
+        with self._lock:
+            for seq, expense_data in self._pending:
+                if len(batch) >= self.batch_size or seq != self.flushed_seq + len(batch) + 1:
+                    break
+                batch.append((seq, expense_data))
+        return batch
+
+    @retry_transient()
+    def _insert(self, rows: List[Tuple[int, Dict[str, Any]]]) -> bool:
+        """Bulk insert rows and advance the checkpoint in one transaction.
+
+        Rows the checkpoint already covers (a retry after a commit whose
+        acknowledgement was lost) are not inserted again.
+        """
+        try:
+            with unit_of_work():
+                checkpoint = get_checkpoint(self.log_id)
+                if checkpoint is None:
+                    return False
+                if checkpoint >= rows[-1][0]:
+                    return True
+                if expense_query.create_expenses_bulk([expense_data for _, expense_data in rows]) is None:
+                    return False
+                save_checkpoint(self.log_id, rows[-1][0])
+            return True
+        except TransactionAborted:
+            return False
+
+    def _reject(self, row: Tuple[int, Dict[str, Any]]) -> bool:
+        seq, expense_data = row
+        logger.error(f"Rejecting write-behind expense {seq}: MySQL refused it")
+        with open(self.rejected_path, 'a', encoding='utf-8') as handle:
+            handle.write(json.dumps({'seq': seq, 'expense': expense_data}, default=str) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+        return save_checkpoint(self.log_id, seq)
+
+    def _done(self, count: int, rejected: bool = False):
+        with self._lock:
+            for _ in range(count):
+                self.flushed_seq = self._pending.popleft()[0]
+            if rejected:
+                self.rejected += count
+            else:
+                self.flushed += count
+
+    @staticmethod
+    def _database_available() -> bool:
+        connection = checkout_connection()
+        if connection is None:
+            return False
+        release_connection(connection)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': WRITE_BEHIND_ENABLED,
+                'pending': len(self._pending),
+                'accepted': self.accepted,
+                'flushed': self.flushed,
+                'rejected': self.rejected,
+                'fsyncs': self.log.fsyncs
+            }
+
+    def stop(self):
+        """Flush what MySQL will take, then stop the flusher and close the log"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.log.close()
+
+expense_write_behind = ExpenseWriteBehind()
@@ -1,10 +1,15 @@
 import logging
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
 from database.database_connection import get_connection, release_connection
+from database.query_cache import cached_query, query_cache
+from database.retry import retry_transient
+from database.row_decoder import fetch_model, fetch_models
+from database.rollup_query import add_to_deltas, apply_deltas, apply_row_delta, get_income_source_totals
 from model.income import income
 
 logger = logging.getLogger(__name__)
 
+@retry_transient(idempotent=False)
 def create_income(income_data: Dict[str, Any]) -> bool:
     """Create a new income record"""
     connection = get_connection()
@@ -24,7 +29,9 @@ def create_income(income_data: Dict[str, Any]) -> bool:
             income_data['user_id']
         )
         cursor.execute(query, values)
+        apply_row_delta(cursor, 'income', income_data)
         connection.commit()
+        query_cache.invalidate_user(income_data['user_id'], 'income')
         logger.info(f"Income created for user {income_data['user_id']}")
         return True
     except Exception as e:
@@ -35,6 +42,7 @@ def create_income(income_data: Dict[str, Any]) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def get_income_by_id(income_id: int) -> Optional[income]:
     """Get income by ID"""
     connection = get_connection()
@@ -42,20 +50,10 @@ def get_income_by_id(income_id: int) -> Optional[income]:
         return None
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         query = "SELECT * FROM income WHERE id = %s"
         cursor.execute(query, (income_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            return income(
-                id=result['id'],
-                amount=result['amount'],
-                source=result['source'],
-                date=result['date'],
-                user_id=result['user_id']
-            )
-        return None
+        return fetch_model(cursor, income)
     except Exception as e:
         logger.error(f"Error getting income: {e}")
         return None
@@ -63,6 +61,8 @@ def get_income_by_id(income_id: int) -> Optional[income]:
         cursor.close()
         release_connection(connection)
 
+@cached_query(('income',))
+@retry_transient()
 def get_incomes_by_user(user_id: int, limit: int = 100, offset: int = 0) -> List[income]:
     """Get all incomes for a user with pagination"""
     connection = get_connection()
@@ -70,21 +70,10 @@ def get_incomes_by_user(user_id: int, limit: int = 100, offset: int = 0) -> List
         return []
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         query = "SELECT * FROM income WHERE user_id = %s ORDER BY date DESC LIMIT %s OFFSET %s"
         cursor.execute(query, (user_id, limit, offset))
-        results = cursor.fetchall()
-        
-        incomes = []
-        for result in results:
-            incomes.append(income(
-                id=result['id'],
-                amount=result['amount'],
-                source=result['source'],
-                date=result['date'],
-                user_id=result['user_id']
-            ))
-        return incomes
+        return fetch_models(cursor, income)
     except Exception as e:
         logger.error(f"Error getting incomes: {e}")
         return []
@@ -92,6 +81,7 @@ def get_incomes_by_user(user_id: int, limit: int = 100, offset: int = 0) -> List
         cursor.close()
         release_connection(connection)
 
+@retry_transient(idempotent=False)
 def update_income(income_id: int, income_data: Dict[str, Any]) -> bool:
     """Update income"""
     connection = get_connection()
@@ -99,7 +89,7 @@ def update_income(income_id: int, income_data: Dict[str, Any]) -> bool:
         return False
     
     try:
-        cursor = connection.cursor()
+        cursor = connection.cursor(dictionary=True)
         set_clauses = []
         values = []
         
@@ -111,10 +101,26 @@ def update_income(income_id: int, income_data: Dict[str, Any]) -> bool:
         if not set_clauses:
             return False
         
+        # Lock the current row so its rollup contribution can be moved
+        cursor.execute("SELECT user_id, amount, source, date FROM income WHERE id = %s FOR UPDATE", (income_id,))
+        previous = cursor.fetchone()
+        if not previous:
+            connection.rollback()
+            return False
+        
         query = f"UPDATE income SET {', '.join(set_clauses)} WHERE id = %s"
         values.append(income_id)
         cursor.execute(query, values)
+        
+        updated = dict(previous)
+        updated.update({field: income_data[field] for field in ('amount', 'source', 'date') if field in income_data})
+        rollup_deltas = {}
+        add_to_deltas(rollup_deltas, 'income', previous, -1)
+        add_to_deltas(rollup_deltas, 'income', updated)
+        apply_deltas(cursor, 'income', rollup_deltas)
+        
         connection.commit()
+        query_cache.invalidate_user(previous['user_id'], 'income')
         logger.info(f"Income {income_id} updated")
         return True
     except Exception as e:
@@ -125,6 +131,7 @@ def update_income(income_id: int, income_data: Dict[str, Any]) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient(idempotent=False)
 def delete_income(income_id: int) -> bool:
     """Delete income"""
     connection = get_connection()
@@ -132,10 +139,18 @@ def delete_income(income_id: int) -> bool:
         return False
     
     try:
-        cursor = connection.cursor()
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT user_id, amount, source, date FROM income WHERE id = %s FOR UPDATE", (income_id,))
+        previous = cursor.fetchone()
+        if not previous:
+            connection.rollback()
+            return False
+        
         query = "DELETE FROM income WHERE id = %s"
         cursor.execute(query, (income_id,))
+        apply_row_delta(cursor, 'income', previous, -1)
         connection.commit()
+        query_cache.invalidate_user(previous['user_id'], 'income')
         logger.info(f"Income {income_id} deleted")
         return True
     except Exception as e:
@@ -146,53 +161,85 @@ def delete_income(income_id: int) -> bool:
         cursor.close()
         release_connection(connection)
 
+@cached_query(('income',), serve_stale=True)
+@retry_transient()
 def get_income_summary(user_id: int, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
     """Get income summary for a user within date range"""
+    if not (start_date and end_date):
+        start_date = end_date = None
+
+    by_source = [
+        {
+            'source': row['source'],
+            'total_income': row['total'],
+            'transaction_count': row['count'],
+            'average_income': row['avg_amount']
+        }
+        for row in get_income_source_totals(user_id, start_date, end_date)
+    ]
+
+    return {
+        'total_income': round(sum(row['total_income'] for row in by_source), 2),
+        'total_transactions': sum(row['transaction_count'] for row in by_source),
+        'by_source': by_source
+    }
+
+INCOME_EXPORT_COLUMNS = ('id', 'date', 'amount', 'source', 'description')
+
+def iter_incomes_for_export(user_id: int, start_date: str = None, end_date: str = None, batch_size: int = 1000) -> Iterator[tuple]:
+    """Stream a user's incomes as tuples of INCOME_EXPORT_COLUMNS.
+
+    Uses an unbuffered cursor so rows are pulled from the server in batches
+    instead of being materialized in memory. The pooled connection is held
+    until the generator is exhausted or closed.
+
+    The connection is checked out and the query run before this returns, so
+    a failure raises here, while the handler can still answer 500 (or 503),
+    rather than after a 200 has been sent.
+    """
+    rows = _income_export_rows(user_id, start_date, end_date, batch_size)
+    next(rows)
+    return rows
+
+def _income_export_rows(user_id: int, start_date: str, end_date: str, batch_size: int) -> Iterator[tuple]:
+    """Generator behind iter_incomes_for_export; its first yield follows the query"""
     connection = get_connection()
     if connection is None:
-        return {}
-    
+        raise ConnectionError("No database connection for the income export")
+
+    cursor = None
+    exhausted = False
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        if start_date and end_date:
-            query = """
-            SELECT 
-                COALESCE(SUM(amount), 0) as total_income,
-                COUNT(*) as transaction_count,
-                source,
-                AVG(amount) as average_income
-            FROM income 
-            WHERE user_id = %s AND date BETWEEN %s AND %s
-            GROUP BY source
-            """
-            cursor.execute(query, (user_id, start_date, end_date))
-        else:
-            query = """
-            SELECT 
-                COALESCE(SUM(amount), 0) as total_income,
-                COUNT(*) as transaction_count,
-                source,
-                AVG(amount) as average_income
-            FROM income 
-            WHERE user_id = %s
-            GROUP BY source
-            """
-            cursor.execute(query, (user_id,))
-        
-        results = cursor.fetchall()
-        
-        total_income = sum(result['total_income'] for result in results)
-        total_transactions = sum(result['transaction_count'] for result in results)
-        
-        return {
-            'total_income': total_income,
-            'total_transactions': total_transactions,
-            'by_source': results
-        }
+        cursor = connection.cursor(buffered=False)
+        query = f"SELECT {', '.join(INCOME_EXPORT_COLUMNS)} FROM income WHERE user_id = %s"
+        values = [user_id]
+        if start_date:
+            query += " AND date >= %s"
+            values.append(start_date)
+        if end_date:
+            query += " AND date <= %s"
+            values.append(end_date)
+        query += " ORDER BY date, id"
+        cursor.execute(query, values)
+        yield
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            yield from rows
     except Exception as e:
-        logger.error(f"Error getting income summary: {e}")
-        return {}
+        # Re-raised so a streaming response is cut off rather than ending short
+        logger.error(f"Error exporting incomes: {e}")
+        raise
     finally:
-        cursor.close()
+        if not exhausted:
+            # An abandoned unbuffered result must be drained before reuse
+            try:
+                connection.consume_results()
+            except Exception:
+                pass
+        if cursor is not None:
+            cursor.close()
         release_connection(connection)
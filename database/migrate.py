@@ -0,0 +1,219 @@
+"""
+Versioned schema migrations
+
+Migrations are SQL files in database/migrations named NNNN_description.sql
+and are applied in version order. Applied versions are recorded in the
+schema_migrations table together with a checksum of the file, so editing
+an applied migration is reported instead of silently diverging.
+
+    python -m database.migrate            # apply pending migrations
+    python -m database.migrate --list     # show applied and pending
+    python -m database.migrate --target 0002
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from database.database_connection import get_connection, release_connection
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+# Duplicate key name: the index already exists on a database that was
+# set up by hand before the migration that adds it
+IGNORABLE_ERRORS = {1061}
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Dict[str, Any]]:
+    """List migration files in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as handle:
+            content = handle.read()
+        migrations.append({
+            'version': match.group(1),
+            'name': match.group(2),
+            'path': path,
+            'checksum': hashlib.sha256(content).hexdigest(),
+            'sql': content.decode('utf-8')
+        })
+
+    versions = [migration['version'] for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+def split_statements(sql: str) -> List[str]:
+    """Split a migration script into statements.
+
+    Handles `--` line comments and semicolons inside quoted strings, which
+    is all the migrations in this repo use.
+    """
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == '\\' and i + 1 < len(sql):
+                current.append(sql[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+            current.append(char)
+        elif sql.startswith('--', i):
+            newline = sql.find('\n', i)
+            i = len(sql) if newline == -1 else newline
+            continue
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(16) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def get_applied_migrations(cursor) -> Dict[str, Optional[str]]:
+    """Map of applied version -> recorded checksum"""
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+def apply_migration(cursor, migration: Dict[str, Any]):
+    """Run one migration's statements and record it.
+
+    MySQL commits DDL implicitly, so a failure part-way leaves the earlier
+    statements applied; the version is only recorded once all succeed.
+    """
+    for statement in split_statements(migration['sql']):
+        try:
+            cursor.execute(statement)
+        except Exception as e:
+            if getattr(e, 'errno', None) in IGNORABLE_ERRORS:
+                logger.warning(f"Migration {migration['version']}: {e} (skipped)")
+                continue
+            raise
+
+    # Migrations also record themselves when run by the MySQL container's
+    # init scripts, so this fills in the checksum for that row as well
+    cursor.execute("""
+    INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE checksum = VALUES(checksum)
+    """, (migration['version'], migration['name'], migration['checksum']))
+
+def migrate(target: Optional[str] = None, directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply pending migrations up to target (inclusive). Returns applied versions."""
+    migrations = discover_migrations(directory)
+    connection = get_connection()
+    if connection is None:
+        raise RuntimeError("Database connection unavailable")
+
+    applied_now = []
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        _ensure_migrations_table(cursor)
+        applied = get_applied_migrations(cursor)
+
+        for migration in migrations:
+            if target and migration['version'] > target:
+                break
+            version = migration['version']
+            if version in applied:
+                if applied[version] and applied[version] != migration['checksum']:
+                    logger.warning(f"Migration {version}_{migration['name']} changed after it was applied")
+                elif not applied[version]:
+                    # Recorded by the container init scripts; store its checksum
+                    cursor.execute("UPDATE schema_migrations SET checksum = %s WHERE version = %s",
+                                   (migration['checksum'], version))
+                    connection.commit()
+                continue
+
+            logger.info(f"Applying migration {version}_{migration['name']}")
+            apply_migration(cursor, migration)
+            connection.commit()
+            applied_now.append(version)
+
+        if not applied_now:
+            logger.info("Schema is up to date")
+        return applied_now
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        connection.rollback()
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+def list_migrations(directory: str = MIGRATIONS_DIR) -> List[Dict[str, Any]]:
+    """Migration files with an 'applied' flag"""
+    migrations = discover_migrations(directory)
+    connection = get_connection()
+    if connection is None:
+        raise RuntimeError("Database connection unavailable")
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        _ensure_migrations_table(cursor)
+        applied = get_applied_migrations(cursor)
+        return [
+            {'version': m['version'], 'name': m['name'], 'applied': m['version'] in applied}
+            for m in migrations
+        ]
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+def main():
+    """Apply or list migrations from the command line"""
+    parser = argparse.ArgumentParser(description='Apply Spend Wise database migrations')
+    parser.add_argument('--list', action='store_true', help='Show applied and pending migrations')
+    parser.add_argument('--target', help='Stop after this version (e.g. 0002)')
+    args = parser.parse_args()
+
+    if args.list:
+        for migration in list_migrations():
+            status = 'applied' if migration['applied'] else 'pending'
+            print(f"{migration['version']}  {migration['name']:<30} {status}")
+        return
+
+    try:
+        applied = migrate(args.target)
+    except Exception as e:
+        raise SystemExit(f'Migration failed: {e}')
+    for version in applied:
+        print(f"Applied {version}")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 -- Spend Wise Database Schema
--- MySQL Database Migration Script
+-- 0001: initial tables, default categories and sample admin user
+--
+-- Apply with `python -m database.migrate`. Each migration records itself in
+-- schema_migrations so the MySQL container's init scripts and the runner
+-- agree on what has been applied.
 
--- Create database if not exists
-CREATE DATABASE IF NOT EXISTS spend_wise;
-USE spend_wise;
+-- Applied migrations, maintained by database/migrate.py
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(16) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- Users table
 CREATE TABLE IF NOT EXISTS user (
@@ -75,30 +83,28 @@ CREATE TABLE IF NOT EXISTS notification (
     message TEXT NOT NULL,
     user_id INT NOT NULL,
     sent BOOLEAN DEFAULT FALSE,
-    read BOOLEAN DEFAULT FALSE,
+    `read` BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     sent_at TIMESTAMP NULL,
     FOREIGN KEY (user_id) REFERENCES user(user_id) ON DELETE CASCADE
 );
 
--- Insert default categories
-INSERT IGNORE INTO category (name, description) VALUES 
-('Food', 'Food and dining expenses'),
-('Transportation', 'Transportation and travel'),
-('Entertainment', 'Entertainment and leisure'),
-('Shopping', 'Shopping and personal items'),
-('Bills', 'Utilities and bills'),
-('Healthcare', 'Medical and healthcare'),
-('Education', 'Education and learning'),
-('Other', 'Miscellaneous expenses');
-
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_expense_user_date ON expense(user_id, date);
-CREATE INDEX IF NOT EXISTS idx_expense_category ON expense(category);
-CREATE INDEX IF NOT EXISTS idx_budget_user_category ON budget(user_id, category);
-CREATE INDEX IF NOT EXISTS idx_income_user_date ON income(user_id, date);
-CREATE INDEX IF NOT EXISTS idx_notification_user_read ON notification(user_id, read);
+-- Insert default categories (once, category.name is not unique)
+INSERT INTO category (name, description)
+SELECT name, description FROM (
+    SELECT 'Food' AS name, 'Food and dining expenses' AS description
+    UNION ALL SELECT 'Transportation', 'Transportation and travel'
+    UNION ALL SELECT 'Entertainment', 'Entertainment and leisure'
+    UNION ALL SELECT 'Shopping', 'Shopping and personal items'
+    UNION ALL SELECT 'Bills', 'Utilities and bills'
+    UNION ALL SELECT 'Healthcare', 'Medical and healthcare'
+    UNION ALL SELECT 'Education', 'Education and learning'
+    UNION ALL SELECT 'Other', 'Miscellaneous expenses'
+) AS defaults
+WHERE NOT EXISTS (SELECT 1 FROM category WHERE user_id IS NULL);
 
 -- Create a sample admin user (password: admin123)
 INSERT IGNORE INTO user (username, password, email, first_name, last_name, role) VALUES 
 ('admin', '240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9', 'admin@spendwise.com', 'Admin', 'User', 'admin');
+
+INSERT IGNORE INTO schema_migrations (version, name) VALUES ('0001', 'initial_schema');
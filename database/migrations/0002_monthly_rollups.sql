@@ -0,0 +1,42 @@
+-- 0002: monthly expense and income rollups (see database/rollup_query.py)
+
+-- Monthly expense totals per category, maintained by the expense write paths
+CREATE TABLE IF NOT EXISTS expense_monthly_rollup (
+    user_id INT NOT NULL,
+    month DATE NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, category),
+    FOREIGN KEY (user_id) REFERENCES user(user_id) ON DELETE CASCADE
+);
+
+-- Monthly income totals per source, maintained by the income write paths
+CREATE TABLE IF NOT EXISTS income_monthly_rollup (
+    user_id INT NOT NULL,
+    month DATE NOT NULL,
+    source VARCHAR(100) NOT NULL,
+    total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, source),
+    FOREIGN KEY (user_id) REFERENCES user(user_id) ON DELETE CASCADE
+);
+
+-- Backfill from rows written before the rollups existed
+INSERT INTO expense_monthly_rollup (user_id, month, category, total_amount, transaction_count)
+SELECT user_id, DATE_FORMAT(date, '%Y-%m-01'), category, SUM(amount), COUNT(*)
+FROM expense
+GROUP BY user_id, DATE_FORMAT(date, '%Y-%m-01'), category
+ON DUPLICATE KEY UPDATE
+    total_amount = VALUES(total_amount),
+    transaction_count = VALUES(transaction_count);
+
+INSERT INTO income_monthly_rollup (user_id, month, source, total_amount, transaction_count)
+SELECT user_id, DATE_FORMAT(date, '%Y-%m-01'), source, SUM(amount), COUNT(*)
+FROM income
+GROUP BY user_id, DATE_FORMAT(date, '%Y-%m-01'), source
+ON DUPLICATE KEY UPDATE
+    total_amount = VALUES(total_amount),
+    transaction_count = VALUES(transaction_count);
+
+INSERT IGNORE INTO schema_migrations (version, name) VALUES ('0002', 'monthly_rollups');
@@ -0,0 +1,20 @@
+-- 0003: composite indexes for the per-user range queries
+--
+-- Every hot query filters on user_id first and then on a date range,
+-- category or read flag, so each index leads with user_id. The EXPLAIN
+-- checks in tests/integration/test_query_plans.py guard these plans.
+
+-- Date-range reads: exports, rollup edge corrections, fingerprints
+ALTER TABLE expense ADD INDEX idx_expense_user_date (user_id, date);
+
+-- Per-category reads: budget spending over a date range
+ALTER TABLE expense ADD INDEX idx_expense_user_category_date (user_id, category, date);
+
+ALTER TABLE income ADD INDEX idx_income_user_date (user_id, date);
+
+ALTER TABLE budget ADD INDEX idx_budget_user_category (user_id, category);
+
+-- Unread lists and counts, newest first
+ALTER TABLE notification ADD INDEX idx_notification_user_read_created (user_id, `read`, created_at);
+
+INSERT IGNORE INTO schema_migrations (version, name) VALUES ('0003', 'hot_path_indexes');
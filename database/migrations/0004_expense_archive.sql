@@ -0,0 +1,25 @@
+-- 0004: cold storage for old expenses
+--
+-- database/expense_archive.py moves expenses dated before the hot window
+-- (EXPENSE_HOT_MONTHS whole months) here in batches, keeping their ids.
+-- Reads whose date range starts inside the hot window touch only the
+-- expense table, so its rows and its three user_id indexes stay small
+-- enough to remain in the buffer pool. The archive carries a single
+-- secondary index for the occasional range read that reaches back here.
+-- Rollups are unaffected: a moved row still counts in its month.
+
+CREATE TABLE IF NOT EXISTS expense_archive (
+    id INT PRIMARY KEY,
+    amount DECIMAL(10, 2) NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    description TEXT,
+    date DATE NOT NULL,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_expense_archive_user_date (user_id, date),
+    FOREIGN KEY (user_id) REFERENCES user(user_id) ON DELETE CASCADE
+);
+
+INSERT IGNORE INTO schema_migrations (version, name) VALUES ('0004', 'expense_archive');
@@ -0,0 +1,14 @@
+-- 0005: flush checkpoints for write-behind expense ingestion
+--
+-- database/expense_write_behind.py stores, in the same transaction as each
+-- bulk insert, the last log sequence number it has written to MySQL. On
+-- startup, log records at or below it are skipped, so a crash between the
+-- insert and truncating the local log never inserts an expense twice.
+
+CREATE TABLE IF NOT EXISTS expense_ingest_checkpoint (
+    log_id VARCHAR(255) PRIMARY KEY,
+    last_seq BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO schema_migrations (version, name) VALUES ('0005', 'expense_ingest_checkpoint');
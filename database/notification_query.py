@@ -1,10 +1,14 @@
 import logging
 from typing import List, Optional, Dict, Any
 from database.database_connection import get_connection, release_connection
+from database.query_cache import cached_query, query_cache
+from database.retry import retry_transient
+from database.row_decoder import fetch_model, fetch_models
 from model.notification import notification
 
 logger = logging.getLogger(__name__)
 
+@retry_transient(idempotent=False)
 def create_notification(notification_data: Dict[str, Any]) -> bool:
     """Create a new notification"""
     connection = get_connection()
@@ -14,7 +18,7 @@ def create_notification(notification_data: Dict[str, Any]) -> bool:
     try:
         cursor = connection.cursor()
         query = """
-        INSERT INTO notification (notification_type, message, user_id, sent, read)
+        INSERT INTO notification (notification_type, message, user_id, sent, `read`)
         VALUES (%s, %s, %s, %s, %s)
         """
         values = (
@@ -26,6 +30,7 @@ def create_notification(notification_data: Dict[str, Any]) -> bool:
         )
         cursor.execute(query, values)
         connection.commit()
+        query_cache.invalidate_user(notification_data['user_id'], 'notification')
         logger.info(f"Notification created for user {notification_data['user_id']}")
         return True
     except Exception as e:
@@ -36,6 +41,7 @@ def create_notification(notification_data: Dict[str, Any]) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def get_notification_by_id(notification_id: int) -> Optional[notification]:
     """Get notification by ID"""
     connection = get_connection()
@@ -43,21 +49,10 @@ def get_notification_by_id(notification_id: int) -> Optional[notification]:
         return None
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         query = "SELECT * FROM notification WHERE id = %s"
         cursor.execute(query, (notification_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            return notification(
-                id=result['id'],
-                notification_type=result['notification_type'],
-                message=result['message'],
-                user_id=result['user_id'],
-                sent=result['sent'],
-                read=result['read']
-            )
-        return None
+        return fetch_model(cursor, notification)
     except Exception as e:
         logger.error(f"Error getting notification: {e}")
         return None
@@ -65,6 +60,8 @@ def get_notification_by_id(notification_id: int) -> Optional[notification]:
         cursor.close()
         release_connection(connection)
 
+@cached_query(('notification',))
+@retry_transient()
 def get_notifications_by_user(user_id: int, unread_only: bool = False, limit: int = 50, offset: int = 0) -> List[notification]:
     """Get notifications for a user"""
     connection = get_connection()
@@ -72,28 +69,16 @@ def get_notifications_by_user(user_id: int, unread_only: bool = False, limit: in
         return []
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         
         if unread_only:
-            query = "SELECT * FROM notification WHERE user_id = %s AND read = %s ORDER BY created_at DESC LIMIT %s OFFSET %s"
+            query = "SELECT * FROM notification WHERE user_id = %s AND `read` = %s ORDER BY created_at DESC LIMIT %s OFFSET %s"
             cursor.execute(query, (user_id, False, limit, offset))
         else:
             query = "SELECT * FROM notification WHERE user_id = %s ORDER BY created_at DESC LIMIT %s OFFSET %s"
             cursor.execute(query, (user_id, limit, offset))
         
-        results = cursor.fetchall()
-        
-        notifications = []
-        for result in results:
-            notifications.append(notification(
-                id=result['id'],
-                notification_type=result['notification_type'],
-                message=result['message'],
-                user_id=result['user_id'],
-                sent=result['sent'],
-                read=result['read']
-            ))
-        return notifications
+        return fetch_models(cursor, notification)
     except Exception as e:
         logger.error(f"Error getting notifications: {e}")
         return []
@@ -101,6 +86,7 @@ def get_notifications_by_user(user_id: int, unread_only: bool = False, limit: in
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def mark_notification_as_read(notification_id: int, user_id: int) -> bool:
     """Mark notification as read"""
     connection = get_connection()
@@ -109,9 +95,10 @@ def mark_notification_as_read(notification_id: int, user_id: int) -> bool:
     
     try:
         cursor = connection.cursor()
-        query = "UPDATE notification SET read = %s WHERE id = %s AND user_id = %s"
+        query = "UPDATE notification SET `read` = %s WHERE id = %s AND user_id = %s"
         cursor.execute(query, (True, notification_id, user_id))
         connection.commit()
+        query_cache.invalidate_user(user_id, 'notification')
         logger.info(f"Notification {notification_id} marked as read")
         return True
     except Exception as e:
@@ -122,6 +109,7 @@ def mark_notification_as_read(notification_id: int, user_id: int) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def mark_all_notifications_as_read(user_id: int) -> bool:
     """Mark all notifications as read for a user"""
     connection = get_connection()
@@ -130,9 +118,10 @@ def mark_all_notifications_as_read(user_id: int) -> bool:
     
     try:
         cursor = connection.cursor()
-        query = "UPDATE notification SET read = %s WHERE user_id = %s AND read = %s"
+        query = "UPDATE notification SET `read` = %s WHERE user_id = %s AND `read` = %s"
         cursor.execute(query, (True, user_id, False))
         connection.commit()
+        query_cache.invalidate_user(user_id, 'notification')
         logger.info(f"All notifications marked as read for user {user_id}")
         return True
     except Exception as e:
@@ -143,6 +132,7 @@ def mark_all_notifications_as_read(user_id: int) -> bool:
         cursor.close()
         release_connection(connection)
 
+@retry_transient()
 def delete_notification(notification_id: int, user_id: int) -> bool:
     """Delete notification"""
     connection = get_connection()
@@ -154,6 +144,7 @@ def delete_notification(notification_id: int, user_id: int) -> bool:
         query = "DELETE FROM notification WHERE id = %s AND user_id = %s"
         cursor.execute(query, (notification_id, user_id))
         connection.commit()
+        query_cache.invalidate_user(user_id, 'notification')
         logger.info(f"Notification {notification_id} deleted")
         return True
     except Exception as e:
@@ -164,6 +155,8 @@ def delete_notification(notification_id: int, user_id: int) -> bool:
         cursor.close()
         release_connection(connection)
 
+@cached_query(('notification',), serve_stale=True)
+@retry_transient()
 def get_unread_count(user_id: int) -> int:
     """Get count of unread notifications for a user"""
     connection = get_connection()
@@ -172,7 +165,7 @@ def get_unread_count(user_id: int) -> int:
     
     try:
         cursor = connection.cursor()
-        query = "SELECT COUNT(*) FROM notification WHERE user_id = %s AND read = %s"
+        query = "SELECT COUNT(*) FROM notification WHERE user_id = %s AND `read` = %s"
         cursor.execute(query, (user_id, False))
         result = cursor.fetchone()
         return result[0] if result else 0
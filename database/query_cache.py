@@ -0,0 +1,215 @@
+"""
+In-process cache for per-user query results
+
+Entries are keyed by (query id, arguments) and tagged with the
+(table, user_id) pairs they were read from. Write functions in the query
+modules call invalidate() with the tags they touch after committing, so a
+cached read is never older than the last write that went through this
+process; the TTL bounds staleness from writes made elsewhere. A fill that
+started before an invalidation is discarded (see generation()), so a read
+that raced a write cannot cache the pre-write result.
+
+Cached values are shared between callers and must be treated as read-only.
+"""
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from database.circuit_breaker import note_stale
+from database.retry import error_count
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+Tag = Tuple[str, Any]
+
+class QueryCache:
+    """Bounded LRU cache with tag-based invalidation and hit/miss counters"""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float, Tuple[Tag, ...]]]' = OrderedDict()
+        self._keys_by_tag: Dict[Tag, set] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+
+    def generation(self) -> int:
+        """Token to pass to set() by a fill that reads the database after this call"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value), refreshing the entry's LRU position.
+
+        Expired entries miss but are kept (until evicted, invalidated or
+        replaced) for get_stale().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def get_stale(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) even if the entry has expired (not if invalidated)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            self.stale_hits += 1
+            return True, entry[0]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Tag], ttl_seconds: Optional[float] = None,
+            generation: Optional[int] = None):
+        """Store value under key, evicting the least recently used entries when full.
+
+        Skipped if anything was invalidated since generation().
+        """
+        if self.max_entries <= 0:
+            return
+        tags = tuple(tags)
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags: Tag) -> int:
+        """Drop every entry carrying any of the given tags.
+
+        Inside a unit of work this is deferred until the unit commits.
+        """
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.after_commit(lambda: self.invalidate(*tags))
+            return 0
+        removed = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def invalidate_user(self, user_id: Any, *tables: str) -> int:
+        """Drop a user's cached reads of the given tables"""
+        return self.invalidate(*((table, user_id) for table in tables))
+
+    def invalidate_table(self, table: str) -> int:
+        """Drop every user's cached reads of a table"""
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.after_commit(lambda: self.invalidate_table(table))
+            return 0
+        with self._lock:
+            tags = [tag for tag in self._keys_by_tag if tag[0] == table]
+        return self.invalidate(*tags)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_hits': self.stale_hits
+            }
+
+    def _remove(self, key: Hashable):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '2048')),
+    ttl_seconds=float(os.getenv('QUERY_CACHE_TTL_SECONDS', '300'))
+)
+
+def cached_query(tables: Sequence[str], ttl_seconds: Optional[float] = None, serve_stale: bool = False) -> Callable:
+    """Cache a per-user read function in query_cache.
+
+    The function must take a ``user_id`` argument; its result is tagged
+    (table, user_id) for each table it reads, and the cache key is the
+    function's qualified name plus its bound arguments. With serve_stale,
+    a failed read (e.g. while the MySQL circuit is open) returns the last
+    cached value even if it has expired, as long as no write invalidated it.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        query_id = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                key = (query_id, tuple(bound.arguments.items()))
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+
+            if current_unit_of_work() is not None:
+                # Reads inside a unit of work must see its uncommitted writes
+                return func(*args, **kwargs)
+
+            found, value = query_cache.get(key)
+            if found:
+                return value
+            generation = query_cache.generation()
+            failures = error_count()
+            value = func(*args, **kwargs)
+            if error_count() != failures:
+                # A statement failed and value is the function's fallback, not data
+                if serve_stale:
+                    found, stale_value = query_cache.get_stale(key)
+                    if found:
+                        note_stale()
+                        return stale_value
+                return value
+            user_id = bound.arguments['user_id']
+            query_cache.set(key, value, [(table, user_id) for table in tables], ttl_seconds, generation)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,264 @@
+"""
+Statement profiling: slow-query log and per-request N+1 detection
+
+get_connection() hands out connections whose cursors are ProfilingCursor
+wrappers. Each execute() is timed and recorded under its normalized text
+(literals and placeholders replaced by ?, repeated VALUES groups folded),
+so statements that differ only in their parameters share one shape.
+
+- Statements slower than SLOW_QUERY_THRESHOLD_MS are logged as warnings on
+  the "database.slow_query" logger.
+- Inside request_scope(), a shape that runs more than N_PLUS_ONE_THRESHOLD
+  times is reported once per request as a likely N+1. With strict=True
+  (or QUERY_PROFILER_STRICT=true) the scope raises NPlusOneError on exit,
+  which is how tests turn the warning into a failure.
+
+Failed statements and commits are also reported to the retry policy
+(database.retry), and every outcome and duration to the circuit breaker
+(database.circuit_breaker), so connections are wrapped even when
+QUERY_PROFILING is off; only the stats and logs are skipped then.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from database.circuit_breaker import db_circuit
+from database.retry import note_error
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('database.slow_query')
+
+PROFILING_ENABLED = os.getenv('QUERY_PROFILING', 'true').lower() == 'true'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '10'))
+STRICT_MODE = os.getenv('QUERY_PROFILER_STRICT', 'false').lower() == 'true'
+
+# Distinct statement shapes tracked in the process-wide stats
+MAX_TRACKED_STATEMENTS = 500
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_REPEATED_GROUPS = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+class NPlusOneError(AssertionError):
+    """Raised by a strict request scope when a statement shape repeats too often"""
+
+def normalize_statement(sql: str) -> str:
+    """Reduce a statement to its shape so parameter values do not split stats"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _WHITESPACE.sub(' ', shape).strip()
+    shape = _IN_LIST.sub('IN (...)', shape)
+    shape = _REPEATED_GROUPS.sub(r'\1, ...', shape)
+    return shape
+
+class RequestProfile:
+    """Statements executed while handling one request"""
+
+    def __init__(self, label: Optional[str] = None, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.label = label
+        self.threshold = threshold
+        self.counts: Dict[str, int] = {}
+        self.query_count = 0
+        self.total_ms = 0.0
+        self.repeated: List[str] = []
+
+    def record(self, statement: str, duration_ms: float):
+        self.query_count += 1
+        self.total_ms += duration_ms
+        count = self.counts.get(statement, 0) + 1
+        self.counts[statement] = count
+        if count == self.threshold + 1:
+            self.repeated.append(statement)
+            logger.warning(
+                f"Possible N+1 in {self.label or 'request'}: statement ran more than "
+                f"{self.threshold} times: {statement}"
+            )
+
+class QueryStats:
+    """Process-wide per-statement counters for the metrics endpoint"""
+
+    def __init__(self, max_statements: int = MAX_TRACKED_STATEMENTS):
+        self.max_statements = max_statements
+        self._statements: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self.total_queries = 0
+        self.slow_queries = 0
+        self.n_plus_one_warnings = 0
+
+    def record(self, statement: str, duration_ms: float, rows: int, slow: bool):
+        with self._lock:
+            self.total_queries += 1
+            if slow:
+                self.slow_queries += 1
+            entry = self._statements.get(statement)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    statement = '(other)'
+                    entry = self._statements.setdefault(statement, [0, 0.0, 0.0, 0])
+                else:
+                    entry = self._statements[statement] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += duration_ms
+            entry[2] = max(entry[2], duration_ms)
+            entry[3] += max(rows, 0)
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            busiest = sorted(self._statements.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            return {
+                'total_queries': self.total_queries,
+                'slow_queries': self.slow_queries,
+                'slow_query_threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+                'n_plus_one_warnings': self.n_plus_one_warnings,
+                'top_statements': [
+                    {
+                        'statement': statement,
+                        'count': count,
+                        'total_ms': round(total_ms, 2),
+                        'avg_ms': round(total_ms / count, 2),
+                        'max_ms': round(max_ms, 2),
+                        'rows': rows
+                    }
+                    for statement, (count, total_ms, max_ms, rows) in busiest
+                ]
+            }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.total_queries = self.slow_queries = self.n_plus_one_warnings = 0
+
+query_stats = QueryStats()
+
+_local = threading.local()
+
+def current_profile() -> Optional[RequestProfile]:
+    """The request profile active on this thread, if any"""
+    return getattr(_local, 'profile', None)
+
+@contextmanager
+def request_scope(label: Optional[str] = None, strict: Optional[bool] = None, threshold: int = N_PLUS_ONE_THRESHOLD):
+    """Collect the statements run on this thread until the block exits"""
+    previous = current_profile()
+    profile = RequestProfile(label, threshold)
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+        if profile.repeated:
+            with query_stats._lock:
+                query_stats.n_plus_one_warnings += len(profile.repeated)
+        logger.debug(f"{profile.label or 'request'}: {profile.query_count} queries in {profile.total_ms:.1f} ms")
+
+    if (STRICT_MODE if strict is None else strict) and profile.repeated:
+        raise NPlusOneError(
+            f"{profile.label or 'request'} repeated {len(profile.repeated)} statement(s) more than "
+            f"{profile.threshold} times: {profile.repeated}"
+        )
+
+def record_statement(sql: Any, duration_ms: float, rows: int):
+    """Record one executed statement in the stats, slow log and request profile"""
+    if not PROFILING_ENABLED:
+        return
+    statement = normalize_statement(sql)
+    slow = duration_ms >= SLOW_QUERY_THRESHOLD_MS
+    if slow:
+        slow_query_logger.warning(f"Slow query ({duration_ms:.1f} ms, {rows} rows): {statement}")
+    query_stats.record(statement, duration_ms, rows, slow)
+    profile = current_profile()
+    if profile is not None:
+        profile.record(statement, duration_ms)
+
+class ProfilingCursor:
+    """Cursor wrapper that times execute() and executemany()"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        except Exception as e:
+            error = e
+            note_error(e)
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            record_statement(operation, duration_ms, self._rowcount())
+            db_circuit.record_statement(duration_ms, error)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        except Exception as e:
+            error = e
+            note_error(e)
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            record_statement(operation, duration_ms, self._rowcount())
+            db_circuit.record_statement(duration_ms, error)
+
+    def _rowcount(self) -> int:
+        try:
+            return int(self._cursor.rowcount)
+        except (TypeError, ValueError, AttributeError):
+            return -1
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class ProfilingConnection:
+    """Connection wrapper whose cursors are ProfilingCursor instances"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return ProfilingCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._connection.commit()
+        except Exception as e:
+            error = e
+            note_error(e)
+            raise
+        finally:
+            db_circuit.record_statement((time.perf_counter() - started) * 1000, error)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def wrap_connection(connection):
+    """Wrap a pooled connection for profiling and retry bookkeeping"""
+    if connection is None:
+        return connection
+    return ProfilingConnection(connection)
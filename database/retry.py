@@ -0,0 +1,150 @@
+"""
+Retry policy for transient MySQL errors
+
+Query functions catch their own exceptions and return False, None, [] or
+{}, so a deadlock or a connection dropped by a pool recycle used to reach
+the controller as an ordinary failure and become a 500. The cursor wrapper
+reports every failed statement through note_error(); a function decorated
+with @retry_transient that saw a transient error is called again after a
+jittered backoff, and since each call checks out its own connection the
+retry runs on a fresh pooled one.
+
+- Deadlock (1213) and lock wait timeout (1205): the transaction was rolled
+  back, so any function may be retried.
+- Server gone away / lost connection (2006, 2013, 2055): the failure may
+  have hit the COMMIT after the server applied it, so only functions
+  declared idempotent are retried.
+
+Only the outermost decorated call on a thread retries (it repeats its whole
+operation), and nothing is retried inside a unit of work, whose transaction
+the error has already rolled back.
+"""
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+SERVER_GONE_AWAY = 2006
+SERVER_LOST = 2013
+SERVER_LOST_EXTENDED = 2055
+
+# The server rolled the transaction back; nothing was applied
+ROLLED_BACK_ERRORS = frozenset({DEADLOCK, LOCK_WAIT_TIMEOUT})
+# The connection died; a COMMIT in flight may or may not have been applied
+CONNECTION_ERRORS = frozenset({SERVER_GONE_AWAY, SERVER_LOST, SERVER_LOST_EXTENDED})
+
+RETRY_ATTEMPTS = int(os.getenv('DB_RETRY_ATTEMPTS', '3'))
+RETRY_BASE_DELAY_MS = float(os.getenv('DB_RETRY_BASE_DELAY_MS', '50'))
+RETRY_MAX_DELAY_MS = float(os.getenv('DB_RETRY_MAX_DELAY_MS', '1000'))
+
+def error_code(error: BaseException) -> Optional[int]:
+    """MySQL error number of an exception, if it has one"""
+    return getattr(error, 'errno', None)
+
+def is_transient(error: BaseException, idempotent: bool = True) -> bool:
+    """Whether an operation that failed with error may be run again"""
+    code = error_code(error)
+    return code in ROLLED_BACK_ERRORS or (idempotent and code in CONNECTION_ERRORS)
+
+def backoff_delay(attempt: int, base_ms: float = None, max_ms: float = None) -> float:
+    """Seconds to wait before retry number attempt (1-based), with full jitter"""
+    base_ms = RETRY_BASE_DELAY_MS if base_ms is None else base_ms
+    max_ms = RETRY_MAX_DELAY_MS if max_ms is None else max_ms
+    return random.uniform(0, min(max_ms, base_ms * 2 ** (attempt - 1))) / 1000
+
+class RetryStats:
+    """Process-wide retry counters for the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.by_error = {}
+
+    def record_retry(self, code: int):
+        with self._lock:
+            self.retries += 1
+            self.by_error[code] = self.by_error.get(code, 0) + 1
+
+    def record_outcome(self, recovered: bool):
+        with self._lock:
+            if recovered:
+                self.recovered += 1
+            else:
+                self.exhausted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'exhausted': self.exhausted,
+                'by_error': {str(code): count for code, count in sorted(self.by_error.items())}
+            }
+
+retry_stats = RetryStats()
+
+_local = threading.local()
+
+def error_count() -> int:
+    """Failed statements seen on this thread so far (for callers to diff)"""
+    return getattr(_local, 'count', 0)
+
+def note_error(error: BaseException):
+    """Record a failed statement for the decorated call active on this thread"""
+    _local.count = error_count() + 1
+    errors: Optional[List[BaseException]] = getattr(_local, 'errors', None)
+    if errors is not None:
+        errors.append(error)
+
+def retry_transient(idempotent: bool = True, attempts: int = None) -> Callable:
+    """Call the decorated query function again after transient MySQL errors.
+
+    Pass idempotent=False for functions whose effect must not be applied
+    twice (plain INSERTs, rollup deltas); they are only retried when the
+    server reports that it rolled the transaction back.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'errors', None) is not None or current_unit_of_work() is not None:
+                return func(*args, **kwargs)
+
+            max_attempts = RETRY_ATTEMPTS if attempts is None else attempts
+            attempt = 1
+            while True:
+                _local.errors = []
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    errors, _local.errors = _local.errors, None
+
+                transient = next((error for error in errors if is_transient(error, idempotent)), None)
+                if transient is None:
+                    if attempt > 1:
+                        retry_stats.record_outcome(recovered=not errors)
+                    return result
+                if attempt >= max_attempts:
+                    retry_stats.record_outcome(recovered=False)
+                    logger.error(f"{func.__name__} failed after {attempt} attempts: {transient}")
+                    return result
+
+                code = error_code(transient)
+                retry_stats.record_retry(code)
+                delay = backoff_delay(attempt)
+                logger.warning(f"{func.__name__} hit MySQL error {code}, retrying in {delay * 1000:.0f} ms")
+                time.sleep(delay)
+                attempt += 1
+
+        return wrapper
+    return decorator
@@ -0,0 +1,338 @@
+"""
+Monthly aggregate tables for expenses and incomes
+
+expense_monthly_rollup holds SUM/COUNT per (user_id, month, category) and
+income_monthly_rollup per (user_id, month, source). Write paths apply
+deltas inside their own transaction, so the rollups always agree with the
+raw tables. Range reads use whole months from the rollups and scan raw
+rows only for the uncovered part of the first and last month.
+
+Rebuild the tables from the raw data with:
+
+    python -m database.rollup_query [--user-id ID]
+"""
+import argparse
+import calendar
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.database_connection import get_connection, release_connection
+from database.expense_archive import expense_select
+from database.query_cache import cached_query, query_cache
+from database.retry import retry_transient
+
+logger = logging.getLogger(__name__)
+
+# Rollup keys written per INSERT ... ON DUPLICATE KEY UPDATE statement
+DELTA_CHUNK_SIZE = 500
+
+ROLLUPS = {
+    'expense': {'table': 'expense_monthly_rollup', 'source_table': 'expense', 'dimension': 'category'},
+    'income': {'table': 'income_monthly_rollup', 'source_table': 'income', 'dimension': 'source'}
+}
+
+def _to_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def month_start(value: Any) -> date:
+    """First day of the month containing value"""
+    return _to_date(value).replace(day=1)
+
+def month_end(value: Any) -> date:
+    """Last day of the month containing value"""
+    day = _to_date(value)
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+def _next_month(value: date) -> date:
+    return month_end(value) + timedelta(days=1)
+
+def _previous_month(value: date) -> date:
+    return month_start(month_start(value) - timedelta(days=1))
+
+def plan_range(start: Any = None, end: Any = None) -> List[Tuple]:
+    """Split an inclusive date range into rollup and raw-table segments.
+
+    Returns ('rollup', first_month, last_month) for whole months (either
+    bound may be None for open ranges) and ('raw', sign, from_date, to_date)
+    corrections. A partial edge month is read from the rollup and corrected
+    by subtracting the excluded days when that is the shorter raw scan,
+    otherwise the included days are scanned directly.
+    """
+    start = _to_date(start) if start else None
+    end = _to_date(end) if end else None
+    if start and end and start > end:
+        return []
+
+    segments = []
+    first_month = month_start(start) if start else None
+    last_month = month_start(end) if end else None
+
+    if start and end and first_month == last_month:
+        included = (end - start).days + 1
+        excluded = (month_end(start) - month_start(start)).days + 1 - included
+        if included <= excluded:
+            return [('raw', 1, start, end)]
+        segments.append(('rollup', first_month, last_month))
+        if start > first_month:
+            segments.append(('raw', -1, first_month, start - timedelta(days=1)))
+        if end < month_end(end):
+            segments.append(('raw', -1, end + timedelta(days=1), month_end(end)))
+        return segments
+
+    if start and start > first_month:
+        excluded = (start - first_month).days
+        included = (month_end(start) - start).days + 1
+        if included < excluded:
+            segments.append(('raw', 1, start, month_end(start)))
+            first_month = _next_month(start)
+        else:
+            segments.append(('raw', -1, first_month, start - timedelta(days=1)))
+
+    if end and end < month_end(end):
+        included = (end - last_month).days + 1
+        excluded = (month_end(end) - end).days
+        if included < excluded:
+            segments.append(('raw', 1, last_month, end))
+            last_month = _previous_month(end)
+        else:
+            segments.append(('raw', -1, end + timedelta(days=1), month_end(end)))
+
+    if first_month is None or last_month is None or first_month <= last_month:
+        segments.insert(0, ('rollup', first_month, last_month))
+    return segments
+
+def _group_expression(kind: str, group_by: Optional[str], from_rollup: bool) -> Optional[str]:
+    if group_by == 'dimension':
+        return ROLLUPS[kind]['dimension']
+    if group_by == 'month':
+        return 'month' if from_rollup else "DATE_FORMAT(date, '%Y-%m-01')"
+    return None
+
+def _source_select(kind: str, query: str, values: List[Any], start_date: Any = None) -> Tuple[str, List[Any]]:
+    """Point a raw-row query written against {table} at the kind's source table(s).
+
+    Expenses older than the hot window live in expense_archive as well; the
+    union then returns a row per table and key, which _aggregate adds up.
+    """
+    if kind == 'expense':
+        return expense_select(query, values, start_date)
+    return query.format(table=ROLLUPS[kind]['source_table']), values
+
+def _aggregate(kind: str, user_id: int, start: Any = None, end: Any = None,
+               group_by: Optional[str] = None, dimension_value: Optional[str] = None) -> Dict[Any, List[float]]:
+    """Sum amounts and counts over a date range, keyed by the grouping column"""
+    config = ROLLUPS[kind]
+    totals: Dict[Any, List[float]] = defaultdict(lambda: [0.0, 0])
+
+    connection = get_connection()
+    if connection is None:
+        return totals
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        for segment in plan_range(start, end):
+            from_rollup = segment[0] == 'rollup'
+            group_expression = _group_expression(kind, group_by, from_rollup)
+            select_key = f"{group_expression} AS group_key" if group_expression else "NULL AS group_key"
+
+            if from_rollup:
+                _, first_month, last_month = segment
+                sign = 1
+                query = f"""
+                SELECT {select_key}, SUM(total_amount), SUM(transaction_count)
+                FROM {config['table']}
+                WHERE user_id = %s
+                """
+                values = [user_id]
+                if first_month:
+                    query += " AND month >= %s"
+                    values.append(first_month)
+                if last_month:
+                    query += " AND month <= %s"
+                    values.append(last_month)
+            else:
+                _, sign, from_date, to_date = segment
+                query = f"""
+                SELECT {select_key}, SUM(amount), COUNT(*)
+                FROM {{table}}
+                WHERE user_id = %s AND date BETWEEN %s AND %s
+                """
+                values = [user_id, from_date, to_date]
+
+            if dimension_value is not None:
+                query += f" AND {config['dimension']} = %s"
+                values.append(dimension_value)
+            if group_expression:
+                query += " GROUP BY group_key"
+            if not from_rollup:
+                query, values = _source_select(kind, query, values, segment[2])
+
+            cursor.execute(query, values)
+            for group_key, total, count in cursor.fetchall():
+                if group_by == 'month' and group_key is not None:
+                    group_key = str(group_key)[:7]
+                totals[group_key][0] += sign * float(total or 0)
+                totals[group_key][1] += sign * int(count or 0)
+
+        # Drop keys whose corrections cancelled them out entirely
+        return {key: value for key, value in totals.items() if value[1] > 0}
+    except Exception as e:
+        logger.error(f"Error aggregating {kind} totals: {e}")
+        return {}
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+@cached_query(('expense',), serve_stale=True)
+@retry_transient()
+def get_expense_totals(user_id: int, start_date: Any = None, end_date: Any = None, category: str = None) -> Dict[str, float]:
+    """Total amount and transaction count of expenses in a date range"""
+    total, count = _aggregate('expense', user_id, start_date, end_date, None, category).get(None, [0.0, 0])
+    return {'total': round(total, 2), 'count': count}
+
+@cached_query(('expense',), serve_stale=True)
+@retry_transient()
+def get_expense_category_totals(user_id: int, start_date: Any = None, end_date: Any = None) -> List[Dict[str, Any]]:
+    """Per-category expense totals, largest first"""
+    totals = _aggregate('expense', user_id, start_date, end_date, 'dimension')
+    rows = [
+        {'category': category, 'count': count, 'total': round(total, 2), 'avg_amount': round(total / count, 2)}
+        for category, (total, count) in totals.items()
+    ]
+    return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+@cached_query(('expense',), serve_stale=True)
+@retry_transient()
+def get_expense_monthly_totals(user_id: int, start_date: Any = None, end_date: Any = None) -> List[Dict[str, Any]]:
+    """Per-month expense totals keyed 'YYYY-MM', newest first"""
+    totals = _aggregate('expense', user_id, start_date, end_date, 'month')
+    return [
+        {'month': month, 'total': round(total, 2), 'count': count}
+        for month, (total, count) in sorted(totals.items(), reverse=True)
+    ]
+
+@cached_query(('income',), serve_stale=True)
+@retry_transient()
+def get_income_totals(user_id: int, start_date: Any = None, end_date: Any = None) -> Dict[str, float]:
+    """Total amount and transaction count of incomes in a date range"""
+    total, count = _aggregate('income', user_id, start_date, end_date).get(None, [0.0, 0])
+    return {'total': round(total, 2), 'count': count}
+
+@cached_query(('income',), serve_stale=True)
+@retry_transient()
+def get_income_source_totals(user_id: int, start_date: Any = None, end_date: Any = None) -> List[Dict[str, Any]]:
+    """Per-source income totals, largest first"""
+    totals = _aggregate('income', user_id, start_date, end_date, 'dimension')
+    rows = [
+        {'source': source, 'count': count, 'total': round(total, 2), 'avg_amount': round(total / count, 2)}
+        for source, (total, count) in totals.items()
+    ]
+    return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+@cached_query(('income',), serve_stale=True)
+@retry_transient()
+def get_income_monthly_totals(user_id: int, start_date: Any = None, end_date: Any = None) -> List[Dict[str, Any]]:
+    """Per-month income totals keyed 'YYYY-MM', newest first"""
+    totals = _aggregate('income', user_id, start_date, end_date, 'month')
+    return [
+        {'month': month, 'total': round(total, 2), 'count': count}
+        for month, (total, count) in sorted(totals.items(), reverse=True)
+    ]
+
+def apply_deltas(cursor, kind: str, deltas: Dict[Tuple[int, date, str], List]):
+    """Add (amount, count) deltas keyed by (user_id, month, dimension) to a rollup.
+
+    Runs on the caller's cursor so the change commits or rolls back with the
+    write that caused it.
+    """
+    if not deltas:
+        return
+
+    config = ROLLUPS[kind]
+    rows = list(deltas.items())
+    for start in range(0, len(rows), DELTA_CHUNK_SIZE):
+        chunk = rows[start:start + DELTA_CHUNK_SIZE]
+        query = f"""
+        INSERT INTO {config['table']} (user_id, month, {config['dimension']}, total_amount, transaction_count)
+        VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+        ON DUPLICATE KEY UPDATE
+            total_amount = total_amount + VALUES(total_amount),
+            transaction_count = transaction_count + VALUES(transaction_count)
+        """
+        values = []
+        for (user_id, month, dimension), (amount, count) in chunk:
+            values.extend((user_id, month, dimension, amount, count))
+        cursor.execute(query, values)
+
+def add_to_deltas(deltas: Dict, kind: str, record: Dict[str, Any], sign: int = 1):
+    """Accumulate one raw row into a deltas dict for apply_deltas"""
+    key = (record['user_id'], month_start(record['date']), record[ROLLUPS[kind]['dimension']])
+    entry = deltas.setdefault(key, [Decimal('0'), 0])
+    entry[0] += sign * Decimal(str(record['amount']))
+    entry[1] += sign
+
+def apply_row_delta(cursor, kind: str, record: Dict[str, Any], sign: int = 1):
+    """Apply a single raw row (sign 1 for insert, -1 for delete) to its rollup"""
+    deltas = {}
+    add_to_deltas(deltas, kind, record, sign)
+    apply_deltas(cursor, kind, deltas)
+
+@retry_transient()
+def rebuild_rollups(user_id: int = None) -> bool:
+    """Recompute both rollup tables from the raw expense (hot and archived) and income rows"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        for kind, config in ROLLUPS.items():
+            user_filter = " WHERE user_id = %s" if user_id is not None else ""
+            values = (user_id,) if user_id is not None else ()
+
+            cursor.execute(f"DELETE FROM {config['table']}{user_filter}", values)
+            source, source_values = _source_select(
+                kind, f"SELECT user_id, date, {config['dimension']}, amount FROM {{table}}{user_filter}", list(values)
+            )
+            cursor.execute(f"""
+            INSERT INTO {config['table']} (user_id, month, {config['dimension']}, total_amount, transaction_count)
+            SELECT user_id, DATE_FORMAT(date, '%Y-%m-01'), {config['dimension']}, SUM(amount), COUNT(*)
+            FROM ({source}) AS source_rows
+            GROUP BY user_id, DATE_FORMAT(date, '%Y-%m-01'), {config['dimension']}
+            """, source_values)
+        connection.commit()
+        if user_id is not None:
+            query_cache.invalidate_user(user_id, *ROLLUPS)
+        else:
+            query_cache.clear()
+        logger.info(f"Rollups rebuilt for {'user ' + str(user_id) if user_id is not None else 'all users'}")
+        return True
+    except Exception as e:
+        logger.error(f"Error rebuilding rollups: {e}")
+        connection.rollback()
+        return False
+    finally:
+        if cursor is not None:
+            cursor.close()
+        release_connection(connection)
+
+def main():
+    """Rebuild rollup tables from the command line"""
+    parser = argparse.ArgumentParser(description='Rebuild monthly expense and income rollups')
+    parser.add_argument('--user-id', type=int, help='Only rebuild this user (default: all users)')
+    args = parser.parse_args()
+    if not rebuild_rollups(args.user_id):
+        raise SystemExit('Rollup rebuild failed')
+
+if __name__ == '__main__':
+    main()
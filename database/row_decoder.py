@@ -0,0 +1,96 @@
+"""
+Decode tuple rows straight into model instances
+
+Query functions used to ask for cursor(dictionary=True), which builds a
+dict per row, and then copy fields out of it by name into a model. Here
+the cursor returns plain tuples, and the column layout of the result
+(cursor.description) is resolved once into an itemgetter over the model's
+constructor parameters. Each row then costs one tuple slice and one
+constructor call, with no intermediate dict and no per-row key lookups.
+
+Decoders are cached per (model, result columns), so every statement with
+the same column layout shares one. Dataclass fields outside the
+constructor (init=False, such as created_at on the models) are assigned
+from their column when the result has one; other columns the model does
+not take (updated_at from SELECT *) are ignored. Model.from_row() goes
+through the same cache.
+"""
+import dataclasses
+import inspect
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Type, TypeVar
+
+T = TypeVar('T')
+
+_MISSING = inspect.Parameter.empty
+
+def column_names(cursor) -> Tuple[str, ...]:
+    """Column names of the cursor's current result"""
+    return tuple(column[0] for column in cursor.description)
+
+def _constructor_fields(model: type) -> List[Tuple[str, Any]]:
+    """(name, default) for each positional constructor parameter of model"""
+    parameters = inspect.signature(model).parameters.values()
+    return [(parameter.name, parameter.default) for parameter in parameters
+            if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)]
+
+@lru_cache(maxsize=256)
+def row_decoder(model: Type[T], columns: Tuple[str, ...]) -> Callable[[Sequence[Any]], T]:
+    """Build a function turning one row with these columns into a model instance.
+
+    Raises ValueError if the result lacks a column for a required parameter.
+    A missing optional parameter takes its default.
+    """
+    index = {name: position for position, name in enumerate(columns)}
+    fields = _constructor_fields(model)
+    # Trailing optional parameters with no column are simply not passed
+    while fields and fields[-1][0] not in index and fields[-1][1] is not _MISSING:
+        fields.pop()
+
+    positions: List[Optional[int]] = []
+    for name, default in fields:
+        if name in index:
+            positions.append(index[name])
+        elif default is _MISSING:
+            raise ValueError(f"Result has no column '{name}' for {model.__name__}")
+        else:
+            positions.append(None)
+
+    if None in positions:
+        defaults = [default for _, default in fields]
+        sources = list(zip(positions, defaults))
+        construct = lambda row: model(*[row[position] if position is not None else default
+                                        for position, default in sources])
+    elif len(positions) == 1:
+        position = positions[0]
+        construct = lambda row: model(row[position])
+    else:
+        getter = itemgetter(*positions)
+        construct = lambda row: model(*getter(row))
+
+    extras = ()
+    if dataclasses.is_dataclass(model):
+        extras = tuple((field.name, index[field.name]) for field in dataclasses.fields(model)
+                       if not field.init and field.name in index)
+    if not extras:
+        return construct
+
+    def decode(row):
+        instance = construct(row)
+        for name, position in extras:
+            setattr(instance, name, row[position])
+        return instance
+    return decode
+
+def fetch_models(cursor, model: Type[T]) -> List[T]:
+    """Fetch every remaining row of the executed cursor as model instances"""
+    decode = row_decoder(model, column_names(cursor))
+    return list(map(decode, cursor.fetchall()))
+
+def fetch_model(cursor, model: Type[T]) -> Optional[T]:
+    """Fetch the next row of the executed cursor as a model instance, or None"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row_decoder(model, column_names(cursor))(row)
@@ -0,0 +1,117 @@
+"""
+Unit of work: several query-module calls in one transaction
+
+Inside ``with unit_of_work():`` every get_connection() on the same thread
+returns one shared connection. Query functions keep their usual
+commit/rollback/release calls, but on the shared connection those calls
+only mark the unit. The unit commits once on exit, or rolls back once if
+the block raised or any query function rolled back. Cache invalidations
+requested during the unit run after the commit.
+
+    with unit_of_work():
+        expense_query.create_expense(expense_data)
+        notification_query.create_budget_alert(...)
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class TransactionAborted(RuntimeError):
+    """Raised on exit from a unit of work whose writes were rolled back"""
+
+class UnitOfWork:
+    """State of the transaction active on one thread"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rollback_only = False
+        self.committed = False
+        self._after_commit: List[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Run callback once the unit has committed (dropped on rollback)"""
+        self._after_commit.append(callback)
+
+class _SharedConnection:
+    """The unit's connection as seen by query functions"""
+
+    def __init__(self, unit: UnitOfWork):
+        self._unit = unit
+
+    def commit(self):
+        # Deferred to the end of the unit
+        pass
+
+    def rollback(self):
+        self._unit.rollback_only = True
+
+    def close(self):
+        # Released by the unit, not by each query function
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._unit.connection, name)
+
+_local = threading.local()
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """The unit of work active on this thread, if any"""
+    return getattr(_local, 'unit', None)
+
+def shared_connection():
+    """Connection for query functions to use inside a unit, else None"""
+    unit = current_unit_of_work()
+    return _SharedConnection(unit) if unit is not None else None
+
+def after_commit(callback: Callable[[], None]):
+    """Defer callback to the end of the active unit, or run it now"""
+    unit = current_unit_of_work()
+    if unit is None:
+        callback()
+    else:
+        unit.after_commit(callback)
+
+@contextmanager
+def unit_of_work():
+    """Run the block's query-module writes in one transaction.
+
+    Nested units join the outer one. Raises TransactionAborted if a query
+    function inside the block rolled back, and re-raises any exception from
+    the block after rolling back.
+    """
+    outer = current_unit_of_work()
+    if outer is not None:
+        yield outer
+        return
+
+    from database.database_connection import checkout_connection, release_connection
+
+    connection = checkout_connection()
+    if connection is None:
+        raise TransactionAborted("Database connection unavailable")
+
+    unit = UnitOfWork(connection)
+    _local.unit = unit
+    try:
+        try:
+            yield unit
+        except BaseException:
+            connection.rollback()
+            raise
+        if unit.rollback_only:
+            connection.rollback()
+            raise TransactionAborted("A write in the unit of work failed; all of its writes were rolled back")
+        connection.commit()
+        unit.committed = True
+    finally:
+        _local.unit = None
+        release_connection(connection)
+
+    for callback in unit._after_commit:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error in after-commit callback: {e}")
@@ -0,0 +1,115 @@
+"""
+In-process cache of user profiles keyed by user_id
+
+A profile is the public part of a user row (no password hash): what
+GET /users/{id} returns and what authorize() reads the role from. It is
+filled at login by authenticate_user and on a miss by
+user_query.get_user_profile, and dropped by update_user and delete_user
+once they commit. The TTL bounds staleness from writes made by other
+processes.
+
+A fill that started before an invalidation is discarded (see
+generation()), so a profile read just before an update cannot be cached
+after it.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ('user_id', 'username', 'email', 'phone_number', 'first_name', 'last_name', 'role')
+
+def profile_of(record: Any) -> Dict[str, Any]:
+    """The profile fields of a user model or row dict"""
+    if isinstance(record, dict):
+        return {name: record[name] for name in PROFILE_FIELDS}
+    return {name: getattr(record, name) for name in PROFILE_FIELDS}
+
+class UserProfileCache:
+    """Bounded LRU of profiles by user_id with a TTL and hit/miss counters"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[int, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self) -> int:
+        """Token to pass to set() by a fill that reads the database after this call"""
+        with self._lock:
+            return self._generation
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """A copy of the cached profile, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[0])
+
+    def set(self, user_id: int, profile: Dict[str, Any], generation: Optional[int] = None):
+        """Cache a profile, unless a user was invalidated since generation()"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user_id] = (dict(profile), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        """Drop a user's profile after a write.
+
+        Inside a unit of work this is deferred until the unit commits.
+        """
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.after_commit(lambda: self.invalidate(user_id))
+            return
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+user_profiles = UserProfileCache(
+    max_entries=int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.getenv('USER_CACHE_TTL_SECONDS', '300'))
+)
@@ -1,96 +1,156 @@
-import database_connection
-from user import user
+import logging
+from typing import Any, Dict, List, Optional
+from database.database_connection import get_connection, release_connection
+from database.retry import retry_transient
+from database.row_decoder import fetch_model
+from database.user_cache import PROFILE_FIELDS, user_profiles
+from model.user import user
 
-def create_user(user):
-    connection = database_connection.create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            sql = """INSERT INTO user (username, password, email, phone_number, first_name, last_name, role) 
-                     VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-            cursor.execute(sql, (user.username, user.password, user.email, user.phone_number, 
-                                 user.first_name, user.last_name, user.role))
-            connection.commit()
-            return True
-        except Exception as e:
-            print(f"Error creating user: {e}")
-            return False
-        finally:
-            database_connection.close_connection(connection)
-    else:
+logger = logging.getLogger(__name__)
+
+@retry_transient(idempotent=False)
+def create_user(user_record: user) -> bool:
+    """Create a new user"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        query = """
+        INSERT INTO user (username, password, email, phone_number, first_name, last_name, role)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(query, (user_record.username, user_record.password, user_record.email,
+                               user_record.phone_number, user_record.first_name, user_record.last_name,
+                               user_record.role))
+        connection.commit()
+        logger.info(f"User {user_record.username} created")
+        return True
+    except Exception as e:
+        logger.error(f"Error creating user: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def update_user(user_record: user) -> bool:
+    """Update a user's details and password (not the role)"""
+    connection = get_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        query = """
+        UPDATE user SET username = %s, password = %s, email = %s, phone_number = %s,
+        first_name = %s, last_name = %s
+        WHERE user_id = %s
+        """
+        cursor.execute(query, (user_record.username, user_record.password, user_record.email,
+                               user_record.phone_number, user_record.first_name, user_record.last_name,
+                               user_record.user_id))
+        connection.commit()
+        user_profiles.invalidate(user_record.user_id)
+        logger.info(f"User {user_record.user_id} updated")
+        return True
+    except Exception as e:
+        logger.error(f"Error updating user: {e}")
+        connection.rollback()
         return False
+    finally:
+        cursor.close()
+        release_connection(connection)
 
-def update_user(user):
-    connection = database_connection.create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            sql = """UPDATE user SET username=%s, password=%s, email=%s, phone_number=%s, 
-                     first_name=%s, last_name=%s WHERE user_id=%s"""
-            cursor.execute(sql, (user.username, user.password, user.email, user.phone_number, 
-                                 user.first_name, user.last_name, user.user_id))
-            connection.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating user: {e}")
-            return False
-        finally:
-            database_connection.close_connection(connection)
-    else:
+@retry_transient()
+def delete_user(user_id: int) -> bool:
+    """Delete user"""
+    connection = get_connection()
+    if connection is None:
         return False
 
-def delete_user(user_id):
-    connection = database_connection.create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            sql = "DELETE FROM user WHERE user_id = %s"
-            cursor.execute(sql, (user_id,))
-            connection.commit()
-            return True
-        except Exception as e:
-            print(f"Error deleting user: {e}")
-            return False
-        finally:
-            database_connection.close_connection(connection)
-    else:
+    try:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM user WHERE user_id = %s", (user_id,))
+        connection.commit()
+        user_profiles.invalidate(user_id)
+        logger.info(f"User {user_id} deleted")
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting user: {e}")
+        connection.rollback()
         return False
+    finally:
+        cursor.close()
+        release_connection(connection)
 
-def get_user_by_id(user_id):
-    connection = database_connection.create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            sql = "SELECT * FROM user WHERE user_id = %s"
-            cursor.execute(sql, (user_id,))
-            user_record = cursor.fetchone()
-            if user_record:
-                user = user(*user_record)
-                return user
-            else:
-                return None
-        except Exception as e:
-            print(f"Error getting user by ID: {e}")
-            return None
-        finally:
-            database_connection.close_connection(connection)
-    else:
+@retry_transient()
+def get_user_by_id(user_id: int) -> Optional[user]:
+    """Get the full user row (with password hash) by ID"""
+    connection = get_connection()
+    if connection is None:
         return None
 
-def get_all_users():
-    connection = database_connection.create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            sql = "SELECT * FROM user"
-            cursor.execute(sql)
-            users_records = cursor.fetchall()
-            users = [user(*user_record) for user_record in users_records]
-            return users
-        except Exception as e:
-            print(f"Error getting all users: {e}")
-            return None
-        finally:
-            database_connection.close_connection(connection)
-    else:
+    try:
+        cursor = connection.cursor()
+        query = "SELECT * FROM user WHERE user_id = %s"
+        cursor.execute(query, (user_id,))
+        return fetch_model(cursor, user)
+    except Exception as e:
+        logger.error(f"Error getting user by ID: {e}")
         return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+@retry_transient()
+def get_profile_row(user_id: int) -> Optional[Dict[str, Any]]:
+    """The profile columns of a user row, or None"""
+    connection = get_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        query = f"SELECT {', '.join(PROFILE_FIELDS)} FROM user WHERE user_id = %s"
+        cursor.execute(query, (user_id,))
+        row = cursor.fetchone()
+        return dict(zip(PROFILE_FIELDS, row)) if row else None
+    except Exception as e:
+        logger.error(f"Error getting user profile: {e}")
+        return None
+    finally:
+        cursor.close()
+        release_connection(connection)
+
+def get_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
+    """A user's profile (no password hash) from user_profiles, read through on a miss"""
+    profile = user_profiles.get(user_id)
+    if profile is not None:
+        return profile
+    generation = user_profiles.generation()
+    profile = get_profile_row(user_id)
+    if profile is not None:
+        user_profiles.set(user_id, profile, generation)
+    return profile
+
+@retry_transient()
+def get_all_users() -> List[Dict[str, Any]]:
+    """Profiles of every user, without password hashes"""
+    connection = get_connection()
+    if connection is None:
+        return []
+
+    try:
+        cursor = connection.cursor()
+        query = f"SELECT {', '.join(PROFILE_FIELDS)} FROM user ORDER BY user_id"
+        cursor.execute(query)
+        return [dict(zip(PROFILE_FIELDS, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Error getting all users: {e}")
+        return []
+    finally:
+        cursor.close()
+        release_connection(connection)
@@ -0,0 +1,66 @@
+"""
+Shared plumbing for the model classes
+
+Models are slotted dataclasses, so an instance carries no __dict__ and
+construction is a plain __init__ that only assigns its parameters.
+Values that are rarely read (created_at on a row that was just loaded
+for a list) are declared init=False and listed in _lazy_defaults: the
+slot stays empty until first access, when the factory fills it. Rows
+loaded from MySQL that carry the column get the stored value instead.
+
+to_dict() and to_json() read fields through an attrgetter built once per
+class by @model, rather than walking dataclasses.fields() or __dict__
+on every call.
+"""
+import json
+from dataclasses import dataclass, fields
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, Sequence
+
+def now_iso(instance: Any = None) -> str:
+    return datetime.now().isoformat()
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class Model:
+    """Base class for @model dataclasses"""
+    __slots__ = ()
+
+    # Field name -> factory(instance), for init=False fields filled on first access
+    _lazy_defaults: Dict[str, Callable[[Any], Any]] = {}
+    _field_names: tuple = ()
+    _field_values: Callable[[Any], tuple] = staticmethod(lambda instance: ())
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached when the slot is empty
+        factory = type(self)._lazy_defaults.get(name)
+        if factory is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = factory(self)
+        setattr(self, name, value)
+        return value
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any], columns: Sequence[str]):
+        """Build an instance from a tuple row with the given column names"""
+        from database.row_decoder import row_decoder
+        return row_decoder(cls, tuple(columns))(row)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._field_names, self._field_values(self)))
+
+    def to_json(self) -> str:
+        return json.dumps({name: _json_value(value) for name, value in zip(self._field_names, self._field_values(self))})
+
+def model(cls):
+    """Turn a Model subclass into a slotted dataclass with precomputed field access"""
+    cls = dataclass(slots=True)(cls)
+    cls._field_names = tuple(field.name for field in fields(cls))
+    cls._field_values = staticmethod(attrgetter(*cls._field_names))
+    return cls
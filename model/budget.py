@@ -1,12 +1,15 @@
-from typing import Optional
-from datetime import datetime
+from dataclasses import field
+from typing import Any, Optional
+from model.base import Model, model, now_iso
 
-class budget:
-    def __init__(self, id: Optional[int], amount: float, category: str, start_date: str, end_date: str, user_id: int):
-        self.id = id
-        self.amount = amount
-        self.category = category
-        self.start_date = start_date
-        self.end_date = end_date
-        self.user_id = user_id
-        self.created_at = datetime.now().isoformat()
\ No newline at end of file
+@model
+class budget(Model):
+    id: Optional[int]
+    amount: float
+    category: str
+    start_date: str
+    end_date: str
+    user_id: int
+    created_at: Any = field(init=False, repr=False, compare=False)
+
+    _lazy_defaults = {'created_at': now_iso}
@@ -1,6 +1,11 @@
-class expense:
-    def __init__(self, id: int, amount: float, category: str, date: str):
-        self.id = id
-        self.amount = amount
-        self.category = category
-        self.date = date
\ No newline at end of file
+from typing import Optional
+from model.base import Model, model
+
+@model
+class expense(Model):
+    id: int
+    amount: float
+    category: str
+    date: str
+    description: Optional[str] = None
+    user_id: Optional[int] = None
@@ -1,11 +1,14 @@
-from typing import Optional
-from datetime import datetime
+from dataclasses import field
+from typing import Any, Optional
+from model.base import Model, model, now_iso
 
-class income:
-    def __init__(self, id: Optional[int], amount: float, source: str, date: str, user_id: int):
-        self.id = id
-        self.amount = amount
-        self.source = source
-        self.date = date
-        self.user_id = user_id
-        self.created_at = datetime.now().isoformat()
\ No newline at end of file
+@model
+class income(Model):
+    id: Optional[int]
+    amount: float
+    source: str
+    date: str
+    user_id: int
+    created_at: Any = field(init=False, repr=False, compare=False)
+
+    _lazy_defaults = {'created_at': now_iso}
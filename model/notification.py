@@ -1,13 +1,19 @@
-from typing import Optional
-from datetime import datetime
+from dataclasses import field
+from typing import Any, Optional
+from model.base import Model, model, now_iso
 
-class notification:
-    def __init__(self, id: Optional[int], notification_type: str, message: str, user_id: int, sent: bool = False, read: bool = False):
-        self.id = id
-        self.notification_type = notification_type
-        self.message = message
-        self.user_id = user_id
-        self.sent = sent
-        self.read = read
-        self.created_at = datetime.now().isoformat()
-        self.sent_at = None if not sent else datetime.now().isoformat()
\ No newline at end of file
+@model
+class notification(Model):
+    id: Optional[int]
+    notification_type: str
+    message: str
+    user_id: int
+    sent: bool = False
+    read: bool = False
+    created_at: Any = field(init=False, repr=False, compare=False)
+    sent_at: Any = field(init=False, repr=False, compare=False)
+
+    _lazy_defaults = {
+        'created_at': now_iso,
+        'sent_at': lambda instance: now_iso() if instance.sent else None
+    }
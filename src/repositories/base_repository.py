@@ -2,22 +2,60 @@
 Base repository pattern for database operations
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, TypeVar, Generic
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, TypeVar, Generic
 from contextlib import contextmanager
+import inspect
 import logging
 
 from database.database_connection import get_connection, release_connection
+from database.query_cache import query_cache
+from src.repositories.query_builder import InvalidColumnError, Query, render_insert, render_update
 
 T = TypeVar('T')
 
 logger = logging.getLogger(__name__)
 
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    """Split items into consecutive slices of at most size"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 class BaseRepository(ABC, Generic[T]):
     """Base repository with common database operations"""
     
+    # Rows per IN-list or multi-row VALUES statement in the *_many methods
+    batch_size = 500
+    
+    # Table columns; when None they are taken from the model's __init__
+    # parameters plus id and TIMESTAMP_COLUMNS
+    columns: Optional[Sequence[str]] = None
+    TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+    
     def __init__(self, model_class: type):
         self.model_class = model_class
         self.table_name = self._get_table_name()
+        self.columns = frozenset(self._get_columns())
+    
+    def _get_columns(self) -> Sequence[str]:
+        """Column whitelist used to validate every generated statement"""
+        if type(self).columns:
+            return type(self).columns
+        parameters = inspect.signature(self.model_class.__init__).parameters
+        names = [name for name, parameter in parameters.items()
+                 if name != 'self' and parameter.kind not in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)]
+        return ['id', *names, *self.TIMESTAMP_COLUMNS]
+    
+    def query(self) -> Query:
+        """Start a query on this repository's table"""
+        return Query(self.table_name, self.columns)
+    
+    def _checked(self, columns: Iterable[str]) -> tuple:
+        """Validate column names taken from model data"""
+        columns = tuple(columns)
+        for column in columns:
+            if column not in self.columns:
+                raise InvalidColumnError(f"Unknown column '{column}' for table {self.table_name}")
+        return columns
     
     @abstractmethod
     def _get_table_name(self) -> str:
@@ -34,6 +72,21 @@ class BaseRepository(ABC, Generic[T]):
         """Convert dictionary to model instance"""
         pass
     
+    def _invalidate_cache(self, data: Optional[Dict[str, Any]] = None):
+        """Drop cached query results for the rows this repository just wrote"""
+        if data and data.get('user_id') is not None:
+            query_cache.invalidate_user(data['user_id'], self.table_name)
+        else:
+            query_cache.invalidate_table(self.table_name)
+    
+    def _invalidate_cache_for(self, rows: List[Dict[str, Any]]):
+        """Invalidate once per distinct user_id in rows, or the whole table"""
+        user_ids = {row.get('user_id') for row in rows}
+        if None in user_ids:
+            query_cache.invalidate_table(self.table_name)
+        else:
+            query_cache.invalidate(*((self.table_name, user_id) for user_id in user_ids))
+    
     @contextmanager
     def _get_connection(self):
         """Context manager for database connections"""
@@ -43,6 +96,22 @@ class BaseRepository(ABC, Generic[T]):
         finally:
             release_connection(connection)
     
+    @contextmanager
+    def _transaction(self):
+        """Context manager yielding a cursor whose statements commit together"""
+        with self._get_connection() as connection:
+            if connection is None:
+                raise RuntimeError("Database connection unavailable")
+            cursor = connection.cursor(dictionary=True)
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+    
     def create(self, model: T) -> Optional[T]:
         """Create a new record"""
         try:
@@ -50,17 +119,13 @@ class BaseRepository(ABC, Generic[T]):
                 cursor = connection.cursor(dictionary=True)
                 
                 data = self._model_to_dict(model)
-                columns = list(data.keys())
-                placeholders = ', '.join(['%s'] * len(columns))
+                columns = self._checked(data.keys())
+                query = render_insert(self.table_name, columns)
                 
-                query = f"""
-                INSERT INTO {self.table_name} ({', '.join(columns)})
-                VALUES ({placeholders})
-                """
-                
-                values = list(data.values())
+                values = [data[column] for column in columns]
                 cursor.execute(query, values)
                 connection.commit()
+                self._invalidate_cache(data)
                 
                 # Get the inserted ID
                 model.id = cursor.lastrowid
@@ -72,12 +137,12 @@ class BaseRepository(ABC, Generic[T]):
     
     def get_by_id(self, id: int) -> Optional[T]:
         """Get a record by ID"""
+        query, params = self.query().where('id', id).build()
         try:
             with self._get_connection() as connection:
                 cursor = connection.cursor(dictionary=True)
                 
-                query = f"SELECT * FROM {self.table_name} WHERE id = %s"
-                cursor.execute(query, (id,))
+                cursor.execute(query, params)
                 result = cursor.fetchone()
                 
                 if result:
@@ -91,25 +156,21 @@ class BaseRepository(ABC, Generic[T]):
     def get_all(self, limit: int = None, offset: int = None) -> List[T]:
         """Get all records with optional pagination"""
         try:
-            with self._get_connection() as connection:
-                cursor = connection.cursor(dictionary=True)
-                
-                query = f"SELECT * FROM {self.table_name}"
-                
-                if limit:
-                    query += f" LIMIT {limit}"
-                if offset:
-                    query += f" OFFSET {offset}"
-                
-                cursor.execute(query)
-                results = cursor.fetchall()
-                
-                return [self._dict_to_model(result) for result in results]
-                
+            return self.fetch(self.query().limit(limit or None, offset or None))
         except Exception as e:
             logger.error(f"Error getting all {self.table_name}: {e}")
             return []
     
+    def fetch(self, query: Query) -> List[T]:
+        """Run a query built with query() and return models"""
+        sql, params = query.build()
+        with self._get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            results = cursor.fetchall()
+            cursor.close()
+        return [self._dict_to_model(result) for result in results]
+    
     def update(self, model: T) -> Optional[T]:
         """Update a record"""
         try:
@@ -117,18 +178,13 @@ class BaseRepository(ABC, Generic[T]):
                 cursor = connection.cursor(dictionary=True)
                 
                 data = self._model_to_dict(model)
-                columns = [key for key in data.keys() if key != 'id']
-                set_clause = ', '.join([f"{col} = %s" for col in columns])
-                
-                query = f"""
-                UPDATE {self.table_name}
-                SET {set_clause}
-                WHERE id = %s
-                """
+                columns = self._checked(key for key in data.keys() if key != 'id')
+                query = render_update(self.table_name, columns)
                 
                 values = [data[col] for col in columns] + [model.id]
                 cursor.execute(query, values)
                 connection.commit()
+                self._invalidate_cache(data)
                 
                 return model
                 
@@ -138,13 +194,14 @@ class BaseRepository(ABC, Generic[T]):
     
     def delete(self, id: int) -> bool:
         """Delete a record by ID"""
+        query, params = self.query().where('id', id).build_delete()
         try:
             with self._get_connection() as connection:
                 cursor = connection.cursor(dictionary=True)
                 
-                query = f"DELETE FROM {self.table_name} WHERE id = %s"
-                cursor.execute(query, (id,))
+                cursor.execute(query, params)
                 connection.commit()
+                self._invalidate_cache()
                 
                 return cursor.rowcount > 0
                 
@@ -154,12 +211,12 @@ class BaseRepository(ABC, Generic[T]):
     
     def count(self) -> int:
         """Count total records"""
+        query, params = self.query().build_count()
         try:
             with self._get_connection() as connection:
                 cursor = connection.cursor(dictionary=True)
                 
-                query = f"SELECT COUNT(*) as count FROM {self.table_name}"
-                cursor.execute(query)
+                cursor.execute(query, params)
                 result = cursor.fetchone()
                 
                 return result['count'] if result else 0
@@ -170,16 +227,194 @@ class BaseRepository(ABC, Generic[T]):
     
     def find_by_field(self, field: str, value: Any) -> List[T]:
         """Find records by a specific field"""
+        # Built outside the try so an unknown column raises instead of returning []
+        query = self.query().where(field, value)
+        try:
+            return self.fetch(query)
+        except Exception as e:
+            logger.error(f"Error finding {self.table_name} by {field}: {e}")
+            return []
+    
+    def iter_all(self, batch_size: int = 1000) -> Iterator[T]:
+        """Yield every record in ID order, fetching batch_size rows per query"""
+        return self.iter_where(None, batch_size)
+    
+    def iter_where(self, conditions: Optional[Dict[str, Any]] = None, batch_size: int = 1000) -> Iterator[T]:
+        """Yield records matching column = value conditions in ID order.
+        
+        Pages with keyset pagination (id > last seen id) rather than OFFSET,
+        so each page is an index range scan no matter how deep the walk is.
+        The connection is returned to the pool between pages, so a slow
+        consumer does not hold one for the whole walk.
+        """
+        conditions = conditions or {}
+        # Validate here, outside the generator, so a bad column raises at the
+        # call rather than at the first next()
+        self.query().filter_by(**conditions)
+        return self._iter_pages(conditions, batch_size)
+    
+    def _iter_pages(self, conditions: Dict[str, Any], batch_size: int) -> Iterator[T]:
+        """Keyset-paginated walk behind iter_where"""
+        last_id = 0
+        
+        while True:
+            query = self.query().filter_by(**conditions).where('id', last_id, '>').order_by('id').limit(batch_size)
+            try:
+                models = self.fetch(query)
+            except Exception as e:
+                logger.error(f"Error iterating {self.table_name}: {e}")
+                raise
+            
+            yield from models
+            
+            if len(models) < batch_size:
+                return
+            last_id = models[-1].id
+    
+    def get_many(self, ids: Iterable[int]) -> List[T]:
+        """Get records by ID with one IN-list query per batch_size IDs.
+        
+        Results follow the order of ids; unknown IDs are skipped.
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids:
+            return []
+        
         try:
             with self._get_connection() as connection:
                 cursor = connection.cursor(dictionary=True)
+                rows_by_id = {}
+                for chunk in _chunks(unique_ids, self.batch_size):
+                    query, params = self.query().where('id', chunk, 'IN').build()
+                    cursor.execute(query, params)
+                    for result in cursor.fetchall():
+                        rows_by_id[result['id']] = result
+                cursor.close()
                 
-                query = f"SELECT * FROM {self.table_name} WHERE {field} = %s"
-                cursor.execute(query, (value,))
-                results = cursor.fetchall()
+                return [self._dict_to_model(rows_by_id[id]) for id in unique_ids if id in rows_by_id]
                 
-                return [self._dict_to_model(result) for result in results]
+        except Exception as e:
+            logger.error(f"Error getting many {self.table_name}: {e}")
+            return []
+    
+    def create_many(self, models: List[T]) -> Optional[List[T]]:
+        """Insert records with multi-row INSERTs in one transaction.
+        
+        Columns are taken from the first model. Assigns the new IDs to the
+        models and returns them, or returns None if the batch was rolled back.
+        """
+        if not models:
+            return []
+        
+        try:
+            rows = [self._model_to_dict(model) for model in models]
+            columns = self._checked(rows[0].keys())
+            
+            with self._transaction() as cursor:
+                offset = 0
+                for chunk in _chunks(rows, self.batch_size):
+                    query = render_insert(self.table_name, columns, len(chunk))
+                    values = [row.get(column) for row in chunk for column in columns]
+                    cursor.execute(query, values)
+                    
+                    # InnoDB gives one multi-row INSERT consecutive IDs, and
+                    # lastrowid is the ID of its first row
+                    first_id = cursor.lastrowid
+                    for index, model in enumerate(models[offset:offset + len(chunk)]):
+                        model.id = first_id + index
+                    offset += len(chunk)
+            
+            self._invalidate_cache_for(rows)
+            return models
                 
         except Exception as e:
-            logger.error(f"Error finding {self.table_name} by {field}: {e}")
+            logger.error(f"Error creating many {self.table_name}: {e}")
+            return None
+    
+    def update_many(self, models: List[T]) -> Optional[List[T]]:
+        """Update records by ID in one transaction.
+        
+        Each batch is a single UPDATE that picks every column's new value
+        with CASE id WHEN ... THEN ... END. Returns the models, or None if the
+        batch was rolled back.
+        """
+        if not models:
             return []
+        
+        try:
+            rows = [self._model_to_dict(model) for model in models]
+            for row, model in zip(rows, models):
+                row['id'] = model.id
+            columns = self._checked(key for key in rows[0].keys() if key != 'id')
+            if not columns:
+                return models
+            
+            with self._transaction() as cursor:
+                for chunk in _chunks(rows, self.batch_size):
+                    query = render_update(self.table_name, columns, len(chunk))
+                    
+                    values = []
+                    for column in columns:
+                        for row in chunk:
+                            values.extend((row['id'], row.get(column)))
+                    values.extend(row['id'] for row in chunk)
+                    cursor.execute(query, values)
+            
+            self._invalidate_cache_for(rows)
+            return models
+                
+        except Exception as e:
+            logger.error(f"Error updating many {self.table_name}: {e}")
+            return None
+    
+    def delete_many(self, ids: Iterable[int]) -> Optional[int]:
+        """Delete records by ID in one transaction; returns the number deleted"""
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids:
+            return 0
+        
+        try:
+            deleted = 0
+            with self._transaction() as cursor:
+                for chunk in _chunks(unique_ids, self.batch_size):
+                    query, params = self.query().where('id', chunk, 'IN').build_delete()
+                    cursor.execute(query, params)
+                    deleted += cursor.rowcount
+            
+            self._invalidate_cache()
+            return deleted
+                
+        except Exception as e:
+            logger.error(f"Error deleting many {self.table_name}: {e}")
+            return None
+    
+    def upsert_many(self, models: List[T], update_columns: Optional[List[str]] = None) -> Optional[int]:
+        """Insert records, updating rows whose primary or unique key already exists.
+        
+        update_columns limits which columns an existing row takes from the
+        new values (default: every inserted column except id). Returns the
+        affected-row count MySQL reports (1 per insert, 2 per changed row),
+        or None if the batch was rolled back.
+        """
+        if not models:
+            return 0
+        
+        try:
+            rows = [self._model_to_dict(model) for model in models]
+            columns = self._checked(rows[0].keys())
+            update_columns = self._checked(update_columns or [column for column in columns if column != 'id'])
+            
+            affected = 0
+            with self._transaction() as cursor:
+                for chunk in _chunks(rows, self.batch_size):
+                    query = render_insert(self.table_name, columns, len(chunk), update_columns)
+                    values = [row.get(column) for row in chunk for column in columns]
+                    cursor.execute(query, values)
+                    affected += cursor.rowcount
+            
+            self._invalidate_cache_for(rows)
+            return affected
+                
+        except Exception as e:
+            logger.error(f"Error upserting many {self.table_name}: {e}")
+            return None
@@ -0,0 +1,165 @@
+"""
+Small SELECT/COUNT/DELETE builder for repositories
+
+Column names are checked against the table's known columns, and every
+value (including LIMIT and OFFSET) is passed as a parameter. A query's
+shape (table, projection, filter columns and operators, IN-list lengths,
+ordering, paging) determines its SQL text, which is rendered once per shape
+and cached, so repeated repository calls only collect parameters.
+"""
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'LIKE', 'IN', 'IS NULL', 'IS NOT NULL')
+
+class InvalidColumnError(ValueError):
+    """Raised when a query references a column the table does not have"""
+
+class Query:
+    """Chainable query description; call build() for (sql, params)"""
+
+    def __init__(self, table: str, columns: Iterable[str]):
+        self.table = table
+        self.columns = frozenset(columns)
+        self._projection: Tuple[str, ...] = ()
+        self._filters: List[Tuple[str, str, int]] = []
+        self._params: List[Any] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def _check(self, column: str) -> str:
+        if column not in self.columns:
+            raise InvalidColumnError(f"Unknown column '{column}' for table {self.table}")
+        return column
+
+    def select(self, *columns: str) -> 'Query':
+        """Restrict the projection (default: all columns)"""
+        self._projection = tuple(self._check(column) for column in columns)
+        return self
+
+    def where(self, column: str, value: Any = None, op: str = '=') -> 'Query':
+        """Add a filter; IN takes a sequence, IS [NOT] NULL ignores value"""
+        op = op.upper()
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator '{op}'")
+        self._check(column)
+        if op == 'IN':
+            values = list(value)
+            if not values:
+                raise ValueError("IN requires at least one value")
+            self._filters.append((column, op, len(values)))
+            self._params.extend(values)
+        elif op in ('IS NULL', 'IS NOT NULL'):
+            self._filters.append((column, op, 0))
+        else:
+            self._filters.append((column, op, 1))
+            self._params.append(value)
+        return self
+
+    def filter_by(self, **conditions: Any) -> 'Query':
+        """Add column = value filters"""
+        for column, value in conditions.items():
+            self.where(column, value)
+        return self
+
+    def between(self, column: str, low: Any = None, high: Any = None) -> 'Query':
+        """Add an inclusive range; either bound may be None for an open range"""
+        if low is not None:
+            self.where(column, low, '>=')
+        if high is not None:
+            self.where(column, high, '<=')
+        return self
+
+    def order_by(self, column: str, descending: bool = False) -> 'Query':
+        self._order.append((self._check(column), descending))
+        return self
+
+    def limit(self, limit: Optional[int], offset: Optional[int] = None) -> 'Query':
+        self._limit = int(limit) if limit is not None else None
+        self._offset = int(offset) if offset is not None else None
+        return self
+
+    def _shape(self, kind: str) -> tuple:
+        return (kind, self.table, self._projection, tuple(self._filters), tuple(self._order),
+                self._limit is not None, self._offset is not None)
+
+    def _paging_params(self) -> List[Any]:
+        params = []
+        if self._limit is not None:
+            params.append(self._limit)
+        if self._offset is not None:
+            params.append(self._offset)
+        return params
+
+    def build(self) -> Tuple[str, List[Any]]:
+        """SELECT statement and parameters"""
+        return render_sql(self._shape('select')), self._params + self._paging_params()
+
+    def build_count(self) -> Tuple[str, List[Any]]:
+        """SELECT COUNT(*) statement and parameters (ordering and paging ignored)"""
+        shape = ('count', self.table, (), tuple(self._filters), (), False, False)
+        return render_sql(shape), list(self._params)
+
+    def build_delete(self) -> Tuple[str, List[Any]]:
+        """DELETE statement and parameters; refuses to delete without a filter"""
+        if not self._filters:
+            raise ValueError("Refusing to build a DELETE without filters")
+        shape = ('delete', self.table, (), tuple(self._filters), (), False, False)
+        return render_sql(shape), list(self._params)
+
+def _where_clause(filters: Sequence[Tuple[str, str, int]]) -> str:
+    clauses = []
+    for column, op, arity in filters:
+        if op == 'IN':
+            clauses.append(f"{column} IN ({', '.join(['%s'] * arity)})")
+        elif arity == 0:
+            clauses.append(f"{column} {op}")
+        else:
+            clauses.append(f"{column} {op} %s")
+    return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+@lru_cache(maxsize=1024)
+def render_sql(shape: tuple) -> str:
+    """Render the SQL text for a query shape (cached per shape)"""
+    kind, table, projection, filters, order, has_limit, has_offset = shape
+    if kind == 'count':
+        sql = f"SELECT COUNT(*) AS count FROM {table}"
+    elif kind == 'delete':
+        sql = f"DELETE FROM {table}"
+    else:
+        sql = f"SELECT {', '.join(projection) if projection else '*'} FROM {table}"
+
+    sql += _where_clause(filters)
+    if order:
+        sql += " ORDER BY " + ', '.join(f"{column} DESC" if descending else column for column, descending in order)
+    if has_limit:
+        sql += " LIMIT %s"
+    if has_offset:
+        # MySQL only accepts OFFSET after LIMIT
+        sql += " OFFSET %s" if has_limit else " LIMIT 18446744073709551615 OFFSET %s"
+    return sql
+
+@lru_cache(maxsize=256)
+def render_insert(table: str, columns: Tuple[str, ...], row_count: int = 1,
+                  update_columns: Optional[Tuple[str, ...]] = None) -> str:
+    """Multi-row INSERT, optionally ON DUPLICATE KEY UPDATE update_columns"""
+    row_placeholder = f"({', '.join(['%s'] * len(columns))})"
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_placeholder] * row_count)}"
+    if update_columns:
+        sql += " ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    return sql
+
+@lru_cache(maxsize=256)
+def render_update(table: str, columns: Tuple[str, ...], row_count: Optional[int] = None) -> str:
+    """UPDATE by id. With row_count, each column is chosen per row with CASE id WHEN ... THEN ... END.
+
+    Parameters: without row_count, the column values then the id; with it,
+    (id, value) pairs per column followed by the ids.
+    """
+    if row_count is None:
+        set_clause = ', '.join(f"{column} = %s" for column in columns)
+        return f"UPDATE {table} SET {set_clause} WHERE id = %s"
+    case_clause = ' '.join(['WHEN %s THEN %s'] * row_count)
+    set_clause = ', '.join(f"{column} = CASE id {case_clause} END" for column in columns)
+    return f"UPDATE {table} SET {set_clause} WHERE id IN ({', '.join(['%s'] * row_count)})"
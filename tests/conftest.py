@@ -24,6 +24,13 @@ def mock_db_connection():
         mock_conn.return_value = mock_connection
         yield mock_connection, mock_cursor
 
+@pytest.fixture
+def strict_query_profile():
+    """Fail the test if any statement shape repeats like an N+1 query"""
+    from database.query_profiler import request_scope
+    with request_scope('test', strict=True) as profile:
+        yield profile
+
 @pytest.fixture
 def test_user_data():
     """Sample user data for testing"""
@@ -0,0 +1,220 @@
+"""
+EXPLAIN checks for the hot per-user queries
+
+Runs against a scratch MySQL database named by SPEND_WISE_EXPLAIN_DB (it is
+dropped and recreated), using the DB_HOST/DB_USER/DB_PASSWORD settings of
+the application. The schema comes from database/migrations and is seeded
+with enough rows that the optimizer prefers an index whenever one fits, so
+a query that falls back to a full table scan fails here.
+
+The statements are not written out here: each hot query function is run
+against the seeded database through a connection that records what it
+executes, and every recorded statement is EXPLAINed with its parameters.
+"""
+import os
+import random
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from database import budget_query, expense_query, notification_query, rollup_query
+
+EXPLAIN_DB = os.getenv('SPEND_WISE_EXPLAIN_DB')
+
+pytestmark = pytest.mark.skipif(not EXPLAIN_DB, reason='SPEND_WISE_EXPLAIN_DB is not set')
+
+USERS = 20
+EXPENSES_PER_USER = 200
+INCOMES_PER_USER = 30
+NOTIFICATIONS_PER_USER = 40
+CATEGORIES = ['Food', 'Transportation', 'Entertainment', 'Shopping', 'Bills']
+
+# Seeded rows span the last SEED_DAYS, inside the expense hot window, so
+# the recorded statements read the expense table alone
+SEED_DAYS = 300
+MONTH = (date.today() - timedelta(days=120)).replace(day=1)
+NEXT_MONTH = (MONTH + timedelta(days=32)).replace(day=1)
+MONTH_END = NEXT_MONTH - timedelta(days=1)
+
+def _uncached(func):
+    return getattr(func, 'uncached', func)
+
+# (module whose connection is recorded, call, indexes the plans may use)
+HOT_QUERIES = {
+    'expense_range': (
+        rollup_query,
+        lambda: _uncached(rollup_query.get_expense_totals)(3, MONTH, MONTH + timedelta(days=9)),
+        {'idx_expense_user_date', 'idx_expense_user_category_date'}
+    ),
+    'expense_export': (
+        expense_query,
+        lambda: expense_query.iter_expenses_for_export(3, MONTH.isoformat()).close(),
+        {'idx_expense_user_date'}
+    ),
+    'expense_category_range': (
+        rollup_query,
+        lambda: _uncached(rollup_query.get_expense_totals)(3, MONTH, MONTH + timedelta(days=9), 'Food'),
+        {'idx_expense_user_category_date'}
+    ),
+    'expense_fingerprints': (
+        expense_query,
+        lambda: expense_query.get_expense_fingerprints(3, MONTH.isoformat(), MONTH_END.isoformat()),
+        {'idx_expense_user_date', 'idx_expense_user_category_date'}
+    ),
+    'income_range': (
+        rollup_query,
+        lambda: _uncached(rollup_query.get_income_source_totals)(3, MONTH, MONTH + timedelta(days=9)),
+        {'idx_income_user_date'}
+    ),
+    'expense_rollup': (
+        rollup_query,
+        lambda: _uncached(rollup_query.get_expense_category_totals)(3, MONTH, MONTH_END),
+        {'PRIMARY'}
+    ),
+    'budgets_by_user': (
+        budget_query,
+        lambda: _uncached(budget_query.get_budgets_by_user)(3),
+        {'idx_budget_user_category'}
+    ),
+    'covering_budget_spending': (
+        budget_query,
+        lambda: budget_query.get_covering_budget_spending(3, 'Food', MONTH + timedelta(days=5)),
+        {'idx_budget_user_category', 'PRIMARY', 'idx_expense_user_category_date', 'idx_expense_user_date',
+         'idx_expense_archive_user_date'}
+    ),
+    'budgets_with_spending': (
+        budget_query,
+        lambda: _uncached(budget_query.get_budgets_with_spending)(3),
+        {'idx_budget_user_category', 'PRIMARY', 'idx_expense_user_category_date', 'idx_expense_user_date',
+         'idx_expense_archive_user_date'}
+    ),
+    'unread_notifications': (
+        notification_query,
+        lambda: _uncached(notification_query.get_notifications_by_user)(3, unread_only=True),
+        {'idx_notification_user_read_created'}
+    ),
+    'unread_count': (
+        notification_query,
+        lambda: _uncached(notification_query.get_unread_count)(3),
+        {'idx_notification_user_read_created'}
+    )
+}
+
+class _RecordingCursor:
+    """Cursor wrapper that records each (statement, params) before running it"""
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, query, params=None):
+        self._statements.append((query, params))
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _RecordingConnection:
+    """Connection wrapper whose cursors record their statements; never closed by the code under test"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.statements = []
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._connection.cursor(*args, **kwargs), self.statements)
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def _seed(cursor):
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=SEED_DAYS)
+    cursor.executemany(
+        "INSERT INTO user (username, password, email, first_name, last_name) VALUES (%s, %s, %s, %s, %s)",
+        [(f'user{i}', 'x', f'user{i}@example.com', 'Test', 'User') for i in range(USERS)]
+    )
+    cursor.execute("SELECT user_id FROM user WHERE username LIKE 'user%'")
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    expenses, incomes, notifications, budgets = [], [], [], []
+    for user_id in user_ids:
+        for _ in range(EXPENSES_PER_USER):
+            expenses.append((round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES), 'seed',
+                             start + timedelta(days=rng.randrange(SEED_DAYS)), user_id))
+        for _ in range(INCOMES_PER_USER):
+            incomes.append((round(rng.uniform(100, 3000), 2), 'Salary',
+                            start + timedelta(days=rng.randrange(SEED_DAYS)), user_id))
+        for n in range(NOTIFICATIONS_PER_USER):
+            notifications.append(('system', 'seed', user_id, n % 3 == 0))
+        for category in CATEGORIES:
+            budgets.append((500, category, MONTH, MONTH_END, user_id))
+
+    cursor.executemany("INSERT INTO expense (amount, category, description, date, user_id) VALUES (%s, %s, %s, %s, %s)", expenses)
+    cursor.executemany("INSERT INTO income (amount, source, date, user_id) VALUES (%s, %s, %s, %s)", incomes)
+    cursor.executemany("INSERT INTO notification (notification_type, message, user_id, `read`) VALUES (%s, %s, %s, %s)", notifications)
+    cursor.executemany("INSERT INTO budget (amount, category, start_date, end_date, user_id) VALUES (%s, %s, %s, %s, %s)", budgets)
+    cursor.execute("""
+    INSERT INTO expense_monthly_rollup (user_id, month, category, total_amount, transaction_count)
+    SELECT user_id, DATE_FORMAT(date, '%Y-%m-01'), category, SUM(amount), COUNT(*)
+    FROM expense GROUP BY user_id, DATE_FORMAT(date, '%Y-%m-01'), category
+    """)
+    for table in ('expense', 'income', 'notification', 'budget', 'expense_monthly_rollup'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+
+@pytest.fixture(scope='module')
+def explain_connection():
+    mysql_connector = pytest.importorskip('mysql.connector')
+    from database.database_connection import db_config
+    from database.migrate import apply_migration, discover_migrations
+
+    config = {key: value for key, value in db_config.items() if key != 'database'}
+    connection = mysql_connector.connect(**config)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{EXPLAIN_DB}`")
+    cursor.execute(f"CREATE DATABASE `{EXPLAIN_DB}`")
+    cursor.execute(f"USE `{EXPLAIN_DB}`")
+
+    for migration in discover_migrations():
+        apply_migration(cursor, migration)
+    _seed(cursor)
+    connection.commit()
+
+    cursor.close()
+    yield connection
+
+    connection.cursor().execute(f"DROP DATABASE IF EXISTS `{EXPLAIN_DB}`")
+    connection.close()
+
+def _record(connection, module, call):
+    """The statements a query function sends, run for real on connection"""
+    recording = _RecordingConnection(connection)
+    with patch.object(module, 'get_connection', return_value=recording), \
+            patch.object(module, 'release_connection'):
+        call()
+    return recording.statements
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(explain_connection, name):
+    module, call, expected_indexes = HOT_QUERIES[name]
+    statements = _record(explain_connection, module, call)
+    assert statements, f"{name} ran no statement"
+
+    cursor = explain_connection.cursor(dictionary=True)
+    try:
+        for query, params in statements:
+            cursor.execute(f"EXPLAIN {query}", params)
+            plan = cursor.fetchall()
+            for step in plan:
+                if not step['table'] or step['table'].startswith('<'):
+                    # Materialized derived tables and unions; their sources are checked
+                    continue
+                assert step['type'] != 'ALL', f"{name} scans all of {step['table']}: {plan}"
+                assert step['key'] in expected_indexes, f"{name} uses {step['key']}, expected one of {expected_indexes}"
+    finally:
+        cursor.close()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the memory-mapped analytics cache
+"""
+import os
+from datetime import date
+from unittest.mock import patch
+import pytest
+from database.analytics_cache import AnalyticsCache
+from utils import expense_frame
+
+HISTORY = [
+    (date(2023, 6, 1), 9.99, 'Entertainment', 'Spotify'),
+    (date(2024, 1, 1), 9.99, 'Entertainment', 'Spotify'),
+    (date(2024, 1, 3), 50.00, 'Food', 'Grocer'),
+]
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalyticsCache(str(tmp_path), enabled=True)
+
+class TestAnalyticsCache:
+    """Test cases for AnalyticsCache"""
+
+    @patch('database.expense_query.get_expense_rows', return_value=HISTORY)
+    def test_builds_once_then_maps_the_files(self, mock_rows, cache):
+        built = cache.load(7)
+        loaded = cache.load(7)
+
+        mock_rows.assert_called_once_with(7)
+        assert isinstance(loaded.amounts, memoryview) and loaded.amounts.readonly
+        assert loaded.records() == built.records()
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    @patch('database.expense_query.get_expense_rows', return_value=HISTORY)
+    def test_append_adds_rows_and_dictionary_values(self, mock_rows, cache):
+        cache.load(7)
+        cache.append(7, [('2024-02-01', '12.50', 'Travel', 'Train'), (date(2024, 2, 2), 9.99, 'Entertainment', 'Spotify')])
+
+        frame = cache.load(7)
+        assert len(frame) == 5
+        assert frame.records()[3] == {'date': '2024-02-01', 'amount': 12.5, 'category': 'Travel', 'description': 'Train'}
+        assert frame.categories.values == ['Entertainment', 'Food', 'Travel']
+        assert mock_rows.call_count == 1
+
+    @patch('database.expense_query.get_expense_rows', return_value=HISTORY)
+    def test_torn_append_is_ignored_and_repaired(self, mock_rows, cache, tmp_path):
+        cache.load(7)
+        with open(tmp_path / 'user-7' / 'amounts.f64', 'ab') as file:
+            file.write(b'\x00' * 11)
+        assert len(cache.load(7)) == 3
+
+        cache.append(7, [(date(2024, 3, 1), 1.0, 'Food', 'Grocer')])
+        frame = cache.load(7)
+        assert len(frame) == 4 and frame.amounts[3] == 1.0
+
+    @patch('database.expense_query.get_expense_rows', return_value=HISTORY)
+    def test_invalidate_forces_rebuild(self, mock_rows, cache, tmp_path):
+        cache.load(7)
+        cache.invalidate(7)
+        assert not os.path.exists(tmp_path / 'user-7')
+        cache.load(7)
+        assert mock_rows.call_count == 2
+
+    def test_write_during_build_is_not_saved(self, cache, tmp_path):
+        def rows_then_write(user_id):
+            cache.append(user_id, [(date(2024, 4, 1), 3.0, 'Food', 'Cafe')])
+            return HISTORY
+        with patch('database.expense_query.get_expense_rows', side_effect=rows_then_write):
+            assert len(cache.load(7)) == 3
+        assert not os.path.exists(tmp_path / 'user-7')
+
+    def test_append_waits_for_unit_commit(self, cache, tmp_path):
+        with patch('database.expense_query.get_expense_rows', return_value=HISTORY):
+            cache.load(7)
+        with patch('database.analytics_cache.current_unit_of_work') as mock_unit:
+            cache.append(7, [(date(2024, 5, 1), 4.0, 'Food', 'Cafe')])
+            callback = mock_unit.return_value.after_commit.call_args[0][0]
+        assert len(cache.load(7)) == 3
+        callback()
+        assert len(cache.load(7)) == 4
+
+    @patch('database.expense_query.get_expense_rows', return_value=None)
+    def test_database_error(self, mock_rows, cache, tmp_path):
+        assert cache.load(7) is None
+        assert not os.path.exists(tmp_path / 'user-7')
+
+class TestLoadExpenseFrame:
+    """load_expense_frame reads through the cache"""
+
+    @patch('database.expense_query.get_expense_rows', return_value=HISTORY)
+    def test_filters_cached_history_by_start_date(self, mock_rows, cache):
+        with patch('database.analytics_cache.analytics_cache', cache):
+            frame = expense_frame.load_expense_frame(7, date(2024, 1, 1))
+        assert len(frame) == 2
+        mock_rows.assert_called_once_with(7)
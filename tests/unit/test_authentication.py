@@ -0,0 +1,114 @@
+"""
+Unit tests for AuthenticationManager token handling
+"""
+import hashlib
+import time
+from unittest.mock import Mock, patch
+import jwt
+import pytest
+from utils.authentication import AuthenticationManager, TokenCache
+from utils.password_hasher import PasswordHasher, is_legacy_hash
+
+USER = {'user_id': 1, 'username': 'alice', 'email': 'alice@example.com', 'role': 'user'}
+
+class TestTokenCache:
+    """Test cases for the verified-token cache"""
+
+    def test_repeat_verification_skips_decode(self):
+        manager = AuthenticationManager()
+        token = manager.generate_token(USER)
+
+        with patch('utils.authentication.jwt.decode', wraps=jwt.decode) as mock_decode:
+            first = manager.verify_token(token)
+            second = manager.verify_token(token)
+
+        assert mock_decode.call_count == 1
+        assert first == second and second['user_id'] == 1
+        assert manager.token_cache.stats()['hits'] == 1
+
+    def test_callers_get_copies(self):
+        manager = AuthenticationManager()
+        token = manager.generate_token(USER)
+        manager.verify_token(token)['role'] = 'admin'
+        assert manager.verify_token(token)['role'] == 'user'
+
+    def test_entry_expires_with_the_token(self):
+        cache = TokenCache()
+        cache.set('token', {'user_id': 1, 'exp': time.time() - 1})
+        assert cache.get('token') is None
+
+    def test_bounded_lru(self):
+        cache = TokenCache(max_entries=2)
+        exp = time.time() + 60
+        for name in ('a', 'b'):
+            cache.set(name, {'exp': exp})
+        cache.get('a')
+        cache.set('c', {'exp': exp})
+        assert cache.get('b') is None and cache.get('a') is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalid_tokens_are_not_cached(self):
+        manager = AuthenticationManager()
+        assert manager.verify_token('not-a-token') is None
+        assert manager.token_cache.stats()['entries'] == 0
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    with patch('utils.authentication.password_hasher', hasher):
+        yield hasher
+
+def _login_row(password_hash):
+    return {'user_id': 3, 'username': 'bob', 'password': password_hash, 'email': 'bob@example.com',
+            'phone_number': '', 'first_name': 'Bob', 'last_name': 'B', 'role': 'user'}
+
+class TestPasswords:
+    """Test cases for bcrypt hashing and login"""
+
+    def test_hash_is_salted_bcrypt(self, hasher):
+        first, second = hasher.hash('s3cret-pass'), hasher.hash('s3cret-pass')
+        assert first != second and first.startswith('$2b$04$')
+        assert hasher.verify('s3cret-pass', first) and not hasher.verify('wrong', first)
+        assert not hasher.needs_rehash(first)
+        assert PasswordHasher(rounds=5, workers=1).needs_rehash(first)
+
+    def test_legacy_hash_verifies_and_needs_rehash(self, hasher):
+        legacy = hashlib.sha256(b'old-password').hexdigest()
+        assert is_legacy_hash(legacy)
+        assert hasher.verify('old-password', legacy)
+        assert hasher.needs_rehash(legacy)
+
+    @patch('utils.authentication.release_connection')
+    @patch('utils.authentication.get_connection')
+    def test_login_looks_up_by_username_then_verifies(self, mock_get_connection, mock_release, hasher):
+        cursor = mock_get_connection.return_value.cursor.return_value
+        cursor.fetchone.return_value = _login_row(hasher.hash('s3cret-pass'))
+
+        user = AuthenticationManager().authenticate_user('bob', 's3cret-pass')
+
+        query, params = cursor.execute.call_args[0]
+        assert 'password = %s' not in query and params == ('bob',)
+        assert user['user_id'] == 3 and 'password' not in user
+        assert AuthenticationManager().authenticate_user('bob', 'wrong') is None
+
+    @patch('utils.authentication.release_connection')
+    @patch('utils.authentication.get_connection')
+    def test_unknown_user(self, mock_get_connection, mock_release, hasher):
+        mock_get_connection.return_value.cursor.return_value.fetchone.return_value = None
+        assert AuthenticationManager().authenticate_user('nobody', 'whatever') is None
+
+    @patch('utils.authentication.release_connection')
+    @patch('utils.authentication.get_connection')
+    def test_legacy_hash_is_upgraded_after_login(self, mock_get_connection, mock_release, hasher):
+        legacy = hashlib.sha256(b'old-password').hexdigest()
+        cursor = mock_get_connection.return_value.cursor.return_value
+        cursor.fetchone.return_value = _login_row(legacy)
+        cursor.rowcount = 1
+
+        assert AuthenticationManager().authenticate_user('bob', 'old-password')['user_id'] == 3
+        hasher._executor.shutdown(wait=True)
+
+        update, (new_hash, user_id, old_hash) = cursor.execute.call_args[0]
+        assert update.startswith('UPDATE user SET password')
+        assert (user_id, old_hash) == (3, legacy)
+        assert hasher._verify('old-password', new_hash)
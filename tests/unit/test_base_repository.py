@@ -0,0 +1,133 @@
+"""
+Unit tests for BaseRepository batch operations
+"""
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+import pytest
+from model.budget import budget
+from src.repositories.base_repository import BaseRepository
+from src.repositories.query_builder import InvalidColumnError
+
+class BudgetRepository(BaseRepository):
+    def _get_table_name(self):
+        return 'budget'
+
+    def _model_to_dict(self, model):
+        return {'amount': model.amount, 'category': model.category, 'user_id': model.user_id}
+
+    def _dict_to_model(self, data):
+        return SimpleNamespace(**data)
+
+def _budget(amount, id=None):
+    return SimpleNamespace(id=id, amount=amount, category='Food', user_id=1)
+
+def _mock_connection():
+    cursor = Mock()
+    connection = Mock()
+    connection.cursor.return_value = cursor
+    return connection, cursor
+
+class TestBatchOperations:
+    """Test cases for the *_many methods"""
+
+    @patch('src.repositories.base_repository.release_connection')
+    @patch('src.repositories.base_repository.get_connection')
+    def test_create_many_chunks_values_in_one_transaction(self, mock_get_connection, mock_release):
+        connection, cursor = _mock_connection()
+        cursor.lastrowid = 10
+        mock_get_connection.return_value = connection
+        repository = BudgetRepository(budget)
+        repository.batch_size = 2
+
+        created = repository.create_many([_budget(i) for i in range(3)])
+
+        assert cursor.execute.call_count == 2
+        assert [model.id for model in created] == [10, 11, 10]
+        assert len(cursor.execute.call_args_list[0][0][1]) == 6
+        connection.commit.assert_called_once()
+
+    @patch('src.repositories.base_repository.release_connection')
+    @patch('src.repositories.base_repository.get_connection')
+    def test_get_many_keeps_input_order(self, mock_get_connection, mock_release):
+        connection, cursor = _mock_connection()
+        cursor.fetchall.return_value = [{'id': 1, 'amount': 5}, {'id': 3, 'amount': 7}]
+        mock_get_connection.return_value = connection
+
+        results = BudgetRepository(budget).get_many([3, 2, 1, 3])
+
+        assert [result.id for result in results] == [3, 1]
+        query, values = cursor.execute.call_args[0]
+        assert 'IN (%s, %s, %s)' in query
+        assert values == [3, 2, 1]
+
+    @patch('src.repositories.base_repository.release_connection')
+    @patch('src.repositories.base_repository.get_connection')
+    def test_update_many_uses_one_case_statement(self, mock_get_connection, mock_release):
+        connection, cursor = _mock_connection()
+        mock_get_connection.return_value = connection
+
+        BudgetRepository(budget).update_many([_budget(5, id=1), _budget(9, id=2)])
+
+        query, values = cursor.execute.call_args[0]
+        assert cursor.execute.call_count == 1
+        assert 'amount = CASE id WHEN %s THEN %s WHEN %s THEN %s END' in query
+        assert values[:4] == [1, 5, 2, 9]
+        assert values[-2:] == [1, 2]
+
+    @patch('src.repositories.base_repository.release_connection')
+    @patch('src.repositories.base_repository.get_connection')
+    def test_failed_batch_rolls_back(self, mock_get_connection, mock_release):
+        connection, cursor = _mock_connection()
+        cursor.execute.side_effect = [Mock(), Exception('Lock wait timeout')]
+        mock_get_connection.return_value = connection
+        repository = BudgetRepository(budget)
+        repository.batch_size = 1
+
+        assert repository.delete_many([1, 2]) is None
+        connection.rollback.assert_called_once()
+        connection.commit.assert_not_called()
+
+class TestIteration:
+    """Test cases for keyset-paginated iteration"""
+
+    @patch('src.repositories.base_repository.release_connection')
+    @patch('src.repositories.base_repository.get_connection')
+    def test_iter_where_pages_by_last_id(self, mock_get_connection, mock_release):
+        connection, cursor = _mock_connection()
+        cursor.fetchall.side_effect = [
+            [{'id': 4, 'user_id': 1}, {'id': 9, 'user_id': 1}],
+            [{'id': 12, 'user_id': 1}]
+        ]
+        mock_get_connection.return_value = connection
+
+        rows = BudgetRepository(budget).iter_where({'user_id': 1}, batch_size=2)
+
+        assert cursor.execute.call_count == 0
+        assert [row.id for row in rows] == [4, 9, 12]
+        pages = [call[0][1] for call in cursor.execute.call_args_list]
+        assert pages == [[1, 0, 2], [1, 9, 2]]
+        assert 'OFFSET' not in cursor.execute.call_args[0][0]
+
+    @patch('src.repositories.base_repository.get_connection')
+    def test_iter_where_rejects_bad_column_at_call(self, mock_get_connection):
+        with pytest.raises(InvalidColumnError):
+            BudgetRepository(budget).iter_where({'user_id; DROP TABLE budget': 1})
+        mock_get_connection.assert_not_called()
+
+class TestQueryBuilder:
+    """Test cases for column validation and cached SQL"""
+
+    def test_columns_come_from_the_model(self):
+        repository = BudgetRepository(budget)
+        assert {'id', 'amount', 'start_date', 'user_id', 'created_at'} <= repository.columns
+        with pytest.raises(InvalidColumnError):
+            repository.find_by_field('amount; DROP TABLE budget', 1)
+
+    def test_paging_is_parameterized_and_sql_reused(self):
+        repository = BudgetRepository(budget)
+        first_sql, first_params = repository.query().filter_by(user_id=1).order_by('start_date', True).limit(10, 20).build()
+        second_sql, second_params = repository.query().filter_by(user_id=2).order_by('start_date', True).limit(5, 0).build()
+
+        assert first_sql == "SELECT * FROM budget WHERE user_id = %s ORDER BY start_date DESC LIMIT %s OFFSET %s"
+        assert first_sql is second_sql
+        assert (first_params, second_params) == ([1, 10, 20], [2, 5, 0])
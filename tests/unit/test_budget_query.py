@@ -0,0 +1,69 @@
+"""
+Unit tests for budget spending queries
+"""
+from datetime import date
+from decimal import Decimal
+from unittest.mock import Mock, patch
+from database import budget_query
+
+class TestGetBudgetsWithSpending:
+    """Test cases for get_budgets_with_spending"""
+
+    @patch('database.budget_query.release_connection')
+    @patch('database.budget_query.get_connection')
+    def test_one_statement_for_all_budgets(self, mock_get_connection, mock_release, strict_query_profile):
+        """Budgets and their spending come back from a single statement"""
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = [
+            {'id': 1, 'amount': Decimal('200'), 'category': 'Food', 'start_date': date(2024, 1, 1),
+             'end_date': date(2024, 1, 31), 'user_id': 7, 'total_spent': Decimal('170')},
+            {'id': 2, 'amount': Decimal('50'), 'category': 'Fun', 'start_date': date(2024, 1, 1),
+             'end_date': date(2024, 1, 31), 'user_id': 7, 'total_spent': 0},
+        ]
+        mock_connection = Mock()
+        mock_connection.cursor.return_value = mock_cursor
+        mock_get_connection.return_value = mock_connection
+
+        budgets = budget_query.get_budgets_with_spending.uncached(7)
+
+        mock_cursor.execute.assert_called_once()
+        query, values = mock_cursor.execute.call_args[0]
+        assert query.rstrip().endswith('ORDER BY p.created_at DESC')
+        assert values == [7, 7, 7, 7]
+        assert budgets[0]['spending']['percentage_used'] == Decimal('85.00')
+        assert budgets[0]['spending']['remaining'] == Decimal('30')
+        assert budgets[1]['spending']['total_spent'] == Decimal('0')
+        mock_release.assert_called_once_with(mock_connection)
+
+    def test_whole_months_from_rollup_edges_from_raw_rows(self):
+        query, _ = budget_query._spending_select("p.user_id = %s", [7])
+        assert 'JOIN expense_monthly_rollup m' in query
+        assert 'm.month >= IF(DAY(p.start_date) = 1' in query
+        # Edge days come from both expense tables, so old periods include archived rows
+        assert 'JOIN expense x' in query and 'JOIN expense_archive x' in query
+        assert 'x.date < IF(DAY(p.start_date) = 1' in query
+
+    @patch('database.budget_query.release_connection')
+    @patch('database.budget_query.get_connection')
+    def test_no_budgets(self, mock_get_connection, mock_release):
+        mock_cursor = mock_get_connection.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        assert budget_query.get_budgets_with_spending.uncached(7) == []
+        mock_cursor.execute.assert_called_once()
+
+class TestGetBudgetSpending:
+    """Test cases for get_budget_spending"""
+
+    @patch('database.budget_query.get_expense_totals')
+    @patch('database.budget_query.release_connection')
+    @patch('database.budget_query.get_connection')
+    def test_connection_is_released_before_totals(self, mock_get_connection, mock_release, mock_totals):
+        mock_cursor = mock_get_connection.return_value.cursor.return_value
+        mock_cursor.fetchone.return_value = {'id': 1, 'amount': Decimal('200'), 'category': 'Food', 'user_id': 7,
+                                             'start_date': date(2024, 1, 1), 'end_date': date(2024, 1, 31)}
+        mock_totals.side_effect = lambda *args: mock_release.assert_called_once() or {'total': 50.0}
+
+        spending = budget_query.get_budget_spending(1)
+
+        assert spending['remaining'] == Decimal('150.0')
+        mock_totals.assert_called_once_with(7, date(2024, 1, 1), date(2024, 1, 31), 'Food')
@@ -0,0 +1,136 @@
+"""
+Unit tests for the MySQL circuit breaker
+"""
+from unittest.mock import Mock, patch
+from database import circuit_breaker, database_connection
+from database.circuit_breaker import CircuitBreaker
+from database.query_cache import QueryCache, cached_query
+from app import SpendWiseRequestHandler
+from controller.expense_controller import ExpenseController
+from controller.income_controller import IncomeController
+from utils.response import json_response
+
+def _mysql_error(errno):
+    error = Exception(f"MySQL error {errno}")
+    error.errno = errno
+    return error
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker state changes"""
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, open_seconds=60)
+        for _ in range(2):
+            breaker.record_statement(5, _mysql_error(2013))
+        breaker.record_statement(5)
+        for _ in range(2):
+            breaker.record_statement(5, _mysql_error(2006))
+        assert breaker.state == 'closed'
+        breaker.record_statement(5, _mysql_error(2006))
+        assert breaker.state == 'open'
+        assert not breaker.allow()
+        assert breaker.retry_after() > 1
+
+    def test_statement_errors_and_slow_statements(self):
+        breaker = CircuitBreaker(failure_threshold=2, latency_slo_ms=100, open_seconds=60)
+        breaker.record_statement(5, _mysql_error(1062))
+        breaker.record_statement(5, _mysql_error(1062))
+        assert breaker.state == 'closed'
+        breaker.record_statement(250)
+        breaker.record_statement(300)
+        assert breaker.state == 'open'
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, open_seconds=0)
+        breaker.record_failure('down')
+        assert breaker.allow()
+        assert breaker.state == 'half_open'
+        breaker.record_failure('still down')
+        assert breaker.state == 'open'
+
+        assert breaker.allow()
+        breaker.record_success(5)
+        assert breaker.state == 'closed'
+
+class TestFastFail:
+    """Test cases for checkout refusal and stale reads"""
+
+    def test_open_circuit_refuses_checkout_and_serves_stale(self):
+        breaker = CircuitBreaker(failure_threshold=1, open_seconds=60)
+        breaker.record_failure('down')
+        cache = QueryCache(ttl_seconds=0)
+        calls = []
+
+        @cached_query(('expense',), serve_stale=True)
+        def get_totals(user_id):
+            calls.append(user_id)
+            connection = database_connection.checkout_connection()
+            return {'total': 1} if connection is None else {'total': 2}
+
+        cache_key = (f"{get_totals.__module__}.{get_totals.__qualname__}", (('user_id', 7),))
+        cache.set(cache_key, {'total': 42}, [('expense', 7)])
+
+        circuit_breaker.begin_request()
+        with patch.object(database_connection, 'db_circuit', breaker), \
+                patch('database.query_cache.query_cache', cache), \
+                patch.object(database_connection, 'connection_pool') as pool:
+            assert get_totals(7) == {'total': 42}
+        pool.get_connection.assert_not_called()
+        assert circuit_breaker.request_rejected()
+        assert circuit_breaker.request_stale()
+        assert calls == [7]
+
+    def test_exhausted_pool_does_not_open_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, open_seconds=60)
+        circuit_breaker.begin_request()
+        with patch.object(database_connection, 'db_circuit', breaker), \
+                patch.object(database_connection, 'connection_pool') as pool:
+            pool.get_connection.side_effect = database_connection.errors.PoolError('pool exhausted')
+            assert database_connection.checkout_connection() is None
+        assert breaker.state == 'closed'
+        assert circuit_breaker.request_rejected()
+
+class TestSendResponse:
+    """Test cases for how the handler answers a request the circuit refused"""
+
+    @patch('utils.authentication.TokenValidationMiddleware.validate_request', return_value=(True, {'user_id': 7}))
+    def test_export_with_open_circuit_is_503_not_an_empty_file(self, mock_validate):
+        breaker = CircuitBreaker(failure_threshold=1, open_seconds=60)
+        breaker.record_failure('down')
+        for controller_class, path in ((ExpenseController, '/expenses/export'), (IncomeController, '/incomes/export')):
+            handler = Mock()
+            handler.path = path
+            circuit_breaker.begin_request()
+            with patch.object(database_connection, 'db_circuit', breaker), patch('app.db_circuit', breaker):
+                response = controller_class(handler, {'format': ['csv']}).handle_get()
+                assert 'stream' not in response
+                status, headers = self._send(response)
+            assert status == 503 and int(headers['Retry-After']) > 1
+
+    def _send(self, response):
+        handler = Mock()
+        SpendWiseRequestHandler._send_response(handler, response if isinstance(response, dict) else json_response(*response))
+        headers = dict(call.args for call in handler.send_header.call_args_list)
+        return handler.send_response.call_args.args[0], headers
+
+    def test_refused_request_is_503_whatever_the_handler_answered(self):
+        for response in (([], 200), ({'message': 'Not found'}, 404)):
+            circuit_breaker.begin_request()
+            circuit_breaker.note_rejected()
+            status, headers = self._send(response)
+            assert status == 503
+            assert 'Retry-After' in headers
+
+    def test_stale_answer_is_served_with_warning(self):
+        circuit_breaker.begin_request()
+        circuit_breaker.note_rejected()
+        circuit_breaker.note_stale()
+        status, headers = self._send(({'total': 42}, 200))
+        assert status == 200
+        assert headers['Warning'].startswith('110')
+
+    def test_healthy_request_is_unchanged(self):
+        circuit_breaker.begin_request()
+        status, headers = self._send(({'message': 'Not found'}, 404))
+        assert status == 404
+        assert 'Retry-After' not in headers and 'Warning' not in headers
@@ -0,0 +1,42 @@
+"""
+Unit tests for POST /expenses validation
+"""
+import io
+import json
+from unittest.mock import Mock, patch
+import pytest
+from controller.expense_controller import ExpenseController
+
+def _post(body):
+    handler = Mock()
+    handler.path = '/expenses'
+    payload = json.dumps(body).encode('utf-8')
+    handler.headers = {'Content-Length': str(len(payload))}
+    handler.rfile = io.BytesIO(payload)
+    response = ExpenseController(handler, {}).handle_post()
+    return response['status_code'], json.loads(response['body'])
+
+@pytest.fixture
+def write_behind():
+    with patch('controller.expense_controller.WRITE_BEHIND_ENABLED', True), \
+            patch('controller.expense_controller.expense_write_behind') as queue:
+        yield queue
+
+class TestCreateExpense:
+    """Test cases for what a write-behind 202 guarantees"""
+
+    def test_accepted_when_insertable(self, write_behind):
+        status, _ = _post({'amount': 12.5, 'category': 'Food', 'date': '2024-01-15', 'user_id': 1})
+        assert status == 202
+        write_behind.submit.assert_called_once()
+
+    @pytest.mark.parametrize('body', [
+        {'amount': 12.5, 'category': 'Food', 'date': '2024-01-15'},
+        {'amount': 12.5, 'category': 'Food', 'date': '15/01/2024', 'user_id': 1},
+        {'amount': 12.5, 'category': 'Food', 'date': '2024-02-30', 'user_id': 1},
+        {'amount': 12.5, 'category': 'Food', 'date': '2024-01-15', 'user_id': 'me'},
+    ])
+    def test_rejected_before_queueing(self, write_behind, body):
+        status, _ = _post(body)
+        assert status == 400
+        write_behind.submit.assert_not_called()
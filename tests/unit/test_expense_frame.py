@@ -0,0 +1,92 @@
+"""
+Unit tests for the columnar expense frame
+"""
+from datetime import date, timedelta
+from unittest.mock import patch
+import pytest
+from utils import expense_frame
+from utils.expense_frame import ExpenseFrame
+from utils.subscription_manager import SubscriptionManager
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run each test vectorized (when NumPy is installed) and with plain loops"""
+    if request.param == 'numpy' and expense_frame.np is None:
+        pytest.skip('NumPy not installed')
+    if request.param == 'python':
+        monkeypatch.setattr(expense_frame, 'np', None)
+    return request.param
+
+ROWS = [
+    (date(2024, 1, 5), 15.99, 'Entertainment', 'NETFLIX.COM payment'),
+    (date(2024, 1, 7), 40.00, 'Food', 'Grocer'),
+    (date(2024, 2, 5), 15.99, 'Entertainment', 'Netflix.com'),
+    (date(2024, 2, 9), 25.00, 'Food', 'Grocer'),
+    (date(2024, 3, 5), 15.99, 'Entertainment', 'netflix.com'),
+]
+
+class TestExpenseFrame:
+    """Test cases for ExpenseFrame"""
+
+    def test_columns_are_dictionary_encoded(self, backend):
+        frame = ExpenseFrame.from_rows(ROWS)
+        assert len(frame) == 5
+        assert frame.categories.values == ['Entertainment', 'Food']
+        assert list(frame.category_codes) == [0, 1, 0, 1, 0]
+        assert frame.days[0] == date(2024, 1, 5).toordinal()
+
+    def test_filters(self, backend):
+        frame = ExpenseFrame.from_rows(ROWS)
+        february = frame.filter(frame.between('2024-02-01', date(2024, 2, 29)))
+        assert [record['amount'] for record in february.records()] == [15.99, 25.0]
+        assert len(frame.filter(frame.category_is('Food'))) == 2
+        assert len(frame.filter(frame.category_is('Travel'))) == 0
+
+    def test_group_sums_and_category_totals(self, backend):
+        frame = ExpenseFrame.from_rows(ROWS)
+        assert frame.group_sums('category')['Food'] == (65.0, 2)
+        assert frame.category_totals()[0] == {'category': 'Food', 'total': 65.0, 'count': 2, 'avg_amount': 32.5}
+
+    def test_groupby_with_key_merges_values(self, backend):
+        frame = ExpenseFrame.from_rows(ROWS)
+        groups = dict(frame.groupby('merchant', key=lambda value: value.lower().split('.')[0]))
+        assert len(groups['netflix']) == 3
+        assert groups['netflix'].intervals() == [31, 29]
+        assert groups['grocer'].days_of_month() == [7, 9]
+
+    def test_rolling_sum(self, backend):
+        frame = ExpenseFrame.from_rows([(date(2024, 1, 1), 10, 'A', 'x'), (date(2024, 1, 2), 5, 'A', 'x'),
+                                        (date(2024, 1, 4), 1, 'A', 'x')])
+        first, sums = frame.rolling_sum(2)
+        assert first == date(2024, 1, 1).toordinal()
+        assert list(sums) == [10.0, 15.0, 5.0, 1.0]
+
+    def test_statistics(self, backend):
+        frame = ExpenseFrame.from_rows(ROWS)
+        assert frame.total() == pytest.approx(112.97)
+        assert frame.mode_amount() == 15.99
+        assert frame.first_date() == date(2024, 1, 5) and frame.last_date() == date(2024, 3, 5)
+        assert ExpenseFrame.from_rows([]).std() == 0.0
+
+class TestSubscriptionDetection:
+    """SubscriptionManager runs on the frame"""
+
+    @patch('utils.subscription_manager.load_expense_frame')
+    def test_detects_monthly_charge(self, mock_load, backend):
+        start = date.today() - timedelta(days=85)
+        rows = [(start + timedelta(days=30 * month), 15.99, 'Entertainment', 'Netflix.com payment')
+                for month in range(3)]
+        rows.append((start, 12.0, 'Food', 'Corner cafe'))
+        mock_load.return_value = ExpenseFrame.from_rows(rows)
+
+        result = SubscriptionManager().detect_subscriptions(1)
+
+        [subscription] = result['subscriptions']
+        assert subscription['service_name'] == 'netflix'
+        assert subscription['frequency'] == 'monthly'
+        assert subscription['monthly_cost'] == 15.99
+        assert subscription['last_charge'] == rows[2][0].isoformat()
+
+    @patch('utils.subscription_manager.load_expense_frame', return_value=None)
+    def test_database_failure(self, mock_load):
+        assert SubscriptionManager().detect_subscriptions(1) == {'error': 'Database connection failed'}
@@ -0,0 +1,91 @@
+"""
+Unit tests for bulk expense insertion and export streaming
+"""
+from unittest.mock import Mock, patch
+import pytest
+from database import expense_query
+
+def _expense(amount):
+    return {
+        'amount': amount,
+        'category': 'Food',
+        'description': 'Lunch',
+        'date': '2024-01-15',
+        'user_id': 1
+    }
+
+class TestCreateExpensesBulk:
+    """Test cases for create_expenses_bulk"""
+
+    @patch('database.expense_query.release_connection')
+    @patch('database.expense_query.get_connection')
+    def test_chunks_rows_in_one_transaction(self, mock_get_connection, mock_release):
+        """Rows are split into multi-row INSERTs and committed once"""
+        mock_cursor = Mock()
+        mock_cursor.lastrowid = 100
+        mock_connection = Mock()
+        mock_connection.cursor.return_value = mock_cursor
+        mock_get_connection.return_value = mock_connection
+
+        expense_ids = expense_query.create_expenses_bulk([_expense(i + 1) for i in range(5)], chunk_size=2)
+
+        # Three INSERT chunks followed by one rollup upsert
+        assert mock_cursor.execute.call_count == 4
+        last_insert, last_values = mock_cursor.execute.call_args_list[2][0]
+        assert last_insert.count('(%s, %s, %s, %s, %s)') == 1
+        assert len(last_values) == 5
+        rollup_query, rollup_values = mock_cursor.execute.call_args_list[3][0]
+        assert 'expense_monthly_rollup' in rollup_query
+        assert rollup_values[2:] == ['Food', 15, 5]
+        mock_connection.commit.assert_called_once()
+        assert expense_ids == [100, 101, 100, 101, 100]
+
+    @patch('database.expense_query.release_connection')
+    @patch('database.expense_query.get_connection')
+    def test_rolls_back_whole_batch_on_error(self, mock_get_connection, mock_release):
+        """A failing chunk rolls back every row in the batch"""
+        mock_cursor = Mock()
+        mock_cursor.execute.side_effect = [None, Exception('Duplicate entry')]
+        mock_cursor.lastrowid = 1
+        mock_connection = Mock()
+        mock_connection.cursor.return_value = mock_cursor
+        mock_get_connection.return_value = mock_connection
+
+        assert expense_query.create_expenses_bulk([_expense(1), _expense(2)], chunk_size=1) is None
+        mock_connection.rollback.assert_called_once()
+        mock_connection.commit.assert_not_called()
+
+    def test_empty_batch_skips_database(self):
+        """An empty batch never checks out a connection"""
+        with patch('database.expense_query.get_connection') as mock_get_connection:
+            assert expense_query.create_expenses_bulk([]) == []
+            mock_get_connection.assert_not_called()
+
+class TestIterExpensesForExport:
+    """Test cases for iter_expenses_for_export"""
+
+    @patch('database.expense_query.release_connection')
+    @patch('database.expense_query.get_connection')
+    def test_query_runs_before_the_stream_is_returned(self, mock_get_connection, mock_release):
+        mock_cursor = mock_get_connection.return_value.cursor.return_value
+        mock_cursor.fetchmany.side_effect = [[(1, '2024-01-15', 10, 'Food', 'Lunch')], []]
+
+        rows = expense_query.iter_expenses_for_export(1, '2024-01-01')
+        mock_cursor.execute.assert_called_once()
+        mock_release.assert_not_called()
+
+        assert list(rows) == [(1, '2024-01-15', 10, 'Food', 'Lunch')]
+        mock_release.assert_called_once_with(mock_get_connection.return_value)
+
+    @patch('database.expense_query.get_connection', return_value=None)
+    def test_no_connection_raises_instead_of_an_empty_export(self, mock_get_connection):
+        with pytest.raises(ConnectionError):
+            expense_query.iter_expenses_for_export(1)
+
+    @patch('database.expense_query.release_connection')
+    @patch('database.expense_query.get_connection')
+    def test_failed_query_releases_the_connection(self, mock_get_connection, mock_release):
+        mock_get_connection.return_value.cursor.return_value.execute.side_effect = ValueError('boom')
+        with pytest.raises(ValueError):
+            expense_query.iter_expenses_for_export(1)
+        mock_release.assert_called_once_with(mock_get_connection.return_value)
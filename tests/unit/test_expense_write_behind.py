@@ -0,0 +1,117 @@
+"""
+Unit tests for write-behind expense ingestion
+"""
+import json
+from unittest.mock import patch
+import pytest
+from database import expense_write_behind as write_behind_module
+from database.expense_write_behind import DurableLog, ExpenseWriteBehind
+
+def _expense(amount):
+    return {'amount': amount, 'category': 'Food', 'description': 'Lunch', 'date': '2024-01-15', 'user_id': 1}
+
+class TestDurableLog:
+    """Test cases for the fsync-batched log"""
+
+    def test_append_is_synced_and_replayed(self, tmp_path):
+        path = str(tmp_path / 'expenses.jsonl')
+        log = DurableLog(path, fsync_interval_ms=0)
+        assert log.open() == []
+        assert log.append(_expense(5)) == 1
+        assert log.append(_expense(6)) == 2
+        log.close()
+
+        reopened = DurableLog(path, fsync_interval_ms=0)
+        records = reopened.open(after_seq=1)
+        assert [record['seq'] for record in records] == [2]
+        assert records[0]['expense']['amount'] == 6
+        assert reopened.append(_expense(7)) == 3
+        reopened.close()
+
+    def test_torn_tail_is_cut_off(self, tmp_path):
+        path = tmp_path / 'expenses.jsonl'
+        path.write_bytes(json.dumps({'seq': 1, 'expense': _expense(5)}).encode() + b'\n{"seq": 2, "exp')
+        log = DurableLog(str(path), fsync_interval_ms=0)
+        assert [record['seq'] for record in log.open()] == [1]
+        assert log.append(_expense(6)) == 2
+        log.close()
+        assert [json.loads(line)['seq'] for line in path.read_text().splitlines()] == [1, 2]
+
+class TestExpenseWriteBehind:
+    """Test cases for queueing and flushing"""
+
+    @pytest.fixture
+    def checkpoint(self):
+        state = {'last_seq': 0}
+        with patch.object(write_behind_module, 'get_checkpoint', side_effect=lambda log_id: state['last_seq']), \
+                patch.object(write_behind_module, 'save_checkpoint',
+                             side_effect=lambda log_id, seq: state.update(last_seq=seq) or True), \
+                patch.object(write_behind_module, 'unit_of_work') as unit:
+            unit.return_value.__enter__.return_value = None
+            unit.return_value.__exit__.return_value = False
+            yield state
+
+    def test_flush_inserts_in_batches_and_checkpoints(self, tmp_path, checkpoint):
+        queue = ExpenseWriteBehind(str(tmp_path / 'expenses.jsonl'), batch_size=2, flush_interval=60)
+        with patch.object(write_behind_module.expense_query, 'create_expenses_bulk', return_value=[1]) as bulk:
+            for amount in range(3):
+                queue.submit(_expense(amount + 1))
+            queue.flush()
+            assert [len(call[0][0]) for call in bulk.call_args_list] == [2, 1]
+        assert checkpoint['last_seq'] == 3
+        assert queue.stats()['flushed'] == 3
+        assert queue.stats()['pending'] == 0
+        queue.stop()
+
+    def test_unflushed_records_are_replayed_once(self, tmp_path, checkpoint):
+        path = str(tmp_path / 'expenses.jsonl')
+        crashed = DurableLog(path, fsync_interval_ms=0)
+        crashed.open()
+        for amount in range(3):
+            crashed.append(_expense(amount + 1))
+        crashed.close()
+        checkpoint['last_seq'] = 1
+
+        queue = ExpenseWriteBehind(path, flush_interval=60)
+        with patch.object(write_behind_module.expense_query, 'create_expenses_bulk', return_value=[1]) as bulk:
+            queue.start()
+            queue.flush()
+            assert [row['amount'] for row in bulk.call_args[0][0]] == [2, 3]
+        assert queue.submit(_expense(9)) == 4
+        queue.stop()
+
+    def test_accepts_while_mysql_is_down_and_replays_later(self, tmp_path, checkpoint):
+        path = str(tmp_path / 'expenses.jsonl')
+        crashed = DurableLog(path, fsync_interval_ms=0)
+        crashed.open()
+        for amount in range(2):
+            crashed.append(_expense(amount + 1))
+        crashed.close()
+        checkpoint['last_seq'] = 1
+
+        queue = ExpenseWriteBehind(path, flush_interval=60)
+        with patch.object(write_behind_module, 'get_checkpoint', return_value=None):
+            assert queue.submit(_expense(3)) == 3
+            assert queue.flush() == 0
+
+        with patch.object(write_behind_module.expense_query, 'create_expenses_bulk', return_value=[1]) as bulk:
+            assert queue.flush() == 2
+            assert [row['amount'] for row in bulk.call_args[0][0]] == [2, 3]
+        assert checkpoint['last_seq'] == 3
+        queue.stop()
+
+    def test_emptied_log_keeps_its_numbering(self, tmp_path, checkpoint):
+        path = str(tmp_path / 'expenses.jsonl')
+        queue = ExpenseWriteBehind(path, flush_interval=60)
+        with patch.object(write_behind_module.expense_query, 'create_expenses_bulk', return_value=[1]):
+            queue.submit(_expense(1))
+            queue.submit(_expense(2))
+            queue.flush()
+        assert queue.log.compact(queue.flushed_seq, min_bytes=0)
+        queue.stop()
+
+        # Numbering survives even if the checkpoint cannot be read
+        reopened = DurableLog(path, fsync_interval_ms=0)
+        assert reopened.open() == []
+        assert reopened.append(_expense(3)) == 3
+        reopened.close()
@@ -0,0 +1,43 @@
+"""
+Unit tests for streaming export formatters
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+from utils import export_formatter
+from utils.export_formatter import csv_chunks, ndjson_chunks, spreadsheet_chunks
+
+COLUMNS = ('id', 'date', 'amount', 'category', 'description')
+ROWS = [
+    (1, date(2024, 1, 2), Decimal('4.50'), 'Food', 'Lunch, "downtown"'),
+    (2, date(2024, 1, 3), Decimal('12.00'), 'Transportation', None)
+]
+
+class TestExportFormatters:
+    """Test cases for csv, ndjson and xlsx-lite output"""
+
+    def test_csv_has_header_and_quoting(self):
+        output = b''.join(csv_chunks(COLUMNS, iter(ROWS))).decode('utf-8').splitlines()
+        assert output[0] == 'id,date,amount,category,description'
+        assert output[1] == '1,2024-01-02,4.50,Food,"Lunch, ""downtown"""'
+        assert len(output) == 3
+
+    def test_ndjson_one_object_per_line(self):
+        lines = b''.join(ndjson_chunks(COLUMNS, iter(ROWS))).decode('utf-8').splitlines()
+        first = json.loads(lines[0])
+        assert first['date'] == '2024-01-02'
+        assert first['amount'] == '4.50'
+        assert json.loads(lines[1])['description'] is None
+
+    def test_spreadsheet_escapes_text(self):
+        output = b''.join(spreadsheet_chunks(COLUMNS, iter([(1, None, Decimal('1'), 'A&B', '<x>')]))).decode('utf-8')
+        assert '<Data ss:Type="Number">1</Data>' in output
+        assert 'A&amp;B' in output
+        assert '&lt;x&gt;' in output
+        assert output.rstrip().endswith('</Workbook>')
+
+    def test_rows_are_batched_into_chunks(self):
+        with patch.object(export_formatter, 'EXPORT_CHUNK_SIZE', 64):
+            chunks = list(csv_chunks(COLUMNS, iter(ROWS * 10)))
+        assert 1 < len(chunks) < 21
@@ -0,0 +1,49 @@
+"""
+Unit tests for the migration runner
+"""
+from unittest.mock import Mock
+from database import migrate
+
+class TestSplitStatements:
+    """Test cases for split_statements"""
+
+    def test_skips_comments_and_keeps_quoted_semicolons(self):
+        sql = ("-- header; not a statement\n"
+               "CREATE TABLE t (id INT); -- trailing\n"
+               "INSERT INTO t (name) VALUES ('a;b');\n"
+               "ALTER TABLE t ADD INDEX idx (`read`)")
+        assert migrate.split_statements(sql) == [
+            "CREATE TABLE t (id INT)",
+            "INSERT INTO t (name) VALUES ('a;b')",
+            "ALTER TABLE t ADD INDEX idx (`read`)"
+        ]
+
+class TestMigrations:
+    """Test cases for discovering and applying migrations"""
+
+    def test_shipped_migrations_are_ordered_and_self_recording(self):
+        migrations = migrate.discover_migrations()
+        versions = [m['version'] for m in migrations]
+        assert versions == sorted(versions)
+        for migration in migrations:
+            assert f"VALUES ('{migration['version']}', '{migration['name']}')" in migration['sql']
+
+    def test_hot_path_indexes_are_shipped(self):
+        sql = ' '.join(m['sql'] for m in migrate.discover_migrations())
+        assert 'expense ADD INDEX idx_expense_user_date (user_id, date)' in sql
+        assert 'expense ADD INDEX idx_expense_user_category_date (user_id, category, date)' in sql
+        assert 'income ADD INDEX idx_income_user_date (user_id, date)' in sql
+        assert 'notification ADD INDEX idx_notification_user_read_created (user_id, `read`, created_at)' in sql
+
+    def test_duplicate_index_is_tolerated(self):
+        duplicate = Exception('Duplicate key name')
+        duplicate.errno = 1061
+        cursor = Mock()
+        cursor.execute.side_effect = [duplicate, None, None]
+        migration = {'version': '0009', 'name': 'test', 'checksum': 'abc',
+                     'sql': 'ALTER TABLE t ADD INDEX i (a); ALTER TABLE t ADD INDEX j (b);'}
+
+        migrate.apply_migration(cursor, migration)
+
+        recorded_values = cursor.execute.call_args_list[-1][0][1]
+        assert recorded_values == ('0009', 'test', 'abc')
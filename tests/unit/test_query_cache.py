@@ -0,0 +1,77 @@
+"""
+Unit tests for the query result cache
+"""
+from unittest.mock import Mock, patch
+from database import query_cache as query_cache_module
+from database.query_cache import QueryCache, cached_query
+
+class TestQueryCache:
+    """Test cases for QueryCache"""
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = QueryCache(max_entries=2)
+        cache.set('a', 1, [('budget', 1)])
+        cache.set('b', 2, [('budget', 2)])
+        cache.get('a')
+        cache.set('c', 3, [('budget', 3)])
+
+        assert cache.get('b') == (False, None)
+        assert cache.get('a') == (True, 1)
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalidate_drops_only_tagged_entries(self):
+        cache = QueryCache()
+        cache.set('budgets', [1], [('budget', 1)])
+        cache.set('totals', {}, [('expense', 1)])
+        cache.set('other_user', {}, [('expense', 2)])
+
+        assert cache.invalidate_user(1, 'expense') == 1
+        assert cache.get('totals') == (False, None)
+        assert cache.get('budgets') == (True, [1])
+        assert cache.invalidate_table('expense') == 1
+        assert cache.get('other_user') == (False, None)
+
+    def test_expired_entries_miss(self):
+        cache = QueryCache(ttl_seconds=0)
+        cache.set('a', 1, [])
+        assert cache.get('a') == (False, None)
+        assert cache.stats()['hit_ratio'] == 0.0
+
+class TestCachedQuery:
+    """Test cases for the cached_query decorator"""
+
+    def test_hits_until_a_write_invalidates(self):
+        cache = QueryCache()
+        loader = Mock(side_effect=[3, 4])
+
+        @cached_query(('notification',))
+        def get_unread_count(user_id: int) -> int:
+            return loader(user_id)
+
+        with patch.object(query_cache_module, 'query_cache', cache):
+            assert get_unread_count(7) == 3
+            assert get_unread_count(user_id=7) == 3
+            cache.invalidate_user(7, 'notification')
+            assert get_unread_count(7) == 4
+
+        assert loader.call_count == 2
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 2)
+
+    def test_fill_racing_a_write_is_not_cached(self):
+        cache = QueryCache()
+        results = iter([3, 4])
+
+        @cached_query(('notification',))
+        def get_unread_count(user_id: int) -> int:
+            value = next(results)
+            if value == 3:
+                # A write commits while this read is running
+                cache.invalidate_user(user_id, 'notification')
+            return value
+
+        with patch.object(query_cache_module, 'query_cache', cache):
+            assert get_unread_count(7) == 3
+            assert get_unread_count(7) == 4
+            assert get_unread_count(7) == 4
+        assert cache.stats()['entries'] == 1
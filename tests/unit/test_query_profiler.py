@@ -0,0 +1,48 @@
+"""
+Unit tests for statement profiling and N+1 detection
+"""
+from unittest.mock import Mock, patch
+import pytest
+from database import query_profiler
+from database.query_profiler import NPlusOneError, ProfilingCursor, normalize_statement, request_scope
+
+class TestNormalizeStatement:
+    """Test cases for normalize_statement"""
+
+    def test_parameters_and_literals_share_a_shape(self):
+        assert normalize_statement("SELECT * FROM budget\n  WHERE id = %s") == "SELECT * FROM budget WHERE id = ?"
+        assert normalize_statement("SELECT * FROM budget WHERE id = 42 AND category = 'Food'") == \
+            "SELECT * FROM budget WHERE id = ? AND category = ?"
+
+    def test_multi_row_values_and_in_lists_fold(self):
+        assert normalize_statement("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == \
+            "INSERT INTO t (a, b) VALUES (?, ?), ..."
+        assert normalize_statement("SELECT * FROM t WHERE id IN (%s, %s, %s)") == "SELECT * FROM t WHERE id IN (...)"
+
+class TestProfilingCursor:
+    """Test cases for the cursor wrapper and request scopes"""
+
+    def test_repeated_statement_fails_strict_scope(self):
+        cursor = ProfilingCursor(Mock(rowcount=1))
+        with pytest.raises(NPlusOneError):
+            with request_scope('GET /budgets', strict=True, threshold=3) as profile:
+                for budget_id in range(5):
+                    cursor.execute("SELECT * FROM budget WHERE id = %s", (budget_id,))
+        assert profile.query_count == 5
+        assert profile.repeated == ["SELECT * FROM budget WHERE id = ?"]
+
+    def test_lenient_scope_only_warns(self):
+        cursor = ProfilingCursor(Mock(rowcount=1))
+        with patch.object(query_profiler.logger, 'warning') as warning:
+            with request_scope('GET /budgets', strict=False, threshold=1):
+                for budget_id in range(3):
+                    cursor.execute("SELECT * FROM budget WHERE id = %s", (budget_id,))
+        warning.assert_called_once()
+
+    def test_slow_statement_is_logged(self):
+        cursor = ProfilingCursor(Mock(rowcount=7))
+        with patch.object(query_profiler, 'SLOW_QUERY_THRESHOLD_MS', 0), \
+                patch.object(query_profiler.slow_query_logger, 'warning') as warning:
+            cursor.execute("SELECT * FROM expense WHERE user_id = %s", (1,))
+        assert '7 rows' in warning.call_args[0][0]
+        assert 'user_id = ?' in warning.call_args[0][0]
@@ -0,0 +1,70 @@
+"""
+Unit tests for the transient-error retry policy
+"""
+from unittest.mock import Mock, patch
+import pytest
+from database import retry
+from database.query_profiler import ProfilingCursor
+from database.retry import backoff_delay, is_transient, retry_transient
+
+def _mysql_error(errno):
+    error = Exception(f"MySQL error {errno}")
+    error.errno = errno
+    return error
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch.object(retry.time, 'sleep') as sleep:
+        yield sleep
+
+def _query_function(failures, idempotent=True, attempts=3):
+    """Fake query function that fails its first statements, then succeeds"""
+    cursor = ProfilingCursor(Mock(rowcount=1))
+    cursor._cursor.execute.side_effect = failures + [None] * 5
+    calls = []
+
+    @retry_transient(idempotent=idempotent, attempts=attempts)
+    def update_something():
+        calls.append(1)
+        try:
+            cursor.execute("UPDATE budget SET amount = %s WHERE id = %s", (1, 2))
+            return True
+        except Exception:
+            return False
+
+    return update_something, calls
+
+class TestRetryPolicy:
+    """Test cases for retry_transient"""
+
+    def test_deadlock_is_retried_until_success(self, no_sleep):
+        update_something, calls = _query_function([_mysql_error(1213), _mysql_error(1205)])
+        assert update_something() is True
+        assert len(calls) == 3
+        assert no_sleep.call_count == 2
+
+    def test_gives_up_after_max_attempts(self):
+        update_something, calls = _query_function([_mysql_error(1213)] * 3, attempts=3)
+        assert update_something() is False
+        assert len(calls) == 3
+
+    def test_lost_connection_only_retried_when_idempotent(self):
+        update_something, calls = _query_function([_mysql_error(2013)], idempotent=False)
+        assert update_something() is False
+        assert len(calls) == 1
+
+        update_something, calls = _query_function([_mysql_error(2013)], idempotent=True)
+        assert update_something() is True
+        assert len(calls) == 2
+
+    def test_other_errors_are_not_retried(self):
+        update_something, calls = _query_function([_mysql_error(1062)])
+        assert update_something() is False
+        assert len(calls) == 1
+
+    def test_classification_and_backoff_bounds(self):
+        assert is_transient(_mysql_error(2006))
+        assert not is_transient(_mysql_error(2006), idempotent=False)
+        assert is_transient(_mysql_error(1213), idempotent=False)
+        for attempt in range(1, 10):
+            assert 0 <= backoff_delay(attempt, base_ms=50, max_ms=1000) <= 1.0
@@ -0,0 +1,61 @@
+"""
+Unit tests for rollup range planning
+"""
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+from database.rollup_query import plan_range, month_start
+
+def _evaluate(segments, daily_amounts):
+    """Sum daily amounts the way _aggregate combines rollup and raw segments"""
+    monthly = defaultdict(float)
+    for day, amount in daily_amounts.items():
+        monthly[month_start(day)] += amount
+
+    total = 0.0
+    for segment in segments:
+        if segment[0] == 'rollup':
+            _, first_month, last_month = segment
+            total += sum(amount for month, amount in monthly.items()
+                         if (first_month is None or month >= first_month)
+                         and (last_month is None or month <= last_month))
+        else:
+            _, sign, from_date, to_date = segment
+            total += sign * sum(amount for day, amount in daily_amounts.items() if from_date <= day <= to_date)
+    return total
+
+class TestPlanRange:
+    """Test cases for plan_range"""
+
+    def setup_method(self):
+        day = date(2023, 1, 1)
+        self.daily_amounts = {}
+        while day < date(2025, 1, 1):
+            self.daily_amounts[day] = float(day.toordinal() % 37)
+            day += timedelta(days=1)
+
+    def _direct(self, start, end):
+        return sum(amount for day, amount in self.daily_amounts.items()
+                   if (start is None or day >= start) and (end is None or day <= end))
+
+    def test_matches_direct_sum_for_random_ranges(self):
+        generator = random.Random(42)
+        for _ in range(500):
+            start = date(2023, 1, 1) + timedelta(days=generator.randrange(700))
+            end = start + timedelta(days=generator.randrange(200))
+            assert _evaluate(plan_range(start, end), self.daily_amounts) == self._direct(start, end)
+
+    def test_open_ranges(self):
+        assert _evaluate(plan_range(date(2024, 3, 20), None), self.daily_amounts) == self._direct(date(2024, 3, 20), None)
+        assert _evaluate(plan_range(None, date(2023, 6, 2)), self.daily_amounts) == self._direct(None, date(2023, 6, 2))
+        assert plan_range() == [('rollup', None, None)]
+
+    def test_whole_months_use_rollup_only(self):
+        assert plan_range(date(2024, 1, 1), date(2024, 3, 31)) == [('rollup', date(2024, 1, 1), date(2024, 3, 1))]
+
+    def test_short_range_scans_raw_rows(self):
+        assert plan_range(date(2024, 1, 10), date(2024, 1, 12)) == [('raw', 1, date(2024, 1, 10), date(2024, 1, 12))]
+
+    def test_month_to_date_subtracts_remaining_days(self):
+        segments = plan_range(date(2024, 1, 1), date(2024, 1, 28))
+        assert segments == [('rollup', date(2024, 1, 1), date(2024, 1, 1)), ('raw', -1, date(2024, 1, 29), date(2024, 1, 31))]
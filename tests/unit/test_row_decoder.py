@@ -0,0 +1,99 @@
+"""
+Unit tests for tuple-row decoding into models
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+import pytest
+from database import budget_query, notification_query
+from database.row_decoder import fetch_model, fetch_models, row_decoder
+from model.budget import budget
+from model.expense import expense
+from model.notification import notification
+
+def _cursor(columns, rows):
+    cursor = Mock()
+    cursor.description = [(name, None) for name in columns]
+    cursor.fetchall.return_value = rows
+    cursor.fetchone.return_value = rows[0] if rows else None
+    return cursor
+
+BUDGET_COLUMNS = ('id', 'amount', 'category', 'start_date', 'end_date', 'user_id', 'created_at', 'updated_at')
+
+class TestRowDecoder:
+    """Test cases for row_decoder"""
+
+    def test_maps_columns_in_any_order(self):
+        decode = row_decoder(expense, ('user_id', 'description', 'date', 'category', 'amount', 'id'))
+        item = decode((7, 'lunch', date(2024, 1, 2), 'Food', Decimal('12.50'), 3))
+        assert (item.id, item.amount, item.category, item.user_id) == (3, Decimal('12.50'), 'Food', 7)
+        assert item.description == 'lunch'
+
+    def test_decoder_is_cached_per_column_layout(self):
+        assert row_decoder(budget, BUDGET_COLUMNS) is row_decoder(budget, BUDGET_COLUMNS)
+
+    def test_missing_optional_column_takes_default(self):
+        item = row_decoder(expense, ('id', 'amount', 'category', 'date', 'user_id'))((1, 5, 'Fun', date(2024, 1, 1), 9))
+        assert item.description is None
+        assert item.user_id == 9
+
+    def test_missing_required_column_raises(self):
+        with pytest.raises(ValueError):
+            row_decoder(budget, ('id', 'amount'))
+
+    def test_fetch_helpers(self):
+        row = (1, Decimal('100'), 'Food', date(2024, 1, 1), date(2024, 1, 31), 7, None, None)
+        budgets = fetch_models(_cursor(BUDGET_COLUMNS, [row, row]), budget)
+        assert [b.category for b in budgets] == ['Food', 'Food']
+        assert fetch_model(_cursor(BUDGET_COLUMNS, []), budget) is None
+
+class TestQueryFunctions:
+    """Model readers use tuple cursors"""
+
+    @patch('database.budget_query.release_connection')
+    @patch('database.budget_query.get_connection')
+    def test_budgets_by_user_uses_tuple_cursor(self, mock_get_connection, mock_release):
+        row = (4, Decimal('300'), 'Rent', date(2024, 2, 1), date(2024, 2, 29), 2, None, None)
+        cursor = _cursor(BUDGET_COLUMNS, [row])
+        mock_get_connection.return_value.cursor.return_value = cursor
+
+        budgets = budget_query.get_budgets_by_user.uncached(2)
+
+        mock_get_connection.return_value.cursor.assert_called_once_with()
+        assert budgets[0].id == 4 and budgets[0].end_date == date(2024, 2, 29)
+
+    @patch('database.notification_query.release_connection')
+    @patch('database.notification_query.get_connection')
+    def test_notification_by_id(self, mock_get_connection, mock_release):
+        columns = ('id', 'notification_type', 'message', 'user_id', 'sent', 'read', 'created_at', 'sent_at')
+        cursor = _cursor(columns, [(8, 'budget_alert', 'Over budget', 2, 1, 0, None, None)])
+        mock_get_connection.return_value.cursor.return_value = cursor
+
+        item = notification_query.get_notification_by_id(8)
+
+        assert (item.id, item.message, item.read) == (8, 'Over budget', 0)
+
+class TestModels:
+    """Test cases for the slotted models"""
+
+    def test_models_have_no_instance_dict(self):
+        assert not hasattr(expense(1, 5, 'Food', '2024-01-01'), '__dict__')
+
+    def test_created_at_comes_from_the_row(self):
+        stored = datetime(2024, 1, 3, 9, 30)
+        row = (1, Decimal('100'), 'Food', date(2024, 1, 1), date(2024, 1, 31), 7, stored, None)
+        assert budget.from_row(row, BUDGET_COLUMNS).created_at == stored
+
+    def test_created_at_is_filled_on_first_access(self):
+        item = budget(None, 100, 'Food', '2024-01-01', '2024-01-31', 7)
+        first = item.created_at
+        assert isinstance(first, str) and item.created_at == first
+        with pytest.raises(AttributeError):
+            item.missing
+
+    def test_to_dict_and_to_json(self):
+        item = notification(3, 'system', 'Hello', 2)
+        assert item.to_dict()['sent_at'] is None
+        assert set(item.to_dict()) == {'id', 'notification_type', 'message', 'user_id', 'sent', 'read', 'created_at', 'sent_at'}
+        assert json.loads(expense(1, Decimal('9.99'), 'Food', date(2024, 1, 2)).to_json())['amount'] == '9.99'
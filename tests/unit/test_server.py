@@ -0,0 +1,73 @@
+"""
+Unit tests for the threaded HTTP server
+"""
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+from database import circuit_breaker
+from app import SpendWiseServer
+
+class _BarrierHandler(BaseHTTPRequestHandler):
+    """Answers once as many requests as the barrier expects are in flight"""
+    barrier = None
+    timeout = 5
+
+    def do_GET(self):
+        circuit_breaker.begin_request()
+        if self.path == '/rejected':
+            circuit_breaker.note_rejected()
+        self.barrier.wait(timeout=self.timeout)
+        body = str(circuit_breaker.request_rejected()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _serve(max_threads, parties):
+    _BarrierHandler.barrier = threading.Barrier(parties)
+    server = SpendWiseServer(('localhost', 0), _BarrierHandler, max_threads=max_threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _get_all(server, paths):
+    results = {}
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(f"http://localhost:{server.server_port}{path}", timeout=10) as response:
+                results[path] = response.read().decode('utf-8')
+        except Exception as e:
+            results[path] = e
+
+    threads = [threading.Thread(target=get, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class TestSpendWiseServer:
+    """Test cases for SpendWiseServer"""
+
+    def test_requests_are_served_concurrently_with_their_own_state(self):
+        server = _serve(max_threads=2, parties=2)
+        try:
+            assert _get_all(server, ['/rejected', '/ok']) == {'/rejected': 'True', '/ok': 'False'}
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_concurrency_is_bounded(self):
+        server = _serve(max_threads=1, parties=2)
+        _BarrierHandler.timeout = 0.5
+        try:
+            _get_all(server, ['/a', '/b'])
+        finally:
+            _BarrierHandler.timeout = 5
+            server.shutdown()
+            server.server_close()
+        # With a single slot the two requests never meet at the barrier
+        assert _BarrierHandler.barrier.broken
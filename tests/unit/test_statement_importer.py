@@ -0,0 +1,122 @@
+"""
+Unit tests for the streaming statement importer
+"""
+import io
+from decimal import Decimal
+from unittest.mock import patch
+from utils import statement_importer
+from utils.statement_importer import ImportJob, InvalidRow, StatementImporter, parse_csv, parse_ofx, parse_qif, detect_format
+
+OFX_STATEMENT = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240105120000[-5:EST]
+<TRNAMT>-15.99
+<NAME>NETFLIX.COM
+<MEMO>Netflix subscription
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240106</DTPOSTED><TRNAMT>100.00</TRNAMT><NAME>Refund</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+class TestStatementParsers:
+    """Test cases for CSV, OFX and QIF parsing"""
+
+    def test_parse_csv_skips_credits(self):
+        stream = io.StringIO("Date,Description,Amount,Type\n"
+                             "2024-01-02,STARBUCKS #12,-4.50,debit\n"
+                             "01/03/2024,Paycheck,2000,credit\n")
+        rows = list(parse_csv(stream))
+        assert len(rows) == 1
+        assert rows[0]['date'] == '2024-01-02'
+        assert rows[0]['amount'] == Decimal('4.50')
+
+    def test_parse_csv_signed_amounts(self):
+        stream = io.StringIO("Date,Description,Amount\n"
+                             "2024-01-02,Coffee,-4.50\n"
+                             "2024-01-03,Salary,2000.00\n"
+                             "2024-01-04,Refund,$12.99\n"
+                             "2024-01-05,Rent,(800.00)\n")
+        rows = list(parse_csv(stream))
+        assert [(row['description'], row['amount']) for row in rows] == [
+            ('Coffee', Decimal('4.50')), ('Rent', Decimal('800.00'))]
+
+    def test_parse_csv_debit_column(self):
+        stream = io.StringIO("Date,Description,Debit,Credit\n"
+                             "2024-01-02,Coffee,4.50,\n"
+                             "2024-01-03,Salary,,2000.00\n")
+        rows = list(parse_csv(stream))
+        assert [(row['description'], row['amount']) for row in rows] == [('Coffee', Decimal('4.50'))]
+
+    def test_parse_ofx_across_small_reads(self):
+        with patch.object(statement_importer, 'READ_CHUNK_SIZE', 7):
+            rows = list(parse_ofx(io.StringIO(OFX_STATEMENT)))
+        assert rows == [{
+            'date': '2024-01-05',
+            'amount': Decimal('15.99'),
+            'description': 'Netflix subscription',
+            'merchant': 'NETFLIX.COM',
+            'category': None
+        }]
+
+    def test_parse_qif_keeps_category(self):
+        stream = io.StringIO("!Type:Bank\nD1/8'24\nT-25.00\nPShell\nLTransportation\n^\nD01/09/2024\nT500.00\nPSalary\n^\n")
+        rows = list(parse_qif(stream))
+        assert len(rows) == 1
+        assert rows[0]['date'] == '2024-01-08'
+        assert rows[0]['category'] == 'Transportation'
+
+    def test_bad_rows_do_not_stop_parsing(self):
+        stream = io.StringIO("!Type:Bank\nDyesterday\nT-5.00\n^\nD01/09/2024\nT-7.00\n^\n")
+        rows = list(parse_qif(stream))
+        assert isinstance(rows[0], InvalidRow) and rows[0].number == 1
+        assert rows[1]['amount'] == Decimal('7.00')
+
+    def test_detect_format(self):
+        assert detect_format(OFX_STATEMENT[:100]) == 'ofx'
+        assert detect_format('!Type:Bank\n') == 'qif'
+        assert detect_format('Date,Amount\n') == 'csv'
+        assert detect_format('', 'statement.qif') == 'qif'
+
+class TestStatementImporter:
+    """Test cases for the batch pipeline"""
+
+    @patch('utils.statement_importer.expense_query')
+    def test_duplicates_are_matched_one_for_one(self, mock_expense_query, tmp_path):
+        statement = tmp_path / 'statement.csv'
+        statement.write_text("Date,Description,Amount,Category\n"
+                             "2024-01-02,Coffee,-4.50,Food\n"
+                             "2024-01-02,Coffee,-4.50,Food\n"
+                             "2024-01-03,Uber trip,-12.00,\n")
+        mock_expense_query.get_expense_fingerprints.return_value = [
+            {'date': '2024-01-02', 'amount': Decimal('4.50'), 'description': 'Coffee', 'occurrences': 1}
+        ]
+        mock_expense_query.create_expenses_bulk.side_effect = lambda rows: list(range(len(rows)))
+
+        job = StatementImporter(batch_size=10).run(ImportJob(1, str(statement), 'csv'))
+
+        assert job.status == 'completed'
+        assert job.duplicates == 1
+        assert job.imported == 2
+        inserted = mock_expense_query.create_expenses_bulk.call_args[0][0]
+        assert [row['category'] for row in inserted][0] == 'Food'
+        assert inserted[1]['category']
+
+    @patch('utils.statement_importer.expense_query')
+    def test_invalid_rows_are_reported_and_skipped(self, mock_expense_query, tmp_path):
+        statement = tmp_path / 'statement.csv'
+        statement.write_text("Date,Description,Amount\n"
+                             "2024-01-02,Coffee,-4.50\n"
+                             "not a date,Lunch,-9.00\n"
+                             "2024-01-03,Books,-abc\n"
+                             "2024-01-04,Taxi,-12.00\n")
+        mock_expense_query.get_expense_fingerprints.return_value = []
+        mock_expense_query.create_expenses_bulk.side_effect = lambda rows: list(range(len(rows)))
+
+        job = StatementImporter(batch_size=1).run(ImportJob(1, str(statement), 'csv'))
+
+        assert job.status == 'completed'
+        assert job.imported == 2 and job.invalid == 2
+        assert [error['row'] for error in job.to_dict()['errors']] == [2, 3]
+        assert 'Unrecognized date' in job.errors[0]['error']
@@ -0,0 +1,242 @@
+"""
+Unit tests for token revocation and refresh-token rotation
+"""
+import json
+import time
+from unittest.mock import patch
+import jwt
+import pytest
+from database.user_cache import UserProfileCache
+from utils.authentication import AuthenticationManager
+from utils.token_revocation import BloomFilter, RevocationStore
+
+USER = {'user_id': 1, 'username': 'alice', 'email': 'alice@example.com', 'role': 'user'}
+
+def _store(tmp_path, **kwargs):
+    return RevocationStore(str(tmp_path / 'revoked.jsonl'), sync_seconds=0, **kwargs)
+
+class TestBloomFilter:
+    """Test cases for the Bloom filter"""
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        values = [f"jti-{index}" for index in range(1000)]
+        for value in values:
+            bloom.add(value)
+        assert all(value in bloom for value in values)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f"jti-{index}")
+        positives = sum(f"other-{index}" in bloom for index in range(10000))
+        assert positives < 300
+
+class TestRevocationStore:
+    """Test cases for RevocationStore"""
+
+    def test_revoke(self, tmp_path):
+        store = _store(tmp_path)
+        store.revoke('abc', time.time() + 60)
+        assert store.is_revoked('abc')
+        assert not store.is_revoked('def')
+        assert not store.is_revoked(None)
+
+    def test_revocations_reach_other_processes(self, tmp_path):
+        first, second = _store(tmp_path), _store(tmp_path)
+        assert not second.is_revoked('abc')
+        first.revoke('abc', time.time() + 60)
+        assert second.is_revoked('abc')
+
+    def test_sync_is_throttled(self, tmp_path):
+        reader = RevocationStore(str(tmp_path / 'revoked.jsonl'), sync_seconds=60)
+        reader.is_revoked('abc')
+        _store(tmp_path).revoke('abc', time.time() + 60)
+        assert not reader.is_revoked('abc')
+
+    def test_expired_entries_are_compacted(self, tmp_path):
+        store = _store(tmp_path)
+        store.revoke('old', time.time() - 1)
+        store.revoke('live', time.time() + 60)
+
+        restarted = _store(tmp_path)
+        assert restarted.is_revoked('live') and not restarted.is_revoked('old')
+        lines = (tmp_path / 'revoked.jsonl').read_text().splitlines()
+        assert [json.loads(line)['jti'] for line in lines] == ['live']
+
+        # Still picks up appends after the file was replaced
+        store.revoke('later', time.time() + 60)
+        assert restarted.is_revoked('later')
+
+    def test_bloom_grows_past_capacity(self, tmp_path):
+        store = _store(tmp_path, capacity=4)
+        for index in range(20):
+            store.revoke(f"jti-{index}", time.time() + 60)
+        assert all(store.is_revoked(f"jti-{index}") for index in range(20))
+
+    def test_expired_entries_are_purged_while_running(self, tmp_path):
+        store = _store(tmp_path, capacity=4, purge_seconds=0)
+        for index in range(20):
+            store.revoke(f"jti-{index}", time.time() + 0.2)
+        store.revoke('live', time.time() + 60)
+        assert store.stats()['bloom_capacity'] > 4
+
+        time.sleep(0.3)
+        assert store.is_revoked('live')
+        assert not store.is_revoked('jti-0')
+        stats = store.stats()
+        assert stats['revoked'] == 1 and stats['purged'] == 20
+        assert stats['bloom_capacity'] == 4
+        lines = (tmp_path / 'revoked.jsonl').read_text().splitlines()
+        assert [json.loads(line)['jti'] for line in lines] == ['live']
+
+    def test_purge_waits_for_its_interval(self, tmp_path):
+        store = _store(tmp_path, purge_seconds=60)
+        store.revoke('old', time.time() - 1)
+        store.is_revoked('old')
+        assert store.stats()['revoked'] == 1
+
+    def test_torn_line_is_left_for_later(self, tmp_path):
+        store = _store(tmp_path)
+        with open(store.path, 'a') as file:
+            file.write('{"jti": "abc", "exp": ')
+        assert not store.is_revoked('abc')
+        with open(store.path, 'a') as file:
+            file.write(f'{time.time() + 60}}}\n')
+        assert store.is_revoked('abc')
+
+class TestTokenRevocation:
+    """Test cases for revoking tokens through AuthenticationManager"""
+
+    def test_revoked_token_is_rejected(self, tmp_path):
+        manager = AuthenticationManager()
+        manager.revocations = _store(tmp_path)
+        token = manager.generate_token(USER)
+        other = manager.generate_token(USER)
+        assert manager.verify_token(token) is not None
+
+        assert manager.revoke_token(token)
+        assert manager.verify_token(token) is None
+        assert manager.verify_token(other) is not None
+
+    def test_tokens_have_distinct_ids(self):
+        manager = AuthenticationManager()
+        first = jwt.decode(manager.generate_token(USER), options={'verify_signature': False})
+        second = jwt.decode(manager.generate_token(USER), options={'verify_signature': False})
+        assert first['jti'] != second['jti']
+
+    def test_invalid_token_cannot_be_revoked(self, tmp_path):
+        manager = AuthenticationManager()
+        manager.revocations = _store(tmp_path)
+        assert not manager.revoke_token('not-a-token')
+        assert manager.revocations.stats()['revoked'] == 0
+
+    def test_check_does_not_query_the_database(self, tmp_path):
+        manager = AuthenticationManager()
+        manager.revocations = _store(tmp_path)
+        token = manager.generate_token(USER)
+        manager.revoke_token(token)
+        with patch('utils.authentication.get_connection') as mock_connection:
+            assert manager.verify_token(token) is None
+        mock_connection.assert_not_called()
+
+class TestRefreshTokens:
+    """Test cases for refresh-token rotation"""
+
+    @pytest.fixture(autouse=True)
+    def profiles(self):
+        cache = UserProfileCache()
+        cache.set(1, USER)
+        with patch('database.user_query.user_profiles', cache):
+            yield cache
+
+    def _manager(self, tmp_path):
+        manager = AuthenticationManager()
+        manager.revocations = _store(tmp_path)
+        return manager
+
+    def test_refresh_issues_a_new_pair(self, tmp_path):
+        manager = self._manager(tmp_path)
+        refresh_token = manager.generate_refresh_token(USER)
+
+        # The profile is cached, so refreshing does not query MySQL
+        with patch('utils.authentication.get_connection') as mock_connection, \
+                patch('database.user_query.get_connection') as mock_query_connection:
+            token, new_refresh_token = manager.refresh_tokens(refresh_token)
+        mock_connection.assert_not_called()
+        mock_query_connection.assert_not_called()
+
+        assert manager.verify_token(token)['user_id'] == 1
+        assert new_refresh_token != refresh_token
+
+    def test_deleted_user_cannot_refresh(self, tmp_path, profiles):
+        manager = self._manager(tmp_path)
+        refresh_token = manager.generate_refresh_token(USER)
+        profiles.invalidate(1)
+        with patch('database.user_query.get_profile_row', return_value=None):
+            assert manager.refresh_tokens(refresh_token) is None
+
+    def test_role_change_reaches_refreshed_tokens(self, tmp_path, profiles):
+        manager = self._manager(tmp_path)
+        refresh_token = manager.generate_refresh_token(dict(USER, role='admin'))
+        token, new_refresh_token = manager.refresh_tokens(refresh_token)
+        assert manager.verify_token(token)['role'] == 'user'
+        payload = jwt.decode(new_refresh_token, options={'verify_signature': False})
+        assert payload['role'] == 'user'
+
+    def test_login_time_is_carried_over(self, tmp_path):
+        manager = self._manager(tmp_path)
+        auth_time = int(time.time()) - 3600
+        token, refresh_token = manager.refresh_tokens(manager.generate_refresh_token(USER, auth_time))
+        for issued in (token, refresh_token):
+            assert jwt.decode(issued, options={'verify_signature': False})['auth_time'] == auth_time
+
+    def test_session_lifetime_is_bounded(self, tmp_path):
+        manager = self._manager(tmp_path)
+        manager.max_session_days = 30
+        started = int(time.time()) - 30 * 86400 + 60
+        refresh_token = manager.generate_refresh_token(USER, started)
+        payload = jwt.decode(refresh_token, options={'verify_signature': False})
+        assert payload['exp'] <= started + 30 * 86400
+
+        assert manager.refresh_tokens(refresh_token) is not None
+
+        # A refresh token that is itself still valid, from a session past the limit
+        manager.max_session_days = 60
+        expired = manager.generate_refresh_token(USER, started - 120)
+        manager.max_session_days = 30
+        assert manager.refresh_tokens(expired) is None
+
+    def test_refresh_token_is_usable_once(self, tmp_path):
+        manager = self._manager(tmp_path)
+        refresh_token = manager.generate_refresh_token(USER)
+        _, new_refresh_token = manager.refresh_tokens(refresh_token)
+        assert manager.refresh_tokens(refresh_token) is None
+        assert manager.refresh_tokens(new_refresh_token) is not None
+
+    def test_rotation_holds_across_processes(self, tmp_path):
+        first, second = self._manager(tmp_path), self._manager(tmp_path)
+        refresh_token = first.generate_refresh_token(USER)
+        assert first.refresh_tokens(refresh_token) is not None
+        assert second.refresh_tokens(refresh_token) is None
+
+    def test_token_types_are_not_interchangeable(self, tmp_path):
+        manager = self._manager(tmp_path)
+        assert manager.verify_token(manager.generate_refresh_token(USER)) is None
+        assert manager.refresh_tokens(manager.generate_token(USER)) is None
+
+    def test_access_tokens_are_short_lived(self, tmp_path):
+        manager = self._manager(tmp_path)
+        payload = jwt.decode(manager.generate_token(USER), options={'verify_signature': False})
+        assert payload['exp'] - payload['iat'] == manager.access_token_minutes * 60
+
+    def test_expired_refresh_token_is_rejected(self, tmp_path):
+        manager = self._manager(tmp_path)
+        manager.refresh_token_days = -1
+        assert manager.refresh_tokens(manager.generate_refresh_token(USER)) is None
+
+    def test_revoked_refresh_token_cannot_be_used(self, tmp_path):
+        manager = self._manager(tmp_path)
+        refresh_token = manager.generate_refresh_token(USER)
+        assert manager.revoke_refresh_token(refresh_token)
+        assert manager.refresh_tokens(refresh_token) is None
@@ -0,0 +1,91 @@
+"""
+Unit tests for unit-of-work transactions
+"""
+from datetime import date
+from decimal import Decimal
+from unittest.mock import Mock, patch
+import pytest
+from database import budget_query, database_connection, notification_query
+from database.query_cache import QueryCache
+from database.unit_of_work import TransactionAborted, unit_of_work
+from utils.budget_alerts import _create_budget_alerts, crossed_threshold
+
+@pytest.fixture
+def pooled_connection():
+    connection = Mock()
+    with patch.object(database_connection, 'checkout_connection', return_value=connection), \
+            patch.object(database_connection, 'release_connection') as release:
+        yield connection, release
+
+class TestUnitOfWork:
+    """Test cases for unit_of_work"""
+
+    def test_query_functions_share_one_connection_and_commit(self, pooled_connection):
+        connection, release = pooled_connection
+        with unit_of_work():
+            first = database_connection.get_connection()
+            first.cursor().execute("INSERT INTO expense VALUES (%s)", (1,))
+            first.commit()
+            first.close()
+            second = database_connection.get_connection()
+            second.cursor().execute("INSERT INTO notification VALUES (%s)", (1,))
+            second.commit()
+
+        assert connection.cursor.call_count == 2
+        connection.commit.assert_called_once()
+        connection.rollback.assert_not_called()
+        release.assert_called_once_with(connection)
+
+    def test_rollback_inside_unit_aborts_everything(self, pooled_connection):
+        connection, release = pooled_connection
+        with pytest.raises(TransactionAborted):
+            with unit_of_work():
+                database_connection.get_connection().commit()
+                database_connection.get_connection().rollback()
+
+        connection.commit.assert_not_called()
+        connection.rollback.assert_called_once()
+        release.assert_called_once_with(connection)
+
+    def test_nested_unit_joins_outer(self, pooled_connection):
+        connection, _ = pooled_connection
+        with unit_of_work() as outer:
+            with unit_of_work() as inner:
+                assert inner is outer
+        connection.commit.assert_called_once()
+
+    def test_cache_invalidation_waits_for_commit(self, pooled_connection):
+        cache = QueryCache()
+        cache.set('totals', {}, [('expense', 1)])
+        with unit_of_work():
+            cache.invalidate(('expense', 1))
+            assert cache.get('totals') == (True, {})
+        assert cache.get('totals') == (False, None)
+
+class TestBudgetAlerts:
+    """Test cases for alert threshold crossing"""
+
+    def test_only_crossing_a_threshold_alerts(self):
+        assert crossed_threshold(75, 85)
+        assert crossed_threshold(95, 100)
+        assert not crossed_threshold(85, 95)
+        assert not crossed_threshold(105, 120)
+
+    def test_covering_budgets_are_read_in_one_query(self):
+        connection = Mock()
+        cursor = connection.cursor.return_value
+        cursor.fetchall.return_value = [
+            {'id': 1, 'amount': Decimal('100'), 'category': 'Food', 'start_date': date(2024, 1, 1),
+             'end_date': date(2024, 1, 31), 'user_id': 7, 'total_spent': Decimal('85')},
+            {'id': 2, 'amount': Decimal('1000'), 'category': 'Food', 'start_date': date(2024, 1, 1),
+             'end_date': date(2024, 12, 31), 'user_id': 7, 'total_spent': Decimal('400')}
+        ]
+        expense = {'user_id': 7, 'category': 'Food', 'date': date(2024, 1, 15), 'amount': 20}
+        with patch.object(budget_query, 'get_connection', return_value=connection), \
+                patch.object(budget_query, 'release_connection'), \
+                patch.object(notification_query, 'create_budget_alert') as create_alert:
+            alerted = _create_budget_alerts(expense)
+
+        assert cursor.execute.call_count == 1
+        assert alerted == [1]
+        create_alert.assert_called_once_with(1, 7, 85.0, 'Food')
@@ -0,0 +1,140 @@
+"""
+Unit tests for the user profile cache
+"""
+import hashlib
+import time
+from unittest.mock import patch
+import pytest
+from database import user_query
+from database.unit_of_work import unit_of_work
+from database.user_cache import PROFILE_FIELDS, UserProfileCache
+from model.user import user
+from utils.authentication import AuthenticationManager
+from utils.password_hasher import PasswordHasher
+
+PROFILE = {'user_id': 3, 'username': 'bob', 'email': 'bob@example.com', 'phone_number': '',
+           'first_name': 'Bob', 'last_name': 'B', 'role': 'user'}
+
+def _row(profile):
+    return tuple(profile[name] for name in PROFILE_FIELDS)
+
+@pytest.fixture
+def profiles():
+    cache = UserProfileCache()
+    with patch('database.user_query.user_profiles', cache), patch('utils.authentication.user_profiles', cache):
+        yield cache
+
+@pytest.fixture
+def database():
+    with patch('database.user_query.get_connection') as mock_get_connection, \
+            patch('database.user_query.release_connection'):
+        yield mock_get_connection.return_value.cursor.return_value
+
+class TestUserProfileCache:
+    """Test cases for UserProfileCache"""
+
+    def test_get_returns_copies(self):
+        cache = UserProfileCache()
+        cache.set(3, PROFILE)
+        cache.get(3)['role'] = 'admin'
+        assert cache.get(3)['role'] == 'user'
+        assert cache.stats()['hits'] == 2
+
+    def test_entries_expire(self):
+        cache = UserProfileCache(ttl_seconds=0.01)
+        cache.set(3, PROFILE)
+        time.sleep(0.02)
+        assert cache.get(3) is None
+
+    def test_bounded_lru(self):
+        cache = UserProfileCache(max_entries=2)
+        for user_id in (1, 2):
+            cache.set(user_id, dict(PROFILE, user_id=user_id))
+        cache.get(1)
+        cache.set(3, PROFILE)
+        assert cache.get(2) is None and cache.get(1) is not None
+
+    def test_fill_started_before_invalidation_is_dropped(self):
+        cache = UserProfileCache()
+        generation = cache.generation()
+        cache.invalidate(3)
+        cache.set(3, PROFILE, generation)
+        assert cache.get(3) is None
+
+    def test_invalidation_waits_for_commit(self):
+        cache = UserProfileCache()
+        cache.set(3, PROFILE)
+        with patch('database.database_connection.checkout_connection'), \
+                patch('database.database_connection.release_connection'):
+            with unit_of_work():
+                cache.invalidate(3)
+                assert cache.get(3) is not None
+        assert cache.get(3) is None
+
+class TestReadThrough:
+    """Test cases for get_user_profile and the user writes"""
+
+    def test_miss_reads_profile_columns_once(self, profiles, database):
+        database.fetchone.return_value = _row(PROFILE)
+
+        assert user_query.get_user_profile(3) == PROFILE
+        assert user_query.get_user_profile(3) == PROFILE
+
+        database.execute.assert_called_once()
+        query = database.execute.call_args[0][0]
+        assert 'password' not in query
+
+    def test_unknown_user_is_not_cached(self, profiles, database):
+        database.fetchone.return_value = None
+        assert user_query.get_user_profile(9) is None
+        assert profiles.stats()['entries'] == 0
+
+    def test_update_and_delete_invalidate(self, profiles, database):
+        profiles.set(3, PROFILE)
+        record = user(3, 'bob', 'hash', 'new@example.com', '', 'Bob', 'B', 'user')
+        assert user_query.update_user(record)
+        assert profiles.get(3) is None
+
+        profiles.set(3, PROFILE)
+        assert user_query.delete_user(3)
+        assert profiles.get(3) is None
+
+    def test_failed_update_keeps_profile(self, profiles, database):
+        profiles.set(3, PROFILE)
+        database.execute.side_effect = ValueError('boom')
+        assert not user_query.update_user(user(3, 'bob', 'hash', 'b@example.com', '', 'Bob', 'B', 'user'))
+        assert profiles.get(3) == PROFILE
+
+class TestAuthentication:
+    """Test cases for login filling the cache and role checks reading it"""
+
+    @patch('utils.authentication.release_connection')
+    @patch('utils.authentication.get_connection')
+    def test_login_fills_the_cache(self, mock_get_connection, mock_release, profiles, database):
+        password_hash = hashlib.sha256(b's3cret-pass').hexdigest()
+        cursor = mock_get_connection.return_value.cursor.return_value
+        cursor.fetchone.return_value = dict(PROFILE, password=password_hash)
+
+        with patch('utils.authentication.password_hasher', PasswordHasher(rounds=4, workers=1)):
+            assert AuthenticationManager().authenticate_user('bob', 's3cret-pass') == PROFILE
+
+        assert user_query.get_user_profile(3) == PROFILE
+        database.execute.assert_not_called()
+
+    def test_authorize_reads_role_from_memory(self, profiles, database):
+        profiles.set(3, dict(PROFILE, role='admin'))
+        manager = AuthenticationManager()
+        assert manager.authorize({'user_id': 3, 'role': 'user'}, 'admin')
+        database.execute.assert_not_called()
+
+    def test_role_change_applies_before_token_expiry(self, profiles, database):
+        manager = AuthenticationManager()
+        profiles.set(3, dict(PROFILE, role='admin'))
+        profiles.invalidate(3)
+        database.fetchone.return_value = _row(PROFILE)
+        assert not manager.authorize({'user_id': 3, 'role': 'admin'}, 'admin')
+        assert manager.authorize({'user_id': 3, 'role': 'admin'}, 'user')
+
+    def test_deleted_user_is_not_authorized(self, profiles, database):
+        database.fetchone.return_value = None
+        assert not AuthenticationManager().authorize({'user_id': 3, 'role': 'user'})
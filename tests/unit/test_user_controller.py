@@ -0,0 +1,65 @@
+"""
+Unit tests for UserController reads through the user profile cache
+"""
+import json
+from unittest.mock import Mock, patch
+import pytest
+from controller.user_controller import UserController
+from database.user_cache import PROFILE_FIELDS, UserProfileCache
+from utils.authentication import auth_manager
+
+ALICE = {'user_id': 1, 'username': 'alice', 'email': 'alice@example.com', 'phone_number': '',
+         'first_name': 'Alice', 'last_name': 'A', 'role': 'user'}
+ADMIN = dict(ALICE, user_id=2, username='root', role='admin')
+
+def _request(method, path, caller):
+    handler = Mock()
+    handler.path = path
+    handler.headers = {'Authorization': f"Bearer {auth_manager.generate_token(caller)}"}
+    response = getattr(UserController(handler, {}), method)()
+    return response['status_code'], json.loads(response['body'])
+
+@pytest.fixture
+def profiles():
+    cache = UserProfileCache()
+    with patch('database.user_query.user_profiles', cache), patch('utils.authentication.user_profiles', cache):
+        yield cache
+
+@pytest.fixture
+def database():
+    with patch('database.user_query.get_connection') as mock_get_connection, \
+            patch('database.user_query.release_connection'):
+        yield mock_get_connection.return_value.cursor.return_value
+
+class TestUserController:
+    """Test cases for GET and DELETE /users/{id}"""
+
+    def test_get_own_profile_from_memory(self, profiles, database):
+        profiles.set(1, ALICE)
+        status, body = _request('handle_get', '/users/1', ALICE)
+        assert status == 200 and body == ALICE
+        database.execute.assert_not_called()
+
+    def test_profile_is_read_through_once(self, profiles, database):
+        database.fetchone.return_value = tuple(ALICE[name] for name in PROFILE_FIELDS)
+        assert _request('handle_get', '/users/1', ALICE) == (200, ALICE)
+        assert _request('handle_get', '/users/1', ALICE) == (200, ALICE)
+        database.execute.assert_called_once()
+
+    def test_other_users_need_admin(self, profiles, database):
+        profiles.set(1, ALICE)
+        profiles.set(2, ADMIN)
+        assert _request('handle_get', '/users/2', ALICE)[0] == 404
+        assert _request('handle_get', '/users/1', ADMIN) == (200, ALICE)
+
+    def test_demoted_admin_loses_access_before_token_expiry(self, profiles, database):
+        profiles.set(1, ALICE)
+        profiles.set(2, dict(ADMIN, role='user'))
+        assert _request('handle_get', '/users/1', ADMIN)[0] == 404
+        assert _request('handle_get', '/users', ADMIN)[0] == 403
+
+    def test_delete_drops_the_profile(self, profiles, database):
+        profiles.set(1, ALICE)
+        status, _ = _request('handle_delete', '/users/1', ALICE)
+        assert status == 200
+        assert profiles.get(1) is None
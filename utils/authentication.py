@@ -2,94 +2,302 @@ import jwt
 import hashlib
 import os
 import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from database.database_connection import get_connection, release_connection
+from database.user_cache import profile_of, user_profiles
+from database.user_query import get_user_profile
+from utils.password_hasher import password_hasher
+from utils.token_revocation import RevocationStore
 
 logger = logging.getLogger(__name__)
 
+# Values of the 'type' claim
+ACCESS_TOKEN = 'access'
+REFRESH_TOKEN = 'refresh'
+
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by SHA-256 of the token.
+
+    An entry expires at the token's own exp claim, so a cached token is
+    never accepted after jwt.decode would have rejected it. The raw token
+    is not kept in memory.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[bytes, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """A copy of the cached payload, or None if absent or expired"""
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def set(self, token: str, payload: Dict[str, Any]):
+        """Cache a verified payload until its exp claim"""
+        expires_at = payload.get('exp')
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
 class AuthenticationManager:
     """Handles JWT token generation and validation"""
     
     def __init__(self):
         self.secret_key = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
         self.algorithm = 'HS256'
-        self.token_expiry_hours = int(os.getenv('TOKEN_EXPIRY_HOURS', '24'))
+        self.access_token_minutes = int(os.getenv('ACCESS_TOKEN_MINUTES', '15'))
+        self.refresh_token_days = int(os.getenv('REFRESH_TOKEN_DAYS', '7'))
+        self.max_session_days = int(os.getenv('MAX_SESSION_DAYS', '30'))
+        self.token_cache = TokenCache(int(os.getenv('TOKEN_CACHE_SIZE', '10000')))
+        self.revocations = RevocationStore()
     
     def hash_password(self, password: str) -> str:
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Hash password with bcrypt on the password hashing pool"""
+        return password_hasher.hash(password)
     
     def verify_password(self, password: str, hashed_password: str) -> bool:
-        """Verify password against hash"""
-        return self.hash_password(password) == hashed_password
+        """Verify password against a bcrypt or legacy SHA-256 hash"""
+        return password_hasher.verify(password, hashed_password)
     
     def authenticate_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
-        """Authenticate user credentials"""
+        """Authenticate user credentials.
+        
+        The user row is looked up by username and the connection released
+        before the (slow) password check. A legacy or outdated hash is
+        replaced in the background after a successful login, and the
+        user's profile is cached in user_profiles.
+        """
+        generation = user_profiles.generation()
+        result = self._get_login_row(username)
+        if result is False:
+            return None
+        
+        stored_hash = result['password'] if result else None
+        if not password_hasher.verify(password, stored_hash) or not result:
+            return None
+        
+        if password_hasher.needs_rehash(stored_hash):
+            user_id = result['user_id']
+            password_hasher.hash_async(password).add_done_callback(
+                lambda future: self._upgrade_password_hash(user_id, future.result(), stored_hash))
+        
+        profile = profile_of(result)
+        user_profiles.set(profile['user_id'], profile, generation)
+        return profile
+    
+    def _get_login_row(self, username: str):
+        """The user row for username, None if there is none, False on error"""
         connection = get_connection()
         if connection is None:
-            return None
+            return False
         
+        cursor = None
         try:
             cursor = connection.cursor(dictionary=True)
-            hashed_password = self.hash_password(password)
-            
-            # Secure: Verify credentials in database query
-            query = "SELECT user_id, username, email, phone_number, first_name, last_name, role FROM user WHERE username = %s AND password = %s"
-            cursor.execute(query, (username, hashed_password))
-            result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'user_id': result['user_id'],
-                    'username': result['username'],
-                    'email': result['email'],
-                    'phone_number': result['phone_number'],
-                    'first_name': result['first_name'],
-                    'last_name': result['last_name'],
-                    'role': result['role']
-                }
-            return None
+            query = "SELECT user_id, username, password, email, phone_number, first_name, last_name, role FROM user WHERE username = %s"
+            cursor.execute(query, (username,))
+            return cursor.fetchone()
         except Exception as e:
             logger.error(f"Error authenticating user: {e}")
-            return None
+            return False
         finally:
-            cursor.close()
+            if cursor is not None:
+                cursor.close()
             release_connection(connection)
     
-    def generate_token(self, user_data: Dict[str, Any]) -> str:
-        """Generate JWT token"""
+    def _upgrade_password_hash(self, user_id: int, new_hash: str, old_hash: str) -> bool:
+        """Replace old_hash with new_hash, unless the password changed meanwhile"""
+        connection = get_connection()
+        if connection is None:
+            return False
+        
+        cursor = None
         try:
+            cursor = connection.cursor()
+            query = "UPDATE user SET password = %s WHERE user_id = %s AND password = %s"
+            cursor.execute(query, (new_hash, user_id, old_hash))
+            connection.commit()
+            if cursor.rowcount:
+                logger.info(f"Upgraded password hash for user {user_id}")
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error upgrading password hash: {e}")
+            connection.rollback()
+            return False
+        finally:
+            if cursor is not None:
+                cursor.close()
+            release_connection(connection)
+    
+    def generate_token(self, user_data: Dict[str, Any], auth_time: Optional[int] = None) -> str:
+        """Generate a short-lived (ACCESS_TOKEN_MINUTES) access token.
+
+        auth_time is when the user logged in (epoch seconds, default now).
+        """
+        token = self._encode(user_data, ACCESS_TOKEN, timedelta(minutes=self.access_token_minutes), auth_time)
+        logger.info(f"Token generated for user: {user_data['username']}")
+        return token
+    
+    def generate_refresh_token(self, user_data: Dict[str, Any], auth_time: Optional[int] = None) -> str:
+        """Generate a refresh token, valid for REFRESH_TOKEN_DAYS and usable once.
+
+        It never outlives the session: MAX_SESSION_DAYS after auth_time.
+        """
+        auth_time = int(time.time()) if auth_time is None else auth_time
+        session_left = auth_time + self.max_session_days * 86400 - time.time()
+        lifetime = min(timedelta(days=self.refresh_token_days), timedelta(seconds=session_left))
+        return self._encode(user_data, REFRESH_TOKEN, lifetime, auth_time)
+    
+    def refresh_tokens(self, refresh_token: str) -> Optional[Tuple[str, str]]:
+        """Exchange a refresh token for a new (access token, refresh token) pair.
+
+        The presented refresh token is revoked (rotation), so it cannot be
+        exchanged twice. The claims come from the user's current profile
+        (see authorize), so a deleted user cannot refresh and a role change
+        reaches the new tokens. The login time is carried over, and no
+        refresh is accepted more than MAX_SESSION_DAYS after it.
+        """
+        try:
+            payload = jwt.decode(refresh_token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.ExpiredSignatureError:
+            logger.warning("Refresh token has expired")
+            return None
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Invalid refresh token: {e}")
+            return None
+        if payload.get('type') != REFRESH_TOKEN or not payload.get('jti'):
+            logger.warning("Token presented for refresh is not a refresh token")
+            return None
+        # Tokens issued before auth_time was added started their session at iat
+        auth_time = payload.get('auth_time', payload['iat'])
+        if time.time() >= auth_time + self.max_session_days * 86400:
+            logger.warning(f"Session has expired for user: {payload['username']}")
+            return None
+        # Looked up before rotating, so a failed lookup leaves the token usable
+        profile = get_user_profile(payload['user_id'])
+        if profile is None:
+            logger.warning(f"Refresh token presented for unknown user: {payload['user_id']}")
+            return None
+        if not self.revocations.revoke(payload['jti'], payload['exp']):
+            logger.warning(f"Reused refresh token for user: {payload['username']}")
+            return None
+        return self.generate_token(profile, auth_time), self.generate_refresh_token(profile, auth_time)
+    
+    def _encode(self, user_data: Dict[str, Any], token_type: str, lifetime: timedelta,
+                auth_time: Optional[int] = None) -> str:
+        try:
+            now = datetime.utcnow()
             payload = {
                 'user_id': user_data['user_id'],
                 'username': user_data['username'],
                 'email': user_data['email'],
                 'role': user_data.get('role', 'user'),
-                'exp': datetime.utcnow() + timedelta(hours=self.token_expiry_hours),
-                'iat': datetime.utcnow()
+                'type': token_type,
+                'exp': now + lifetime,
+                'iat': now,
+                'auth_time': int(time.time()) if auth_time is None else auth_time,
+                'jti': uuid.uuid4().hex
             }
-            token = jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
-            logger.info(f"Token generated for user: {user_data['username']}")
-            return token
+            return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
         except Exception as e:
             logger.error(f"Error generating token: {e}")
             raise
     
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """Verify JWT token and return payload"""
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            logger.info(f"Token verified for user: {payload['username']}")
-            return payload
-        except jwt.ExpiredSignatureError:
-            logger.warning("Token has expired")
-            return None
-        except jwt.InvalidTokenError as e:
-            logger.warning(f"Invalid token: {e}")
+        """Verify JWT token and return payload.
+
+        Tokens verified before are answered from token_cache without
+        checking the signature again. Revoked tokens are rejected from
+        memory (see utils.token_revocation), and refresh tokens are only
+        accepted by refresh_tokens().
+        """
+        payload = self.token_cache.get(token)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            except jwt.ExpiredSignatureError:
+                logger.warning("Token has expired")
+                return None
+            except jwt.InvalidTokenError as e:
+                logger.warning(f"Invalid token: {e}")
+                return None
+            except Exception as e:
+                logger.error(f"Error verifying token: {e}")
+                return None
+            self.token_cache.set(token, payload)
+            logger.debug(f"Token verified for user: {payload['username']}")
+        if payload.get('type', ACCESS_TOKEN) != ACCESS_TOKEN:
+            logger.warning("Refresh token presented as an access token")
             return None
-        except Exception as e:
-            logger.error(f"Error verifying token: {e}")
+        if self.revocations.is_revoked(payload.get('jti')):
+            logger.debug(f"Revoked token presented for user: {payload.get('username')}")
             return None
+        return payload
+    
+    def revoke_token(self, token: str) -> bool:
+        """Revoke a valid token until it expires; False if it is invalid or has no jti"""
+        payload = self.verify_token(token)
+        if not payload or not payload.get('jti'):
+            return False
+        self.revocations.revoke(payload['jti'], payload['exp'])
+        logger.info(f"Token revoked for user: {payload['username']}")
+        return True
+    
+    def revoke_refresh_token(self, refresh_token: str) -> bool:
+        """Revoke a valid refresh token; False if it is invalid or already used"""
+        try:
+            payload = jwt.decode(refresh_token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Invalid refresh token: {e}")
+            return False
+        if payload.get('type') != REFRESH_TOKEN or not payload.get('jti'):
+            return False
+        return self.revocations.revoke(payload['jti'], payload['exp'])
     
     def extract_token_from_header(self, authorization_header: str) -> Optional[str]:
         """Extract token from Authorization header"""
@@ -103,11 +311,18 @@ class AuthenticationManager:
         return parts[1]
     
     def authorize(self, user_data: Dict[str, Any], required_role: str = 'user') -> bool:
-        """Check if user has required role"""
-        if not user_data:
+        """Check if user has required role.
+
+        The role comes from the user's cached profile rather than the token,
+        so a role change or deletion applies before the token expires.
+        """
+        if not user_data or 'user_id' not in user_data:
             return False
         
-        user_role = user_data.get('role', 'user')
+        profile = get_user_profile(user_data['user_id'])
+        if profile is None:
+            return False
+        user_role = profile['role']
         
         if required_role == 'admin':
             return user_role == 'admin'
@@ -117,4 +332,28 @@ class AuthenticationManager:
         return False
 
 # Global authentication manager instance
-auth_manager = AuthenticationManager()
\ No newline at end of file
+auth_manager = AuthenticationManager()
+
+class TokenValidationMiddleware:
+    """Middleware to validate JWT tokens"""
+    
+    @staticmethod
+    def validate_request(handler) -> tuple[bool, Dict[str, Any]]:
+        """Validate request token and return (is_valid, user_data)"""
+        try:
+            authorization_header = handler.headers.get('Authorization')
+            if not authorization_header:
+                return False, {'message': 'Missing Authorization header'}
+
+            token = auth_manager.extract_token_from_header(authorization_header)
+            if not token:
+                return False, {'message': 'Invalid token format'}
+
+            user_data = auth_manager.verify_token(token)
+            if not user_data:
+                return False, {'message': 'Invalid or expired token'}
+
+            return True, user_data
+        except Exception as e:
+            logger.error(f"Error validating token: {e}")
+            return False, {'message': 'Token validation failed'}
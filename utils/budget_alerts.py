@@ -0,0 +1,53 @@
+"""
+Recording expenses together with the budget alerts they trigger
+"""
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from database import budget_query, expense_query, notification_query
+from database.unit_of_work import TransactionAborted, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Percent-used levels that produce a notification when an expense crosses them
+ALERT_THRESHOLDS = (80, 100)
+
+def crossed_threshold(previous_percentage: float, percentage: float) -> bool:
+    """True if spending moved from below to at or above an alert threshold"""
+    return any(previous_percentage < threshold <= percentage for threshold in ALERT_THRESHOLDS)
+
+def record_expense(expense_data: Dict[str, Any]) -> bool:
+    """Insert an expense and any budget alerts it triggers in one transaction.
+
+    The expense row, its rollup delta and a budget_warning or
+    budget_exceeded notification for every covering budget it pushes past
+    80% or 100% commit together, or not at all.
+    """
+    try:
+        with unit_of_work():
+            if not expense_query.create_expense(expense_data):
+                return False
+            _create_budget_alerts(expense_data)
+        return True
+    except TransactionAborted as e:
+        logger.error(f"Expense for user {expense_data.get('user_id')} not recorded: {e}")
+        return False
+
+def _create_budget_alerts(expense_data: Dict[str, Any]) -> List[int]:
+    """Create alerts for budgets the new expense pushed over a threshold"""
+    amount = Decimal(str(expense_data['amount']))
+    alerted = []
+    # Every covering budget's spending, including this expense, in one query
+    budgets = budget_query.get_covering_budget_spending(expense_data['user_id'], expense_data['category'], expense_data['date'])
+    for spending in budgets:
+        if not spending['budget_amount']:
+            continue
+
+        percentage = float(spending['percentage_used'])
+        previous_percentage = float((spending['total_spent'] - amount) / spending['budget_amount'] * 100)
+        if crossed_threshold(previous_percentage, percentage):
+            notification_query.create_budget_alert(spending['budget_id'], expense_data['user_id'], percentage,
+                                                   spending['category'])
+            alerted.append(spending['budget_id'])
+    return alerted
@@ -1,8 +1,9 @@
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 from collections import defaultdict, Counter
-from database.database_connection import get_connection, release_connection
+from database.rollup_query import get_expense_category_totals
 
 logger = logging.getLogger(__name__)
 
@@ -333,26 +334,9 @@ class ExpenseCategorizer:
     def analyze_user_patterns(self, user_id: int, days: int = 30) -> Dict[str, Any]:
         """Analyze user's spending patterns and provide insights"""
         try:
-            connection = get_connection()
-            if not connection:
-                return {}
-            
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get recent expenses with categories
+            # Per-category totals, largest first
             start_date = datetime.now() - timedelta(days=days)
-            query = """
-            SELECT category, COUNT(*) as count, SUM(amount) as total, AVG(amount) as avg_amount
-            FROM expense 
-            WHERE user_id = %s AND date >= %s
-            GROUP BY category
-            ORDER BY total DESC
-            """
-            cursor.execute(query, (user_id, start_date.date()))
-            results = cursor.fetchall()
-            
-            cursor.close()
-            release_connection(connection)
+            results = get_expense_category_totals(user_id, start_date.date())
             
             if not results:
                 return {'message': 'No spending data available'}
@@ -0,0 +1,300 @@
+"""
+Columnar in-memory view of a user's expenses
+
+An ExpenseFrame holds one column per field instead of one dict per row:
+amounts as float64, dates as int32 day numbers (date.toordinal()), and
+categories and merchants (the raw description) as int32 codes into a
+per-frame Dictionary. A year of history is a few dozen bytes per row, and
+the analytics engines share one set of filters, group-bys and rolling
+windows instead of each walking lists of dicts.
+
+When NumPy is installed the operations run vectorized over zero-copy
+views of the columns; otherwise they fall back to plain loops over the
+same arrays. Columns may be array.array, memoryview or ndarray, so a
+frame can sit directly on a memory-mapped file.
+"""
+from array import array
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized paths only
+    np = None
+
+# Typecodes of the amount, day, category and merchant columns
+COLUMN_TYPES = ('d', 'i', 'i', 'i')
+
+def day_number(value: Any) -> int:
+    """Day number of a date, datetime or 'YYYY-MM-DD' string"""
+    if not isinstance(value, date):
+        value = datetime.strptime(str(value)[:10], '%Y-%m-%d')
+    return value.toordinal()
+
+class Dictionary:
+    """Value <-> code mapping for a dictionary-encoded column"""
+    __slots__ = ('values', '_codes')
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+def _view(column):
+    """Zero-copy NumPy view of a column"""
+    return np.asarray(column)
+
+class ExpenseFrame:
+    """Column-oriented expenses: amounts, day numbers, category and merchant codes"""
+    __slots__ = ('amounts', 'days', 'category_codes', 'merchant_codes', 'categories', 'merchants')
+
+    def __init__(self, amounts: Sequence[float], days: Sequence[int], category_codes: Sequence[int],
+                 merchant_codes: Sequence[int], categories: Dictionary, merchants: Dictionary):
+        self.amounts = amounts
+        self.days = days
+        self.category_codes = category_codes
+        self.merchant_codes = merchant_codes
+        self.categories = categories
+        self.merchants = merchants
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]], categories: Optional[Dictionary] = None,
+                  merchants: Optional[Dictionary] = None) -> 'ExpenseFrame':
+        """Build a frame from (date, amount, category, description) rows"""
+        categories = categories if categories is not None else Dictionary()
+        merchants = merchants if merchants is not None else Dictionary()
+        amounts, days, category_codes, merchant_codes = (array(typecode) for typecode in COLUMN_TYPES)
+        for row_date, amount, category, description in rows:
+            amounts.append(float(amount))
+            days.append(day_number(row_date))
+            category_codes.append(categories.encode(category))
+            merchant_codes.append(merchants.encode(description or ''))
+        return cls(amounts, days, category_codes, merchant_codes, categories, merchants)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def _columns(self) -> tuple:
+        return self.amounts, self.days, self.category_codes, self.merchant_codes
+
+    def _with(self, columns: Iterable[Sequence]) -> 'ExpenseFrame':
+        return ExpenseFrame(*columns, self.categories, self.merchants)
+
+    # Selection
+
+    def take(self, indices: Sequence[int]) -> 'ExpenseFrame':
+        """Rows at indices, in that order; dictionaries are shared"""
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.intp)
+            return self._with(_view(column)[indices] for column in self._columns())
+        return self._with(array(typecode, [column[index] for index in indices])
+                          for typecode, column in zip(COLUMN_TYPES, self._columns()))
+
+    def filter(self, mask: Sequence[bool]) -> 'ExpenseFrame':
+        """Rows where mask is true"""
+        if np is not None:
+            mask = np.asarray(mask, dtype=bool)
+            return self._with(_view(column)[mask] for column in self._columns())
+        return self.take([index for index, keep in enumerate(mask) if keep])
+
+    def between(self, start: Any = None, end: Any = None) -> Sequence[bool]:
+        """Mask of rows dated within [start, end]; either bound may be None"""
+        low = day_number(start) if start is not None else None
+        high = day_number(end) if end is not None else None
+        if np is not None:
+            days = _view(self.days)
+            mask = np.ones(len(days), dtype=bool)
+            if low is not None:
+                mask &= days >= low
+            if high is not None:
+                mask &= days <= high
+            return mask
+        return [(low is None or day >= low) and (high is None or day <= high) for day in self.days]
+
+    def category_is(self, category: str) -> Sequence[bool]:
+        """Mask of rows in category"""
+        code = self.categories.code(category)
+        if np is not None:
+            return _view(self.category_codes) == (-1 if code is None else code)
+        return [row_code == code for row_code in self.category_codes]
+
+    # Grouping
+
+    def _group_codes(self, by: str, key: Optional[Callable[[str], Any]]) -> Tuple[Sequence[int], List[Any]]:
+        """Per-row group codes and the label of each group.
+
+        key maps dictionary values to labels (several values may share one);
+        it runs once per distinct value rather than once per row.
+        """
+        dictionary = self.categories if by == 'category' else self.merchants
+        codes = self.category_codes if by == 'category' else self.merchant_codes
+        if key is None:
+            return codes, list(dictionary.values)
+        labels = Dictionary()
+        label_of_code = [labels.encode(key(value)) for value in dictionary.values]
+        if np is not None:
+            return np.asarray(label_of_code, dtype=np.intc)[_view(codes)], labels.values
+        return array('i', [label_of_code[code] for code in codes]), labels.values
+
+    def group_indices(self, by: str = 'merchant', key: Optional[Callable[[str], Any]] = None) -> Dict[Any, Sequence[int]]:
+        """Row indices per group label, each in row order"""
+        codes, labels = self._group_codes(by, key)
+        if np is not None:
+            codes = _view(codes)
+            order = np.argsort(codes, kind='stable')
+            present, starts = np.unique(codes[order], return_index=True)
+            return {labels[code]: group for code, group in zip(present.tolist(), np.split(order, starts[1:]))}
+        groups: Dict[int, List[int]] = {}
+        for index, code in enumerate(codes):
+            groups.setdefault(code, []).append(index)
+        return {labels[code]: group for code, group in groups.items()}
+
+    def groupby(self, by: str = 'merchant', key: Optional[Callable[[str], Any]] = None) -> Iterator[Tuple[Any, 'ExpenseFrame']]:
+        """(label, sub-frame) per group"""
+        for label, indices in self.group_indices(by, key).items():
+            yield label, self.take(indices)
+
+    def group_sums(self, by: str = 'category', key: Optional[Callable[[str], Any]] = None) -> Dict[Any, Tuple[float, int]]:
+        """(total amount, row count) per group label"""
+        codes, labels = self._group_codes(by, key)
+        if np is not None:
+            codes = _view(codes)
+            totals = np.bincount(codes, weights=_view(self.amounts), minlength=len(labels))
+            counts = np.bincount(codes, minlength=len(labels))
+            return {labels[code]: (float(totals[code]), int(counts[code])) for code in np.flatnonzero(counts).tolist()}
+        sums: Dict[int, List] = {}
+        for code, amount in zip(codes, self.amounts):
+            entry = sums.setdefault(code, [0.0, 0])
+            entry[0] += amount
+            entry[1] += 1
+        return {labels[code]: (total, count) for code, (total, count) in sums.items()}
+
+    def category_totals(self) -> List[Dict[str, Any]]:
+        """Per-category total, count and average, largest total first"""
+        rows = [
+            {'category': category, 'total': round(total, 2), 'count': count, 'avg_amount': round(total / count, 2)}
+            for category, (total, count) in self.group_sums('category').items()
+        ]
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    # Windows
+
+    def daily_totals(self) -> Tuple[Optional[int], Sequence[float]]:
+        """(first day number, spending per consecutive day from it)"""
+        if not len(self):
+            return None, []
+        if np is not None:
+            days = _view(self.days)
+            first = int(days.min())
+            return first, np.bincount(days - first, weights=_view(self.amounts))
+        first = min(self.days)
+        totals = [0.0] * (max(self.days) - first + 1)
+        for day, amount in zip(self.days, self.amounts):
+            totals[day - first] += amount
+        return first, totals
+
+    def rolling_sum(self, window_days: int) -> Tuple[Optional[int], Sequence[float]]:
+        """(first day number, spending over the trailing window_days for each day)"""
+        first, totals = self.daily_totals()
+        if np is not None and first is not None:
+            cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+            starts = np.maximum(np.arange(1, len(totals) + 1) - window_days, 0)
+            return first, cumulative[1:] - cumulative[starts]
+        sums, running = [], 0.0
+        for index, total in enumerate(totals):
+            running += total
+            if index >= window_days:
+                running -= totals[index - window_days]
+            sums.append(running)
+        return first, sums
+
+    # Statistics
+
+    def total(self) -> float:
+        return float(_view(self.amounts).sum()) if np is not None else sum(self.amounts)
+
+    def mean(self) -> float:
+        return self.total() / len(self) if len(self) else 0.0
+
+    def std(self) -> float:
+        """Population standard deviation of the amounts"""
+        if not len(self):
+            return 0.0
+        if np is not None:
+            return float(_view(self.amounts).std())
+        mean = self.mean()
+        return (sum((amount - mean) ** 2 for amount in self.amounts) / len(self)) ** 0.5
+
+    def mode_amount(self) -> float:
+        """Most frequent amount (the first seen on ties)"""
+        return Counter(self.amounts).most_common(1)[0][0] if len(self) else 0.0
+
+    def days_of_month(self) -> List[int]:
+        """Day of month of each row"""
+        month_day = {day: date.fromordinal(day).day for day in set(self._day_list())}
+        return [month_day[day] for day in self._day_list()]
+
+    def intervals(self) -> List[int]:
+        """Days between consecutive charges, in date order"""
+        if np is not None:
+            return np.diff(np.sort(_view(self.days))).tolist()
+        days = sorted(self.days)
+        return [later - earlier for earlier, later in zip(days, days[1:])]
+
+    def first_date(self) -> Optional[date]:
+        return date.fromordinal(min(self._day_list())) if len(self) else None
+
+    def last_date(self) -> Optional[date]:
+        return date.fromordinal(max(self._day_list())) if len(self) else None
+
+    def _day_list(self) -> List[int]:
+        return _view(self.days).tolist() if np is not None else list(self.days)
+
+    def records(self, indices: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Rows as dicts (date as ISO string), for responses"""
+        indices = range(len(self)) if indices is None else indices
+        return [
+            {
+                'date': date.fromordinal(int(self.days[index])).isoformat(),
+                'amount': float(self.amounts[index]),
+                'category': self.categories[int(self.category_codes[index])],
+                'description': self.merchants[int(self.merchant_codes[index])]
+            }
+            for index in indices
+        ]
+
+    def latest(self, count: int) -> List[int]:
+        """Indices of the count most recent rows, newest first"""
+        return sorted(range(len(self)), key=lambda index: self.days[index], reverse=True)[:count]
+
+def load_expense_frame(user_id: int, start_date: Any = None) -> Optional[ExpenseFrame]:
+    """A user's expenses dated on or after start_date as a frame, or None on a database error.
+
+    Reads the memory-mapped analytics cache when it is enabled.
+    """
+    from database.analytics_cache import analytics_cache
+    from database.expense_query import get_expense_rows
+    if analytics_cache.enabled:
+        frame = analytics_cache.load(user_id)
+        if frame is None or start_date is None:
+            return frame
+        return frame.filter(frame.between(start_date))
+    rows = get_expense_rows(user_id, start_date)
+    return None if rows is None else ExpenseFrame.from_rows(rows)
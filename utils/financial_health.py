@@ -1,9 +1,10 @@
+import logging
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-from database.database_connection import get_connection, release_connection
-from database.expense_query import get_all_expenses
-from database.income_query import get_income_summary
-from database.budget_query import get_budgets_by_user
+from database.budget_query import get_budgets_with_spending
+from database.rollup_query import (
+    get_expense_totals, get_expense_monthly_totals, get_income_totals, get_income_monthly_totals
+)
 
 logger = logging.getLogger(__name__)
 
@@ -99,34 +100,8 @@ class FinancialHealthCalculator:
     def _calculate_savings_rate_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
         """Calculate savings rate score (0-100)"""
         try:
-            connection = get_connection()
-            if not connection:
-                return 0
-            
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get total income for the period
-            income_query = """
-            SELECT COALESCE(SUM(amount), 0) as total_income 
-            FROM income 
-            WHERE user_id = %s AND date BETWEEN %s AND %s
-            """
-            cursor.execute(income_query, (user_id, start_date.date(), end_date.date()))
-            income_result = cursor.fetchone()
-            total_income = income_result['total_income'] or 0
-            
-            # Get total expenses for the period
-            expense_query = """
-            SELECT COALESCE(SUM(amount), 0) as total_expenses 
-            FROM expense 
-            WHERE user_id = %s AND date BETWEEN %s AND %s
-            """
-            cursor.execute(expense_query, (user_id, start_date.date(), end_date.date()))
-            expense_result = cursor.fetchone()
-            total_expenses = expense_result['total_expenses'] or 0
-            
-            cursor.close()
-            release_connection(connection)
+            total_income = get_income_totals(user_id, start_date.date(), end_date.date())['total']
+            total_expenses = get_expense_totals(user_id, start_date.date(), end_date.date())['total']
             
             # Calculate savings rate
             if total_income == 0:
@@ -153,7 +128,7 @@ class FinancialHealthCalculator:
     def _calculate_budget_adherence_score(self, user_id: int) -> float:
         """Calculate budget adherence score (0-100)"""
         try:
-            budgets = get_budgets_by_user(user_id)
+            budgets = get_budgets_with_spending(user_id)
             if not budgets:
                 return 50  # Neutral score if no budgets
             
@@ -161,7 +136,7 @@ class FinancialHealthCalculator:
             active_budgets = 0
             
             for budget in budgets:
-                spending_info = get_budget_spending(budget.id)
+                spending_info = budget['spending']
                 if spending_info and 'percentage_used' in spending_info:
                     percentage_used = spending_info['percentage_used']
                     
@@ -185,33 +160,15 @@ class FinancialHealthCalculator:
     def _calculate_income_stability_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
         """Calculate income stability score (0-100)"""
         try:
-            connection = get_connection()
-            if not connection:
-                return 0
-            
-            cursor = connection.cursor(dictionary=True)
-            
             # Get income for last 6 months
             six_months_ago = start_date - timedelta(days=180)
-            query = """
-            SELECT DATE_FORMAT(date, '%Y-%m') as month, SUM(amount) as monthly_income
-            FROM income 
-            WHERE user_id = %s AND date >= %s
-            GROUP BY DATE_FORMAT(date, '%Y-%m')
-            ORDER BY month DESC
-            LIMIT 6
-            """
-            cursor.execute(query, (user_id, six_months_ago.date()))
-            results = cursor.fetchall()
-            
-            cursor.close()
-            release_connection(connection)
+            results = get_income_monthly_totals(user_id, six_months_ago.date())[:6]
             
             if len(results) < 2:
                 return 50  # Not enough data
             
             # Calculate coefficient of variation (lower = more stable)
-            incomes = [row['monthly_income'] for row in results if row['monthly_income'] > 0]
+            incomes = [row['total'] for row in results if row['total'] > 0]
             if not incomes:
                 return 0
             
@@ -241,44 +198,19 @@ class FinancialHealthCalculator:
     def _calculate_expense_control_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
         """Calculate expense control score (0-100)"""
         try:
-            connection = get_connection()
-            if not connection:
-                return 0
-            
-            cursor = connection.cursor(dictionary=True)
-            
             # Get expense trends - compare to previous period
             previous_start = start_date - timedelta(days=30)
             previous_end = start_date - timedelta(days=1)
             
-            # Current period expenses
-            current_query = """
-            SELECT COUNT(*) as transaction_count, AVG(amount) as avg_amount
-            FROM expense 
-            WHERE user_id = %s AND date BETWEEN %s AND %s
-            """
-            cursor.execute(current_query, (user_id, start_date.date(), end_date.date()))
-            current_result = cursor.fetchone()
-            
-            # Previous period expenses
-            previous_query = """
-            SELECT COUNT(*) as transaction_count, AVG(amount) as avg_amount
-            FROM expense 
-            WHERE user_id = %s AND date BETWEEN %s AND %s
-            """
-            cursor.execute(previous_query, (user_id, previous_start.date(), previous_end.date()))
-            previous_result = cursor.fetchone()
+            current_totals = get_expense_totals(user_id, start_date.date(), end_date.date())
+            previous_totals = get_expense_totals(user_id, previous_start.date(), previous_end.date())
             
-            cursor.close()
-            release_connection(connection)
-            
-            if not previous_result or previous_result['avg_amount'] == 0:
+            if not previous_totals['count']:
                 return 70  # Neutral score for new users
             
             # Calculate expense growth
-            current_avg = current_result['avg_amount'] or 0
-            previous_avg = previous_result['avg_amount'] or 0
-            
+            current_avg = current_totals['total'] / current_totals['count'] if current_totals['count'] else 0
+            previous_avg = previous_totals['total'] / previous_totals['count']
             if previous_avg == 0:
                 return 70
             
@@ -305,30 +237,13 @@ class FinancialHealthCalculator:
     def _calculate_emergency_fund_score(self, user_id: int) -> float:
         """Calculate emergency fund score (0-100)"""
         try:
-            connection = get_connection()
-            if not connection:
-                return 0
-            
-            cursor = connection.cursor(dictionary=True)
-            
             # Get last 3 months average monthly expenses
             three_months_ago = datetime.now() - timedelta(days=90)
-            query = """
-            SELECT AVG(monthly_total) as avg_monthly_expenses
-            FROM (
-                SELECT SUM(amount) as monthly_total
-                FROM expense 
-                WHERE user_id = %s AND date >= %s
-                GROUP BY DATE_FORMAT(date, '%Y-%m')
-            ) as monthly_expenses
-            """
-            cursor.execute(query, (user_id, three_months_ago.date()))
-            result = cursor.fetchone()
+            monthly_totals = get_expense_monthly_totals(user_id, three_months_ago.date())
             
-            cursor.close()
-            release_connection(connection)
-            
-            avg_monthly_expenses = result['avg_monthly_expenses'] or 0
+            avg_monthly_expenses = (
+                sum(row['total'] for row in monthly_totals) / len(monthly_totals) if monthly_totals else 0
+            )
             recommended_emergency_fund = avg_monthly_expenses * 6  # 6 months expenses
             
             # Get current total savings (simplified - would need actual savings tracking)
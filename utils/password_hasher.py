@@ -0,0 +1,85 @@
+"""
+bcrypt password hashing on a bounded worker pool
+
+bcrypt is deliberately slow (about 250 ms at the default cost), so request
+threads hand hashes and verifications to a pool of PASSWORD_HASH_WORKERS
+threads: bcrypt releases the GIL while it works, so other requests keep
+being served, and a burst of logins queues on the pool instead of taking
+every core away from them.
+
+Accounts created before bcrypt carry unsalted SHA-256 hex digests. Those
+still verify, and needs_rehash() reports them (and bcrypt hashes with a
+lower cost than BCRYPT_ROUNDS) so the login path can replace them.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+_LEGACY_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+def is_legacy_hash(stored_hash: str) -> bool:
+    """Whether stored_hash is an unsalted SHA-256 hex digest"""
+    return bool(stored_hash) and _LEGACY_HASH.match(stored_hash) is not None
+
+class PasswordHasher:
+    """Hash and verify passwords with bcrypt on a bounded thread pool"""
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='password-hash')
+        self._dummy_hash: Optional[bytes] = None
+
+    def hash(self, password: str) -> str:
+        """bcrypt hash of password (blocks the caller, not the other pool users)"""
+        return self.hash_async(password).result()
+
+    def hash_async(self, password: str) -> Future:
+        """Start hashing password on the pool"""
+        return self._executor.submit(self._hash, password)
+
+    def verify(self, password: str, stored_hash: Optional[str]) -> bool:
+        """Check password against a bcrypt or legacy SHA-256 hash.
+
+        With no stored hash (unknown user) a dummy hash is still checked, so
+        the response time does not reveal whether the username exists.
+        """
+        if stored_hash and is_legacy_hash(stored_hash):
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+        return self._executor.submit(self._verify, password, stored_hash).result()
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        """Whether stored_hash should be replaced by a fresh bcrypt hash"""
+        if is_legacy_hash(stored_hash):
+            return True
+        try:
+            return int(stored_hash.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    def _verify(self, password: str, stored_hash: Optional[str]) -> bool:
+        if not stored_hash:
+            if self._dummy_hash is None:
+                self._dummy_hash = bcrypt.hashpw(b'', bcrypt.gensalt(self.rounds))
+            bcrypt.checkpw(password.encode(), self._dummy_hash)
+            return False
+        try:
+            return bcrypt.checkpw(password.encode(), stored_hash.encode())
+        except ValueError as e:
+            logger.warning(f"Unrecognized password hash: {e}")
+            return False
+
+password_hasher = PasswordHasher()
@@ -1,15 +1,15 @@
 import logging
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Iterator, Optional, Tuple
 from http.server import BaseHTTPRequestHandler
 import json
 
 logger = logging.getLogger(__name__)
 
 def json_response(data: Dict[str, Any], status_code: int = 200) -> Dict[str, Any]:
-    """Create JSON response dictionary"""
+    """Create JSON response dictionary; DECIMAL, DATE and TIMESTAMP values are sent as strings"""
     return {
         'status_code': status_code,
-        'body': json.dumps(data),
+        'body': json.dumps(data, default=str),
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
@@ -18,6 +18,22 @@ def json_response(data: Dict[str, Any], status_code: int = 200) -> Dict[str, Any
         }
     }
 
+def stream_response(chunks: Iterator[bytes], content_type: str, filename: Optional[str] = None, status_code: int = 200) -> Dict[str, Any]:
+    """Create a streaming response dictionary; the body is sent with chunked encoding"""
+    headers = {
+        'Content-Type': content_type,
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+    }
+    if filename:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return {
+        'status_code': status_code,
+        'stream': chunks,
+        'headers': headers
+    }
+
 def send_json_response(handler: BaseHTTPRequestHandler, data: Dict[str, Any], status_code: int = 200):
     """Send JSON response via HTTP handler"""
     try:
@@ -0,0 +1,443 @@
+"""
+Streaming bank-statement import (CSV, OFX, QIF)
+
+Statements are parsed row by row from a file object, so memory use stays
+flat regardless of file size. Rows are processed in batches: each batch is
+auto-categorized, checked for duplicates against existing expenses and
+inserted with a single bulk INSERT.
+
+Only money going out is imported. OFX, QIF and a signed CSV amount column
+use the same convention: negative amounts are expenses and positive ones
+(salary, refunds, deposits) are skipped. A CSV debit column, or a type
+column marking the row as a debit, holds outflows whatever their sign.
+
+A row with an unparsable date or amount is yielded as an InvalidRow and
+reported on the job; the rest of the file is still imported.
+"""
+import argparse
+import csv
+import logging
+import os
+import re
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO
+
+from database import expense_query
+from utils.expense_categorizer import ExpenseCategorizer
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ('csv', 'ofx', 'qif')
+
+# Rows categorized, de-duplicated and inserted together
+IMPORT_BATCH_SIZE = 500
+
+# Size of each read when scanning OFX files and spooling uploads
+READ_CHUNK_SIZE = 64 * 1024
+
+# Finished jobs kept in memory for progress polling
+MAX_TRACKED_JOBS = 200
+
+# Invalid rows described on a job (all are counted)
+MAX_REPORTED_ERRORS = 50
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y', '%Y/%m/%d', '%Y%m%d')
+
+CSV_DATE_COLUMNS = ('date', 'transaction date', 'posted date', 'posting date')
+CSV_SIGNED_AMOUNT_COLUMNS = ('amount', 'value')
+CSV_DEBIT_COLUMN = 'debit'
+CSV_DESCRIPTION_COLUMNS = ('description', 'memo', 'details', 'narrative')
+CSV_MERCHANT_COLUMNS = ('merchant', 'payee', 'name')
+CSV_CREDIT_TYPES = ('credit', 'deposit', 'cr')
+CSV_DEBIT_TYPES = ('debit', 'withdrawal', 'dr')
+
+class StatementParseError(Exception):
+    """Raised when a statement value cannot be parsed"""
+
+class InvalidRow:
+    """A statement row that could not be parsed, by its position among the file's transactions"""
+    __slots__ = ('number', 'reason')
+
+    def __init__(self, number: int, reason: str):
+        self.number = number
+        self.reason = reason
+
+def parse_date(value: str) -> str:
+    """Parse a statement date into YYYY-MM-DD"""
+    cleaned = value.strip().replace("'", '/')
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise StatementParseError(f"Unrecognized date: {value}")
+
+def parse_amount(value: str) -> Decimal:
+    """Parse a signed statement amount, tolerating currency symbols and separators"""
+    cleaned = re.sub(r'[^\d\-.()]', '', value.strip())
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    cleaned = cleaned.strip('()')
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        raise StatementParseError(f"Unrecognized amount: {value}")
+    return -amount if negative else amount
+
+def _first_column(row: Dict[str, str], candidates: tuple) -> Optional[str]:
+    for column in candidates:
+        value = row.get(column)
+        if value:
+            return value
+    return None
+
+def parse_csv(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """Yield expense rows from a CSV statement with a header row"""
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+
+    for number, row in enumerate(reader, 1):
+        transaction_type = (row.get('type') or '').strip().lower()
+        if transaction_type in CSV_CREDIT_TYPES:
+            continue
+
+        date_value = _first_column(row, CSV_DATE_COLUMNS)
+        debit_value = (row.get(CSV_DEBIT_COLUMN) or '').strip()
+        amount_value = debit_value or _first_column(row, CSV_SIGNED_AMOUNT_COLUMNS)
+        if not date_value or not amount_value:
+            continue
+
+        try:
+            amount = parse_amount(amount_value)
+            if debit_value or transaction_type in CSV_DEBIT_TYPES:
+                amount = abs(amount)
+            elif amount < 0:
+                amount = -amount
+            else:
+                # Money in on a signed amount column
+                continue
+            yield {
+                'date': parse_date(date_value),
+                'amount': amount,
+                'description': (_first_column(row, CSV_DESCRIPTION_COLUMNS) or '').strip(),
+                'merchant': (_first_column(row, CSV_MERCHANT_COLUMNS) or '').strip(),
+                'category': (row.get('category') or '').strip() or None
+            }
+        except StatementParseError as e:
+            yield InvalidRow(number, str(e))
+
+def _iter_ofx_tags(stream: TextIO) -> Iterator[tuple]:
+    """Yield (tag, value) pairs from SGML or XML OFX without loading the file"""
+    tag_pattern = re.compile(r'<([^>]+)>([^<]*)')
+    buffer = ''
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        buffer += chunk
+        # Keep the trailing partial tag for the next read
+        cut = buffer.rfind('<') if chunk else len(buffer)
+        if cut <= 0 and chunk:
+            continue
+        for match in tag_pattern.finditer(buffer, 0, cut):
+            yield match.group(1).strip().upper(), match.group(2).strip()
+        buffer = buffer[cut:]
+        if not chunk:
+            break
+
+def parse_ofx(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """Yield expense rows (debits only) from an OFX statement"""
+    transaction = None
+    number = 0
+    for tag, value in _iter_ofx_tags(stream):
+        if tag == 'STMTTRN':
+            transaction = {}
+            number += 1
+        elif tag == '/STMTTRN' and transaction is not None:
+            if 'TRNAMT' in transaction and 'DTPOSTED' in transaction:
+                try:
+                    amount = parse_amount(transaction['TRNAMT'])
+                    if amount < 0:
+                        yield {
+                            'date': parse_date(transaction['DTPOSTED'][:8]),
+                            'amount': -amount,
+                            'description': transaction.get('MEMO') or transaction.get('NAME', ''),
+                            'merchant': transaction.get('NAME', ''),
+                            'category': None
+                        }
+                except StatementParseError as e:
+                    yield InvalidRow(number, str(e))
+            transaction = None
+        elif transaction is not None and not tag.startswith('/'):
+            transaction[tag] = value
+
+def parse_qif(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """Yield expense rows (debits only) from a QIF statement"""
+    record: Dict[str, str] = {}
+    number = 0
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+
+        code, value = line[0], line[1:].strip()
+        if code != '^':
+            # First occurrence wins; split lines (S/E/$) are not imported
+            record.setdefault(code, value)
+            continue
+
+        number += 1
+        if 'D' in record and 'T' in record:
+            try:
+                amount = parse_amount(record['T'])
+                if amount < 0:
+                    yield {
+                        'date': parse_date(record['D']),
+                        'amount': -amount,
+                        'description': record.get('M') or record.get('P', ''),
+                        'merchant': record.get('P', ''),
+                        'category': record.get('L') or None
+                    }
+            except StatementParseError as e:
+                yield InvalidRow(number, str(e))
+        record = {}
+
+PARSERS: Dict[str, Callable[[TextIO], Iterator[Dict[str, Any]]]] = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+    'qif': parse_qif
+}
+
+def detect_format(head: str, filename: str = '') -> str:
+    """Guess the statement format from the file name or its first bytes"""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension in SUPPORTED_FORMATS:
+        return extension
+
+    head = head.lstrip().upper()
+    if head.startswith('OFXHEADER') or head.startswith('<?XML') or '<OFX>' in head:
+        return 'ofx'
+    if head.startswith('!TYPE') or head.startswith('!ACCOUNT'):
+        return 'qif'
+    return 'csv'
+
+def _fingerprint(date: Any, amount: Any, description: Optional[str]) -> tuple:
+    return (str(date), str(Decimal(str(amount)).quantize(Decimal('0.01'))), (description or '').strip().lower())
+
+class ImportJob:
+    """Progress and result of one statement import"""
+
+    def __init__(self, user_id: int, file_path: str, file_format: str, delete_file: bool = False):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.file_path = file_path
+        self.file_format = file_format
+        self.delete_file = delete_file
+        self.status = 'queued'
+        self.total_bytes = os.path.getsize(file_path)
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.invalid = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        progress = (self.bytes_read / self.total_bytes) * 100 if self.total_bytes else 100
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'format': self.file_format,
+            'progress': round(min(progress, 100), 1),
+            'rows_read': self.rows_read,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class StatementImporter:
+    """Runs the parse -> categorize -> de-duplicate -> bulk insert pipeline"""
+
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.categorizer = ExpenseCategorizer()
+
+    def run(self, job: ImportJob, on_progress: Callable[[ImportJob], None] = None):
+        """Import a statement file, updating the job's counters as batches complete"""
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        # Expenses created from earlier batches of this job are not duplicates
+        created_before = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        try:
+            with open(job.file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as stream:
+                rows = PARSERS[job.file_format](stream)
+                batch = []
+                for row in rows:
+                    job.rows_read += 1
+                    if isinstance(row, InvalidRow):
+                        job.invalid += 1
+                        if len(job.errors) < MAX_REPORTED_ERRORS:
+                            job.errors.append({'row': row.number, 'error': row.reason})
+                        continue
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        self._process_batch(job, batch, created_before)
+                        batch = []
+                        job.bytes_read = stream.buffer.tell()
+                        if on_progress:
+                            on_progress(job)
+                if batch:
+                    self._process_batch(job, batch, created_before)
+                job.bytes_read = job.total_bytes
+
+            job.status = 'completed'
+        except Exception as e:
+            logger.error(f"Error importing statement for user {job.user_id}: {e}")
+            job.status = 'failed'
+            job.error = 'Import failed'
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            if job.delete_file:
+                try:
+                    os.remove(job.file_path)
+                except OSError:
+                    pass
+            if on_progress:
+                on_progress(job)
+
+        logger.info(f"Import {job.id} for user {job.user_id} {job.status}: "
+                    f"{job.imported} imported, {job.duplicates} duplicates, {job.failed} failed, "
+                    f"{job.invalid} invalid")
+        return job
+
+    def _process_batch(self, job: ImportJob, batch: List[Dict[str, Any]], created_before: str):
+        """Categorize, de-duplicate and insert one batch of parsed rows"""
+        dates = [row['date'] for row in batch]
+        existing = Counter()
+        for fingerprint in expense_query.get_expense_fingerprints(job.user_id, min(dates), max(dates), created_before):
+            key = _fingerprint(fingerprint['date'], fingerprint['amount'], fingerprint['description'])
+            existing[key] += fingerprint['occurrences']
+
+        new_expenses = []
+        for row in batch:
+            # Match against existing rows one-for-one so genuinely repeated
+            # transactions (two coffees on the same day) are kept
+            key = _fingerprint(row['date'], row['amount'], row['description'])
+            if existing[key] > 0:
+                existing[key] -= 1
+                job.duplicates += 1
+                continue
+
+            category = row['category']
+            if not category:
+                category = self.categorizer.categorize_expense(
+                    row['description'], float(row['amount']), row['merchant'], job.user_id
+                )['category']
+
+            new_expenses.append({
+                'amount': row['amount'],
+                'category': category[:50],
+                'description': row['description'],
+                'date': row['date'],
+                'user_id': job.user_id
+            })
+
+        if not new_expenses:
+            return
+
+        expense_ids = expense_query.create_expenses_bulk(new_expenses)
+        if expense_ids is None:
+            job.failed += len(new_expenses)
+        else:
+            job.imported += len(expense_ids)
+
+class ImportJobManager:
+    """Runs imports on a small background pool and tracks their progress"""
+
+    def __init__(self, max_workers: int = 2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='statement-import')
+        self.jobs: Dict[str, ImportJob] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, user_id: int, file_path: str, file_format: str) -> ImportJob:
+        """Queue an uploaded file for import; the file is removed when the job ends"""
+        job = ImportJob(user_id, file_path, file_format, delete_file=True)
+        with self.lock:
+            self._prune_finished_jobs()
+            self.jobs[job.id] = job
+        self.executor.submit(StatementImporter().run, job)
+        return job
+
+    def _prune_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_TRACKED_JOBS + 1)]:
+            del self.jobs[job_id]
+
+    def get_job(self, job_id: str, user_id: int) -> Optional[ImportJob]:
+        """Get a job by ID, only if it belongs to the user"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job and job.user_id == user_id:
+            return job
+        return None
+
+def spool_upload(read: Callable[[int], bytes], content_length: int, chunk_size: int = READ_CHUNK_SIZE) -> str:
+    """Copy an upload to a temporary file in fixed-size chunks and return its path"""
+    file_descriptor, file_path = tempfile.mkstemp(prefix='spend_wise_import_')
+    with os.fdopen(file_descriptor, 'wb') as spool:
+        remaining = content_length
+        while remaining > 0:
+            chunk = read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            spool.write(chunk)
+            remaining -= len(chunk)
+    return file_path
+
+# Global import job manager instance
+import_job_manager = ImportJobManager()
+
+def main():
+    """Import a statement file from the command line"""
+    parser = argparse.ArgumentParser(description='Import a bank statement into Spend Wise')
+    parser.add_argument('file', help='Path to a CSV, OFX or QIF statement')
+    parser.add_argument('--user-id', type=int, required=True, help='User to import expenses for')
+    parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='Statement format (detected if omitted)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    file_format = args.format
+    if not file_format:
+        with open(args.file, 'r', encoding='utf-8-sig', errors='replace') as stream:
+            file_format = detect_format(stream.read(1024), args.file)
+
+    def print_progress(job: ImportJob):
+        progress = job.to_dict()
+        print(f"[{progress['status']}] {progress['progress']}% - {job.rows_read} rows read, "
+              f"{job.imported} imported, {job.duplicates} duplicates, {job.failed} failed, "
+              f"{job.invalid} invalid")
+
+    job = ImportJob(args.user_id, args.file, file_format)
+    StatementImporter(args.batch_size).run(job, on_progress=print_progress)
+    if job.status != 'completed':
+        raise SystemExit(job.error or 'Import failed')
+
+if __name__ == '__main__':
+    main()
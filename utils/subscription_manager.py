@@ -2,9 +2,8 @@ import re
 import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict
-from database.database_connection import get_connection, release_connection
-from database.expense_query import get_all_expenses
+from collections import Counter, defaultdict
+from utils.expense_frame import ExpenseFrame, load_expense_frame
 
 logger = logging.getLogger(__name__)
 
@@ -117,27 +116,13 @@ class SubscriptionManager:
     def detect_subscriptions(self, user_id: int, days: int = 90) -> Dict[str, any]:
         """Detect subscriptions from user's expense history"""
         try:
-            connection = get_connection()
-            if not connection:
-                return {'error': 'Database connection failed'}
-            
-            cursor = connection.cursor(dictionary=True)
-            
             # Get expenses for analysis period
             start_date = datetime.now() - timedelta(days=days)
-            query = """
-            SELECT description, amount, date, category
-            FROM expense 
-            WHERE user_id = %s AND date >= %s
-            ORDER BY date DESC
-            """
-            cursor.execute(query, (user_id, start_date.date()))
-            expenses = cursor.fetchall()
-            
-            cursor.close()
-            release_connection(connection)
+            expenses = load_expense_frame(user_id, start_date.date())
+            if expenses is None:
+                return {'error': 'Database connection failed'}
             
-            if not expenses:
+            if not len(expenses):
                 return {'message': 'No expense data available for analysis'}
             
             # Group similar expenses
@@ -147,8 +132,8 @@ class SubscriptionManager:
             detected_subscriptions = []
             total_monthly_cost = 0
             
-            for subscription_group in potential_subscriptions:
-                subscription_info = self._analyze_subscription_group(subscription_group, user_id)
+            for description, subscription_group in potential_subscriptions:
+                subscription_info = self._analyze_subscription_group(description, subscription_group, user_id)
                 if subscription_info:
                     detected_subscriptions.append(subscription_info)
                     if subscription_info['frequency'] == 'monthly':
@@ -172,29 +157,13 @@ class SubscriptionManager:
             logger.error(f"Error detecting subscriptions: {e}")
             return {'error': 'Subscription detection failed'}
     
-    def _find_recurring_expenses(self, expenses: List[Dict]) -> List[List[Dict]]:
-        """Find groups of similar recurring expenses"""
-        # Normalize expense descriptions for matching
-        normalized_expenses = []
-        for expense in expenses:
-            normalized = self._normalize_description(expense['description'])
-            normalized_expenses.append({
-                **expense,
-                'normalized_description': normalized,
-                'month_day': datetime.strptime(expense['date'], '%Y-%m-%d').day
-            })
-        
-        # Group by normalized description
-        expense_groups = defaultdict(list)
-        for expense in normalized_expenses:
-            key = expense['normalized_description']
-            expense_groups[key].append(expense)
-        
-        # Filter for potential subscriptions
+    def _find_recurring_expenses(self, expenses: ExpenseFrame) -> List[Tuple[str, ExpenseFrame]]:
+        """Find groups of similar recurring expenses as (normalized description, frame)"""
+        # Group by normalized description; each distinct description is normalized once
         potential_subscriptions = []
-        for description, group in expense_groups.items():
-            if self._is_subscription_candidate(group):
-                potential_subscriptions.append(group)
+        for description, group in expenses.groupby('merchant', key=self._normalize_description):
+            if self._is_subscription_candidate(description, group):
+                potential_subscriptions.append((description, group))
         
         return potential_subscriptions
     
@@ -218,16 +187,14 @@ class SubscriptionManager:
         
         return ' '.join(words).strip()
     
-    def _is_subscription_candidate(self, expense_group: List[Dict]) -> bool:
+    def _is_subscription_candidate(self, description: str, expense_group: ExpenseFrame) -> bool:
         """Determine if a group of expenses is likely a subscription"""
         if len(expense_group) < self.min_occurrences:
             return False
         
         # Check amount consistency
-        amounts = [expense['amount'] for expense in expense_group]
-        avg_amount = sum(amounts) / len(amounts)
-        amount_variance = sum((amt - avg_amount) ** 2 for amt in amounts) / len(amounts)
-        amount_std_dev = amount_variance ** 0.5
+        avg_amount = expense_group.mean()
+        amount_std_dev = expense_group.std()
         
         # Allow some variance but not too much
         if avg_amount > 0 and (amount_std_dev / avg_amount) > self.amount_variance_threshold:
@@ -238,44 +205,38 @@ class SubscriptionManager:
             return True
         
         # Check if it matches known subscription patterns
-        sample_description = expense_group[0]['normalized_description']
         for service_name, pattern in self.subscription_patterns.items():
-            if (service_name in sample_description or 
-                any(keyword in sample_description for keyword in pattern['keywords'])):
+            if (service_name in description or 
+                any(keyword in description for keyword in pattern['keywords'])):
                 return True
         
         return False
     
-    def _has_monthly_pattern(self, expense_group: List[Dict]) -> bool:
+    def _has_monthly_pattern(self, expense_group: ExpenseFrame) -> bool:
         """Check if expenses follow a monthly pattern"""
         if len(expense_group) < 3:
             return False
         
-        # Group by day of month
-        day_groups = defaultdict(list)
-        for expense in expense_group:
-            day_groups[expense['month_day']].append(expense)
-        
-        # Check if most expenses occur on similar days
-        common_days = [day for day, expenses in day_groups.items() if len(expenses) >= 2]
+        # Check if most expenses occur on similar days of the month
+        day_counts = Counter(expense_group.days_of_month())
+        common_days = [day for day, count in day_counts.items() if count >= 2]
         
         return len(common_days) >= 2  # At least 2 common days suggest monthly pattern
     
-    def _analyze_subscription_group(self, expense_group: List[Dict], user_id: int) -> Optional[Dict]:
+    def _analyze_subscription_group(self, description: str, expense_group: ExpenseFrame, user_id: int) -> Optional[Dict]:
         """Analyze a group of recurring expenses to determine subscription details"""
-        if not expense_group:
+        if not len(expense_group):
             return None
         
         # Calculate subscription metrics
-        amounts = [expense['amount'] for expense in expense_group]
-        avg_amount = sum(amounts) / len(amounts)
-        most_common_amount = max(set(amounts), key=amounts.count)
+        avg_amount = expense_group.mean()
+        most_common_amount = expense_group.mode_amount()
         
         # Determine frequency
         frequency = self._determine_frequency(expense_group)
         
         # Identify the service
-        service_name = self._identify_service(expense_group[0])
+        service_name = self._identify_service(description, most_common_amount)
         
         # Calculate monthly cost
         if frequency == 'monthly':
@@ -295,25 +256,18 @@ class SubscriptionManager:
             'most_common_amount': round(most_common_amount, 2),
             'category': self.subscription_patterns.get(service_name, {}).get('category', 'Other'),
             'confidence': self._calculate_confidence(expense_group, service_name),
-            'recent_charges': sorted(expense_group, key=lambda x: x['date'], reverse=True)[:3],
-            'first_charge': min(expense_group, key=lambda x: x['date'])['date'],
-            'last_charge': max(expense_group, key=lambda x: x['date'])['date']
+            'recent_charges': expense_group.records(expense_group.latest(3)),
+            'first_charge': expense_group.first_date().isoformat(),
+            'last_charge': expense_group.last_date().isoformat()
         }
     
-    def _determine_frequency(self, expense_group: List[Dict]) -> str:
+    def _determine_frequency(self, expense_group: ExpenseFrame) -> str:
         """Determine the frequency of recurring charges"""
         if len(expense_group) < 3:
             return 'unknown'
         
         # Analyze time between charges
-        dates = [datetime.strptime(expense['date'], '%Y-%m-%d') for expense in expense_group]
-        dates.sort()
-        
-        # Calculate intervals
-        intervals = []
-        for i in range(1, len(dates)):
-            interval = (dates[i] - dates[i-1]).days
-            intervals.append(interval)
+        intervals = expense_group.intervals()
         
         if not intervals:
             return 'unknown'
@@ -330,10 +284,9 @@ class SubscriptionManager:
         else:
             return 'irregular'
     
-    def _identify_service(self, expense: Dict) -> str:
-        """Identify the subscription service from expense description"""
-        description = expense.get('normalized_description', expense['description']).lower()
-        amount = expense['amount']
+    def _identify_service(self, description: str, amount: float) -> str:
+        """Identify the subscription service from a normalized description and typical amount"""
+        description = description.lower()
         
         # Check against known patterns
         best_match = None
@@ -358,7 +311,7 @@ class SubscriptionManager:
         
         return best_match if best_match else 'unknown'
     
-    def _calculate_confidence(self, expense_group: List[Dict], service_name: str) -> float:
+    def _calculate_confidence(self, expense_group: ExpenseFrame, service_name: str) -> float:
         """Calculate confidence score for subscription detection"""
         if service_name == 'unknown':
             return 0.3  # Low confidence for unknown services
@@ -0,0 +1,216 @@
+"""
+Revoked-token store keyed by the JWT jti claim
+
+verify_token asks is_revoked() on every request, so the check never
+touches MySQL: a Bloom filter answers "not revoked" for almost every
+token, and only its (rare) positives consult the exact set of revoked
+jtis.
+
+Revocations are shared between worker processes through an append-only
+file (TOKEN_REVOCATION_FILE), one JSON line per revoked jti with the
+token's exp. Each process appends under an exclusive flock and picks up
+other processes' lines by reading from its last offset, at most once per
+TOKEN_REVOCATION_SYNC_SECONDS. Entries for tokens past their exp are
+dropped, and the file rewritten without them, when a process starts and
+then at most once per TOKEN_REVOCATION_PURGE_SECONDS; the Bloom filter is
+rebuilt at that point, so it shrinks back once a burst of revocations has
+expired.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_FILE = os.getenv('TOKEN_REVOCATION_FILE', 'data/revoked_tokens.jsonl')
+REVOCATION_SYNC_SECONDS = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', '1'))
+REVOCATION_PURGE_SECONDS = float(os.getenv('TOKEN_REVOCATION_PURGE_SECONDS', '300'))
+BLOOM_CAPACITY = int(os.getenv('TOKEN_REVOCATION_BLOOM_CAPACITY', '100000'))
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no removal)"""
+
+    def __init__(self, capacity: int, false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * step) % self.size for index in range(self.hash_count))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class RevocationStore:
+    """Bloom filter in front of an exact jti -> exp map, synced through a file"""
+
+    def __init__(self, path: str = REVOCATION_FILE, sync_seconds: float = REVOCATION_SYNC_SECONDS,
+                 capacity: int = BLOOM_CAPACITY, purge_seconds: float = REVOCATION_PURGE_SECONDS):
+        self.path = path
+        self.sync_seconds = sync_seconds
+        self.purge_seconds = purge_seconds
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, float] = {}
+        self._capacity = capacity
+        self._bloom = BloomFilter(capacity)
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._next_sync = 0.0
+        self._next_purge = time.monotonic() + purge_seconds
+        self._expired_lines = 0
+        self.checks = 0
+        self.bloom_positives = 0
+        self.purged = 0
+        with self._lock:
+            self._sync()
+            self._compact()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Whether the token with this jti was revoked (tokens without a jti cannot be)"""
+        if not jti:
+            return False
+        with self._lock:
+            self.checks += 1
+            now = time.monotonic()
+            if now >= self._next_sync:
+                self._next_sync = now + self.sync_seconds
+                self._sync()
+            if jti not in self._bloom:
+                return False
+            self.bloom_positives += 1
+            return jti in self._revoked
+
+    def revoke(self, jti: str, expires_at: float) -> bool:
+        """Revoke jti until expires_at (the token's exp) in every process.
+
+        Returns False if jti was already revoked, so of two concurrent
+        revocations of one token in this process only one wins. Another
+        process's revocation is only seen once synced.
+        """
+        with self._lock:
+            self._sync()
+            self._next_sync = time.monotonic() + self.sync_seconds
+            if jti in self._revoked:
+                return False
+            self._add(jti, float(expires_at))
+            line = json.dumps({'jti': jti, 'exp': float(expires_at)}) + '\n'
+            try:
+                self._append(line)
+            except OSError as e:
+                # Still revoked in this process
+                logger.error(f"Could not persist token revocation: {e}")
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'revoked': len(self._revoked),
+                'bloom_capacity': self._bloom.capacity,
+                'checks': self.checks,
+                'bloom_positives': self.bloom_positives,
+                'purged': self.purged
+            }
+
+    # Internals; callers hold self._lock
+
+    def _add(self, jti: str, expires_at: float):
+        if jti in self._revoked:
+            return
+        self._revoked[jti] = expires_at
+        if len(self._revoked) > self._bloom.capacity:
+            self._rebuild_bloom(self._bloom.capacity * 2)
+        else:
+            self._bloom.add(jti)
+
+    def _rebuild_bloom(self, capacity: int):
+        self._bloom = BloomFilter(capacity)
+        for jti in self._revoked:
+            self._bloom.add(jti)
+
+    def _append(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                # A compaction may have replaced the file while we waited
+                try:
+                    current = os.stat(self.path).st_ino
+                except FileNotFoundError:
+                    continue
+                if os.fstat(file.fileno()).st_ino != current:
+                    continue
+                file.write(line)
+                file.flush()
+                return
+
+    def _sync(self):
+        """Read lines other processes appended since the last sync, and purge when due"""
+        try:
+            with open(self.path, 'rb') as file:
+                inode = os.fstat(file.fileno()).st_ino
+                if inode != self._inode:
+                    # Replaced by a compaction: entries only ever drop out when expired
+                    self._inode, self._offset = inode, 0
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            return
+        complete = data[:data.rfind(b'\n') + 1]
+        self._offset += len(complete)
+        now = time.time()
+        for line in complete.splitlines():
+            try:
+                entry = json.loads(line)
+                if entry['exp'] > now:
+                    self._add(entry['jti'], entry['exp'])
+                else:
+                    self._expired_lines += 1
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping bad revocation entry: {e}")
+        if time.monotonic() >= self._next_purge:
+            self._compact()
+
+    def _compact(self):
+        """Drop entries whose tokens have expired, and rewrite the file without them"""
+        self._next_purge = time.monotonic() + self.purge_seconds
+        now = time.time()
+        live = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        if len(live) == len(self._revoked) and not self._expired_lines:
+            return
+        self.purged += len(self._revoked) - len(live)
+        self._revoked = live
+        # Back to the configured size unless that many are still live
+        self._rebuild_bloom(max(self._capacity, len(live)))
+        try:
+            with open(self.path, 'a', encoding='utf-8') as old:
+                fcntl.flock(old, fcntl.LOCK_EX)
+                # Pick up lines appended since the load, then write what is live
+                self._sync()
+                staging = f"{self.path}.tmp{os.getpid()}"
+                with open(staging, 'w', encoding='utf-8') as file:
+                    for jti, exp in self._revoked.items():
+                        if exp > now:
+                            file.write(json.dumps({'jti': jti, 'exp': exp}) + '\n')
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(staging, self.path)
+            self._expired_lines = 0
+        except OSError as e:
+            logger.warning(f"Could not compact token revocations: {e}")